@@ -0,0 +1,221 @@
+"""
+Write-behind buffer for like and dislike toggles.
+
+With ``INTERACTION_WRITE_BEHIND`` on, a toggle only records the viewer's
+desired state in this process and answers from it; a background thread
+writes the buffered rows every ``INTERACTION_FLUSH_INTERVAL`` seconds in one
+transaction, with one counter update per post instead of one per tap.
+
+Entries are coalesced per ``(model, user, post)``: toggling back to the
+state the database already holds removes the entry, so like/unlike flapping
+never reaches the database. A flush applies each entry with the
+conditional insert/delete of interactions.services and shifts counters by
+the rows that actually changed, so replays and races with synchronous
+writes cannot drift them.
+
+The buffer is per process. Each worker flushes its own entries; toggles of
+the same pair from two workers are settled by whichever flush lands last,
+and other workers see buffered likes only after the flush. Once
+``INTERACTION_BUFFER_LIMIT`` entries are pending, toggles fall back to the
+synchronous path rather than growing the buffer.
+
+A running net delta per ``(model, post)`` over the pending and in-flight
+entries lets a toggle answer with the stored counter plus that delta in
+constant time. While a flush of the same post may be committing, the stored
+counter could already include the delta, so such a toggle waits for the
+flush and reads again. A flush that fails puts its entries back in front of
+newer toggles to be retried; they are lost only if the process exits first.
+
+Metrics: ``interactions.buffer.flush_size`` and ``.lag_ms`` (age of the
+oldest entry at flush) samples, ``.flush_ms`` timings, and ``.coalesced``,
+``.overflow`` and ``.requeued`` (entries of a failed flush) counters.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+from . import services
+from .signals import COUNTER_FIELDS
+from posts.models import Post
+from social_network import metrics
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# Notified whenever a flush ends
+_flushed = threading.Condition(_lock)
+# (model, user_id, post_id) -> (state in the database, desired state)
+_pending = {}
+# Entries being written by the current flush, still counted by toggles
+_flushing = {}
+# (model, post_id) -> net change in rows of _pending and of _flushing
+_pending_deltas = Counter()
+_flushing_deltas = Counter()
+# Bumped whenever a flush ends
+_generation = 0
+_oldest = None
+_wake = threading.Event()
+_flusher = None
+
+
+def _read(model, user_id, post_id):
+    """The post's stored counter and whether the pair's row exists"""
+    field = COUNTER_FIELDS[model]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {field}, EXISTS(SELECT 1 FROM {model._meta.db_table} "
+            "WHERE post_id = %s AND user_id = %s) "
+            f"FROM {Post._meta.db_table} WHERE id = %s",
+            [post_id, user_id, post_id],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        raise Post.DoesNotExist(post_id)
+    return row[0], bool(row[1])
+
+
+def toggle(model, user_id, post_id):
+    """Buffer a toggle; return ``(active, count)`` as seen by this process.
+
+    Returns None when the buffer is full and the caller should write
+    synchronously instead.
+    """
+    global _oldest
+
+    key = (model, user_id, post_id)
+    while True:
+        with _lock:
+            generation = _generation
+        count, stored = _read(model, user_id, post_id)
+        _lock.acquire()
+        if generation != _generation:
+            # A flush ended meanwhile and may or may not be in the read
+            _lock.release()
+            continue
+        if (model, post_id) not in _flushing_deltas:
+            break
+        # The flush in flight may have committed before the read
+        _flushed.wait()
+        _lock.release()
+
+    try:
+        entry = _pending.get(key) or _flushing.get(key)
+        original = entry[1] if entry else stored
+        if key not in _pending and len(_pending) >= settings.INTERACTION_BUFFER_LIMIT:
+            metrics.incr("interactions.buffer.overflow")
+            return None
+
+        desired = not original
+        _pending_deltas[model, post_id] += desired - original
+        if key in _pending and _pending[key][0] == desired:
+            # Back to the state the database holds: nothing to write
+            del _pending[key]
+            metrics.incr("interactions.buffer.coalesced")
+        else:
+            base = _pending[key][0] if key in _pending else original
+            _pending[key] = (base, desired)
+            if _oldest is None:
+                _oldest = time.monotonic()
+
+        count += _flushing_deltas[model, post_id] + _pending_deltas[model, post_id]
+        if len(_pending) >= settings.INTERACTION_FLUSH_SIZE:
+            _wake.set()
+    finally:
+        _lock.release()
+    _ensure_flusher()
+    return desired, count
+
+
+def flush():
+    """Write every pending entry in one transaction; return the entry count"""
+    global _flushing, _pending, _flushing_deltas, _pending_deltas
+    global _generation, _oldest
+
+    with _lock:
+        if not _pending:
+            return 0
+        batch, _pending = _pending, {}
+        _flushing, oldest, _oldest = batch, _oldest, None
+        _flushing_deltas, _pending_deltas = _pending_deltas, Counter()
+
+    failed = True
+    try:
+        with metrics.timer("interactions.buffer.flush_ms"):
+            _write(batch)
+        failed = False
+    except DatabaseError:
+        metrics.incr("interactions.buffer.requeued", len(batch))
+        logger.exception("Could not flush %d buffered interactions", len(batch))
+    finally:
+        with _lock:
+            if failed:
+                _requeue(batch, oldest)
+            _flushing, _flushing_deltas = {}, Counter()
+            _generation += 1
+            _flushed.notify_all()
+
+    metrics.observe("interactions.buffer.flush_size", len(batch))
+    metrics.observe("interactions.buffer.lag_ms", (time.monotonic() - oldest) * 1000)
+    return len(batch)
+
+
+def _requeue(batch, oldest):
+    """Put the entries of a failed flush back under the newer toggles"""
+    global _oldest
+
+    for key, (original, desired) in batch.items():
+        if key not in _pending:
+            _pending[key] = (original, desired)
+        elif _pending[key][1] == original:
+            # Toggled back since: the database already holds that state
+            del _pending[key]
+        else:
+            _pending[key] = (original, _pending[key][1])
+    _pending_deltas.update(_flushing_deltas)
+    if _pending:
+        _oldest = oldest if _oldest is None else min(oldest, _oldest)
+
+
+def _write(batch):
+    deltas = Counter()
+    with transaction.atomic(), connection.cursor() as cursor:
+        for (model, user_id, post_id), (_, desired) in batch.items():
+            deltas[model, post_id] += services.set_state(
+                cursor, model, user_id, post_id, desired
+            )
+        for (model, post_id), delta in deltas.items():
+            if delta:
+                services.shift_counter(cursor, model, post_id, delta)
+
+
+def pending_count():
+    with _lock:
+        return len(_pending)
+
+
+def _run():
+    while True:
+        _wake.wait(settings.INTERACTION_FLUSH_INTERVAL)
+        _wake.clear()
+        flush()
+        connection.close_if_unusable_or_obsolete()
+
+
+def _ensure_flusher():
+    global _flusher
+
+    if settings.INTERACTION_FLUSH_INTERVAL is None or _flusher is not None:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=_run, name="interaction-flusher", daemon=True
+            )
+            _flusher.start()
+            atexit.register(flush)
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("interactions", "0003_initial"),
+        ("posts", "0002_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["post", "-date", "-id"], name="comment_post_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="dislike",
+            index=models.Index(fields=["post", "user"], name="dislike_post_user_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="like",
+            index=models.Index(fields=["post", "user"], name="like_post_user_idx"),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:03
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import Count, F, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+CHUNK_SIZE = 1000
+
+
+def count_subquery(model):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(post=OuterRef("pk"))
+            .values("post")
+            .annotate(count=Count("id"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def dedupe(apps, model_name, counter):
+    """Keep the oldest row of each (post, user) pair and recount its post"""
+    model = apps.get_model("interactions", model_name)
+    Post = apps.get_model("posts", "Post")
+    duplicates = (
+        model.objects.values("post", "user")
+        .annotate(keep=Min("id"), rows=Count("id"))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    while True:
+        chunk = list(duplicates[:CHUNK_SIZE])
+        if not chunk:
+            break
+        with transaction.atomic():
+            for pair in chunk:
+                model.objects.filter(post=pair["post"], user=pair["user"]).exclude(
+                    pk=pair["keep"]
+                ).delete()
+            # Historical models send no signals, so counters are rebuilt here
+            Post.objects.filter(pk__in={pair["post"] for pair in chunk}).update(
+                **{counter: count_subquery(model), "version": F("version") + 1}
+            )
+
+
+def dedupe_interactions(apps, schema_editor):
+    dedupe(apps, "Like", "likes_count")
+    dedupe(apps, "Dislike", "dislikes_count")
+
+
+class Migration(migrations.Migration):
+    # Duplicates are removed one chunk per transaction
+    atomic = False
+
+    dependencies = [
+        ("interactions", "0004_hot_path_indexes"),
+        ("posts", "0006_post_search_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_interactions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="dislike",
+            constraint=models.UniqueConstraint(
+                fields=("post", "user"), name="unique_dislike"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="like",
+            constraint=models.UniqueConstraint(
+                fields=("post", "user"), name="unique_like"
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="dislike",
+            name="dislike_post_user_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="like",
+            name="like_post_user_idx",
+        ),
+    ]
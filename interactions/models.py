@@ -1,28 +1,91 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count
 from users.models import User
 from posts.models import Post
 
 
-class Like(models.Model):
+def uncount(model, deltas):
+    from .services import shift_counters
+
+    shift_counters(model, {post_id: -count for post_id, count in deltas.items()})
+
+
+class PostInteractionQuerySet(models.QuerySet):
+    def delete(self):
+        with transaction.atomic():
+            deltas = dict(
+                self.order_by().values_list('post_id').annotate(count=Count('pk')))
+            deleted = super().delete()
+            uncount(self.model, deltas)
+        return deleted
+
+
+class PostInteraction(models.Model):
+    """Base for rows that are counted on their post.
+
+    Saving runs inside a transaction so the post_save counter update in
+    interactions.signals commits or rolls back together with the row.
+    Deletes decrement the counter here rather than in a post_delete
+    receiver, which would turn off fast deletes for the cascades from Post
+    and User; interactions.signals counts the cascades from User in bulk.
+    """
+
+    objects = PostInteractionQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            deleted = super().delete(*args, **kwargs)
+            uncount(type(self), {self.post_id: 1})
+        return deleted
+
+
+class Like(PostInteraction):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='likes_given')
     post = models.ForeignKey(
         Post, on_delete=models.CASCADE, related_name="likes_received")
 
+    class Meta:
+        # Also serves the (post, user) lookups the plain index used to
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'user'], name='unique_like'),
+        ]
 
-class Dislike(models.Model):
+
+class Dislike(PostInteraction):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='dislikes_given')
     post = models.ForeignKey(
         Post, on_delete=models.CASCADE, related_name="dislikes_received")
 
+    class Meta:
+        # Also serves the (post, user) lookups the plain index used to
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'user'], name='unique_dislike'),
+        ]
+
 
-class Comment(models.Model):
+class Comment(PostInteraction):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(
         Post, on_delete=models.CASCADE, related_name="comments")
     content = models.TextField()
     date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', '-date', '-id'],
+                         name='comment_post_date_idx'),
+        ]
+
     def __str__(self) -> str:
         return f"Comment {self.id} made by {self.user} on {self.post.id} at {self.date.strftime('%d %b %Y %H:%M:%S')}"
@@ -0,0 +1,147 @@
+"""
+Race-free like and dislike toggles.
+
+A toggle never reads before it writes: it deletes the viewer's row and,
+only if nothing was deleted, inserts one with ``ON CONFLICT DO NOTHING``
+against the ``(post, user)`` unique constraint. The post's counter is then
+shifted by whatever actually changed and read back with ``RETURNING``, all
+in one transaction. Concurrent double taps therefore cannot create
+duplicate rows or drift the counter.
+
+Toggles bypass the model signals, so the counter update and version bump
+done by interactions.signals for ORM saves happen here instead. With
+``INTERACTION_WRITE_BEHIND`` on, toggles are buffered by interactions.buffer
+and written in batches. ``set_states`` and ``shift_counters`` are the
+batched forms used by bulk writes (posts.bulk). Every counter shift is
+published to live subscribers (social_network.live) once committed.
+"""
+
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Dislike, Like
+from .signals import COUNTER_FIELDS
+from posts.models import Post
+from social_network import live
+
+# The viewer's state after the toggle and the post's new counter value
+Toggle = namedtuple("Toggle", ["active", "count"])
+
+
+def set_state(cursor, model, user_id, post_id, active):
+    """Make the pair's row exist or not; return the change in row count"""
+    table = model._meta.db_table
+    if active:
+        # Inserts nothing for a missing post or a row that already exists
+        cursor.execute(
+            f"INSERT INTO {table} (post_id, user_id) "
+            f"SELECT id, %s FROM {Post._meta.db_table} WHERE id = %s "
+            "ON CONFLICT DO NOTHING",
+            [user_id, post_id],
+        )
+        return cursor.rowcount
+    cursor.execute(
+        f"DELETE FROM {table} WHERE post_id = %s AND user_id = %s",
+        [post_id, user_id],
+    )
+    return -cursor.rowcount
+
+
+def shift_counter(cursor, model, post_id, delta):
+    """Shift the post's counter, bumping its version if it moved.
+
+    Returns the new counter value, or None when there is no such post.
+    """
+    field = COUNTER_FIELDS[model]
+    cursor.execute(
+        f"UPDATE {Post._meta.db_table} "
+        f"SET {field} = {field} + %s, version = version + %s "
+        f"WHERE id = %s RETURNING {field}",
+        [delta, abs(delta), post_id],
+    )
+    row = cursor.fetchone()
+    if row:
+        live.publish_counts({post_id: delta}, field)
+    return row[0] if row else None
+
+
+def set_states(cursor, model, user_id, post_ids, active):
+    """Like ``set_state`` for many posts; return the IDs of the changed rows"""
+    if not post_ids:
+        return set()
+    table = model._meta.db_table
+    placeholders = ", ".join(["%s"] * len(post_ids))
+    if active:
+        cursor.execute(
+            f"INSERT INTO {table} (post_id, user_id) "
+            f"SELECT id, %s FROM {Post._meta.db_table} WHERE id IN ({placeholders}) "
+            "ON CONFLICT DO NOTHING RETURNING post_id",
+            [user_id, *post_ids],
+        )
+    else:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE user_id = %s AND post_id IN ({placeholders}) "
+            "RETURNING post_id",
+            [user_id, *post_ids],
+        )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def shift_counters(model, deltas):
+    """Shift the counter of many posts in one update, ``{post_id: delta}``"""
+    by_delta = defaultdict(list)
+    for post_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(post_id)
+    if not by_delta:
+        return
+    field = COUNTER_FIELDS[model]
+    # One branch per distinct delta rather than per post keeps the
+    # statement small: most batches only shift counters by one
+    shift = Case(
+        *[
+            When(pk__in=post_ids, then=Value(delta))
+            for delta, post_ids in by_delta.items()
+        ],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    Post.objects.filter(pk__in=[pk for pks in by_delta.values() for pk in pks]).update(
+        **{field: F(field) + shift, "version": F("version") + 1}
+    )
+    live.publish_counts(deltas, field)
+
+
+def toggle(model, user_id, post_id):
+    """Flip ``user_id``'s ``model`` row (Like or Dislike) on ``post_id``.
+
+    Raises ``Post.DoesNotExist`` when there is no such post.
+    """
+    if settings.INTERACTION_WRITE_BEHIND:
+        from . import buffer
+
+        result = buffer.toggle(model, user_id, post_id)
+        if result is not None:
+            return Toggle(*result)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        delta = set_state(cursor, model, user_id, post_id, False)
+        active = not delta
+        if active:
+            # Zero when a concurrent toggle inserted the same row first
+            delta = set_state(cursor, model, user_id, post_id, True)
+        count = shift_counter(cursor, model, post_id, delta)
+    if count is None:
+        raise Post.DoesNotExist(post_id)
+    return Toggle(active, count)
+
+
+def toggle_like(user_id, post_id):
+    return toggle(Like, user_id, post_id)
+
+
+def toggle_dislike(user_id, post_id):
+    return toggle(Dislike, user_id, post_id)
@@ -0,0 +1,48 @@
+from django.db.models import Count, F
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Comment, Dislike, Like, uncount
+from posts.models import Post
+from social_network import live
+from users.models import User
+
+COUNTER_FIELDS = {
+    Like: "likes_count",
+    Dislike: "dislikes_count",
+    Comment: "comments_count",
+}
+
+
+def adjust_counter(post_id, field, delta):
+    """Atomically shift one engagement counter of a post and bump its version"""
+    Post.objects.filter(pk=post_id).update(
+        **{field: F(field) + delta, "version": F("version") + 1}
+    )
+    live.publish_counts({post_id: delta}, field)
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Dislike)
+@receiver(post_save, sender=Comment)
+def count_interaction(sender, instance, created, **kwargs):
+    if created:
+        adjust_counter(instance.post_id, COUNTER_FIELDS[sender], 1)
+    elif sender is Comment:
+        # An edited comment changes the post's latest_comments preview
+        Post.objects.filter(pk=instance.post_id).update(version=F("version") + 1)
+
+
+@receiver(pre_delete, sender=User)
+def uncount_user_interactions(sender, instance, **kwargs):
+    # The user's interactions go with fast cascade deletes; the posts they
+    # made go as well, so only the posts of others are counted down
+    for model in COUNTER_FIELDS:
+        deltas = dict(
+            model.objects.filter(user=instance)
+            .exclude(post__author=instance)
+            .order_by()
+            .values_list("post_id")
+            .annotate(count=Count("pk"))
+        )
+        uncount(model, deltas)
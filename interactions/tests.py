@@ -1,3 +1,311 @@
-from django.test import TestCase
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.db import DatabaseError, IntegrityError, connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import buffer, services
+from .models import Comment, Dislike, Like
+from posts.models import Post
+from posts.pagination import keyset_filter
+from social.models import Follow
+from social_network import metrics
+from social_network.testing import OnDiskDatabaseMixin, QueryPlanAssertionsMixin
+from users.models import User
+
+
+class PostCounterTest(TestCase):
+    """Test the denormalized engagement counters on Post"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", password="pass")
+        self.reader = User.objects.create_user(username="reader", password="pass")
+        self.post = Post.objects.create(author=self.author, content="Post")
+
+    def counters(self):
+        self.post.refresh_from_db()
+        return (
+            self.post.likes_count,
+            self.post.dislikes_count,
+            self.post.comments_count,
+        )
+
+    def test_interactions_increment_counters(self):
+        """Test that likes, dislikes and comments bump their counter"""
+        Like.objects.create(user=self.reader, post=self.post)
+        Like.objects.create(user=self.author, post=self.post)
+        Dislike.objects.create(user=self.reader, post=self.post)
+        Comment.objects.create(user=self.reader, post=self.post, content="Hi")
+        self.assertEqual(self.counters(), (2, 1, 1))
+
+    def test_deletes_decrement_counters(self):
+        """Test that deleting interactions, one by one or in bulk, decrements"""
+        like = Like.objects.create(user=self.reader, post=self.post)
+        Comment.objects.create(user=self.reader, post=self.post, content="Hi")
+        Comment.objects.create(user=self.author, post=self.post, content="Yo")
+        like.delete()
+        Comment.objects.filter(post=self.post).delete()
+        self.assertEqual(self.counters(), (0, 0, 0))
+
+    def test_stale_post_save_keeps_counters(self):
+        """Test that saving an outdated Post instance does not reset counters"""
+        stale = Post.objects.get(pk=self.post.pk)
+        Like.objects.create(user=self.reader, post=self.post)
+        stale.content = "Edited"
+        stale.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.content, "Edited")
+        self.assertEqual(self.post.likes_count, 1)
+
+    def test_user_deletion_updates_counters(self):
+        """Test that cascading deletes of a user's interactions decrement"""
+        Like.objects.create(user=self.reader, post=self.post)
+        Comment.objects.create(user=self.reader, post=self.post, content="Hi")
+        self.reader.delete()
+        self.assertEqual(self.counters(), (0, 0, 0))
+
+    def test_post_deletion_fast_deletes_interactions(self):
+        """Test that a post's interactions are deleted without loading them"""
+        for index in range(5):
+            user = User.objects.create_user(username=f"user{index}", password="pass")
+            Like.objects.create(user=user, post=self.post)
+            Comment.objects.create(user=user, post=self.post, content="Hi")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.post.delete()
+
+        self.assertFalse(Like.objects.exists() or Comment.objects.exists())
+        self.assertFalse(
+            [
+                query["sql"]
+                for query in queries
+                if query["sql"].startswith("SELECT") and "interactions_" in query["sql"]
+            ]
+        )
+
+
+class InteractionQueryPlanTest(QueryPlanAssertionsMixin, TestCase):
+    """Test that hot interaction querysets are served from indexes"""
+
+    def test_like_lookup(self):
+        """Test looking up one user's like on a post"""
+        self.assertIndexedPlan(Like.objects.filter(post_id=1, user_id=2))
+
+    def test_dislike_lookup(self):
+        """Test looking up one user's dislike on a post"""
+        self.assertIndexedPlan(Dislike.objects.filter(post_id=1, user_id=2))
+
+    def test_viewer_likes_for_page(self):
+        """Test fetching a viewer's likes for the posts of one page"""
+        self.assertIndexedPlan(Like.objects.filter(user_id=2, post_id__in=[1, 2, 3]))
+
+    def test_comments_page(self):
+        """Test a page of comments on a post"""
+        plan = self.assertIndexedPlan(
+            keyset_filter(Comment.objects.filter(post_id=1), (timezone.now(), 5))[:11]
+        )
+        self.assertIn("comment_post_date_idx", plan[0])
+
+
+class ToggleTest(TestCase):
+    """Test the conditional like and dislike toggles"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", password="pass")
+        self.post = Post.objects.create(author=self.user, content="Post")
+
+    def test_toggle_flips_state_and_count(self):
+        """Test that toggles report the new state and counter"""
+        self.assertEqual(services.toggle_like(self.user.pk, self.post.pk), (True, 1))
+        self.assertEqual(services.toggle_like(self.user.pk, self.post.pk), (False, 0))
+        self.assertEqual(services.toggle_dislike(self.user.pk, self.post.pk), (True, 1))
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.dislikes_count), (0, 1))
+
+    def test_toggle_bumps_version(self):
+        """Test that toggles invalidate cached representations of the post"""
+        version = self.post.version
+        services.toggle_like(self.user.pk, self.post.pk)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.version, version + 1)
+
+    def test_toggle_missing_post(self):
+        """Test that toggling a missing post raises and writes nothing"""
+        with self.assertRaises(Post.DoesNotExist):
+            services.toggle_like(self.user.pk, self.post.pk + 1)
+        self.assertFalse(Like.objects.exists())
+
+    def test_toggle_without_reads(self):
+        """Test that a toggle is writes only, with no SELECT first"""
+        with CaptureQueriesContext(connection) as queries:
+            services.toggle_like(self.user.pk, self.post.pk)
+        statements = [query["sql"].split()[0] for query in queries]
+        self.assertNotIn("SELECT", statements)
+
+    def test_duplicate_rows_are_rejected(self):
+        """Test the unique constraints on likes, dislikes and follows"""
+        other = User.objects.create_user(username="other", password="pass")
+        for model, fields in (
+            (Like, {"user": self.user, "post": self.post}),
+            (Dislike, {"user": self.user, "post": self.post}),
+            (Follow, {"current_user": self.user, "second_user": other}),
+        ):
+            model.objects.create(**fields)
+            with self.subTest(model=model.__name__), self.assertRaises(IntegrityError):
+                model.objects.create(**fields)
+
+
+@override_settings(INTERACTION_WRITE_BEHIND=True, INTERACTION_FLUSH_INTERVAL=None)
+class WriteBehindTest(TestCase):
+    """Test buffered like and dislike toggles"""
+
+    def setUp(self):
+        metrics.reset()
+        self.user = User.objects.create_user(username="reader", password="pass")
+        self.other = User.objects.create_user(username="other", password="pass")
+        self.post = Post.objects.create(author=self.user, content="Post")
+
+    def tearDown(self):
+        buffer.flush()
+
+    def counters(self):
+        self.post.refresh_from_db()
+        return self.post.likes_count, self.post.dislikes_count
+
+    def test_toggles_are_answered_before_the_flush(self):
+        """Test that the caller sees its state while the write is pending"""
+        self.assertEqual(services.toggle_like(self.user.pk, self.post.pk), (True, 1))
+        self.assertEqual(services.toggle_like(self.other.pk, self.post.pk), (True, 2))
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(self.counters(), (0, 0))
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(Like.objects.count(), 2)
+        self.assertEqual(self.counters(), (2, 0))
+        self.assertEqual(services.toggle_like(self.user.pk, self.post.pk), (False, 1))
+        samples = metrics.snapshot()["samples"]
+        self.assertEqual(samples["interactions.buffer.flush_size"]["max"], 2)
+        self.assertIn("interactions.buffer.lag_ms", samples)
+
+    def test_flapping_cancels_out(self):
+        """Test that toggling back and forth never reaches the database"""
+        for _ in range(2):
+            services.toggle_like(self.user.pk, self.post.pk)
+        self.assertEqual(buffer.pending_count(), 0)
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(
+            metrics.snapshot()["counters"]["interactions.buffer.coalesced"], 1
+        )
+
+    def test_flush_reconciles_with_direct_writes(self):
+        """Test that rows written meanwhile do not double-count"""
+        services.toggle_like(self.user.pk, self.post.pk)
+        services.toggle_dislike(self.user.pk, self.post.pk)
+        Like.objects.create(user=self.user, post=self.post)
+
+        buffer.flush()
+
+        self.assertEqual(Like.objects.count(), 1)
+        self.assertEqual(self.counters(), (1, 1))
+
+    def test_failed_flush_is_retried(self):
+        """Test that a failed flush requeues its entries"""
+        services.toggle_like(self.user.pk, self.post.pk)
+        with mock.patch.object(buffer, "_write", side_effect=DatabaseError):
+            self.assertEqual(buffer.flush(), 1)
+
+        self.assertEqual(buffer.pending_count(), 1)
+        self.assertEqual(services.toggle_like(self.other.pk, self.post.pk), (True, 2))
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(self.counters(), (2, 0))
+        self.assertEqual(
+            metrics.snapshot()["counters"]["interactions.buffer.requeued"], 1
+        )
+
+    @override_settings(INTERACTION_BUFFER_LIMIT=1)
+    def test_overflow_writes_synchronously(self):
+        """Test that a full buffer falls back to direct writes"""
+        services.toggle_like(self.user.pk, self.post.pk)
+        services.toggle_like(self.other.pk, self.post.pk)
+
+        self.assertEqual(Like.objects.get().user, self.other)
+        self.assertEqual(
+            metrics.snapshot()["counters"]["interactions.buffer.overflow"], 1
+        )
+
+    def test_api_reports_buffered_state(self):
+        """Test the like endpoint in write-behind mode"""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("interactions:like", args=[self.post.pk]))
+
+        self.assertEqual(response.json()["action"], "Liked")
+        self.assertEqual(response.json()["likes_count"], 1)
+
+
+class ToggleContentionTest(OnDiskDatabaseMixin, TransactionTestCase):
+    """Test toggles hammered from many threads at once"""
+
+    threads = 8
+    rounds = 5
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f"user{i}", password="pass")
+            for i in range(self.threads)
+        ]
+        self.post = Post.objects.create(author=self.users[0], content="Post")
+
+    def hammer(self, work):
+        barrier = threading.Barrier(self.threads)
+        errors = []
+
+        def run(user):
+            try:
+                barrier.wait()
+                for _ in range(self.rounds):
+                    work(user)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=run, args=(user,)) for user in self.users]
+        with self.on_disk_database():
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(errors, [])
+
+    def test_double_taps(self):
+        """Test every user toggling the same like from two threads"""
+
+        def double_tap(user):
+            services.toggle_like(user.pk, self.post.pk)
+
+        # Each user appears twice, so every like is raced by a duplicate
+        self.users = self.users[: self.threads // 2] * 2
+        self.hammer(double_tap)
+
+        self.post.refresh_from_db()
+        likes = Like.objects.filter(post=self.post)
+        self.assertEqual(likes.count(), likes.values("user").distinct().count())
+        self.assertEqual(self.post.likes_count, likes.count())
+
+    def test_concurrent_users(self):
+        """Test that counters stay exact under concurrent toggles"""
+
+        def tap(user):
+            services.toggle_like(user.pk, self.post.pk)
+            services.toggle_dislike(user.pk, self.post.pk)
+
+        self.hammer(tap)
+
+        self.post.refresh_from_db()
+        # An odd number of rounds leaves every user liking and disliking
+        self.assertEqual(self.post.likes_count, self.threads)
+        self.assertEqual(self.post.dislikes_count, self.threads)
+        self.assertEqual(Like.objects.filter(post=self.post).count(), self.threads)
@@ -28,6 +28,8 @@ urlpatterns = [
 # This includes:
 # - /api/posts/ (list, create)
 # - /api/posts/{id}/ (retrieve, update, delete)
+# - /api/posts/bulk/ (custom action)
+# - /api/posts/bulk_reactions/ (custom action)
 # - /api/posts/{id}/like/ (custom action)
 # - /api/posts/{id}/dislike/ (custom action)
 # - /api/posts/{id}/comments/ (custom action)
@@ -37,8 +39,10 @@ urlpatterns = [
 # - /api/users/{id}/posts/ (custom action)
 # - /api/users/{id}/followers/ (custom action)
 # - /api/users/{id}/following/ (custom action)
+# - /api/users/typeahead/?q= (custom action)
 # - /api/comments/ (list, create)
 # - /api/comments/{id}/ (retrieve, update, delete)
+# - /api/comments/bulk/ (custom action)
 # - /api/likes/ (list, create)
 # - /api/likes/{id}/ (retrieve, update, delete)
 # - /api/dislikes/ (list, create)
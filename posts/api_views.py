@@ -1,12 +1,18 @@
 from rest_framework import viewsets, generics, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import NotFound, PermissionDenied
 from django.shortcuts import get_object_or_404
-from django.db.models import Count
 
+from . import bulk
+from . import cache as post_cache
+from . import search
 from .models import Post
+from .pagination import KeysetPagination, SearchPagination
 from .serializers import (
+    BulkCommentSerializer,
+    BulkPostSerializer,
+    BulkReactionSerializer,
     PostSerializer,
     PostCreateSerializer,
     UserSerializer,
@@ -14,17 +20,71 @@ from .serializers import (
     LikeSerializer,
     DislikeSerializer,
 )
+from users import typeahead
 from users.models import User
+from interactions import services
 from interactions.models import Comment, Like, Dislike
+from social.timelines import hydrate_posts
+from social_network.conditional import compute_etag, conditional_response
 
 
-class PostViewSet(viewsets.ModelViewSet):
+def post_page_response(request, paginator, posts):
+    """Paginated response for a page of posts, with conditional GET.
+
+    The ETag covers the viewer and the ``(id, version, author username)`` of
+    every post on the page; likes and comments bump the version, so the
+    viewer flags are covered too, and a renamed author changes it as well.
+    """
+    etag = compute_etag(
+        request,
+        request.user.pk,
+        tuple((post.pk, post.version, post.author.username) for post in posts),
+    )
+    return conditional_response(
+        request,
+        etag,
+        lambda: paginator.get_paginated_response(
+            post_cache.serialize_posts(posts, request)
+        ),
+    )
+
+
+def bulk_write_response(request, serializer_class, write):
+    """Validate a JSON list of items and write the valid ones in one batch.
+
+    Answers 201 when every item was written and 207 with the per-item
+    results when some were not.
+    """
+    serializer = serializer_class(data=request.data, many=True)
+    serializer.is_valid(raise_exception=True)
+    results = write(request.user, serializer.validated_data)
+    failed = any(
+        result["status"] in (bulk.INVALID, bulk.NOT_FOUND) for result in results
+    )
+    return Response(
+        {"results": results},
+        status=status.HTTP_207_MULTI_STATUS if failed else status.HTTP_201_CREATED,
+    )
+
+
+class CachedPostListMixin:
+    """
+    List posts through the versioned representation cache (posts.cache)
+    """
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        return post_page_response(request, self.paginator, page)
+
+
+class PostViewSet(CachedPostListMixin, viewsets.ModelViewSet):
     """
     ViewSet for Post model with full CRUD operations
     """
 
     queryset = Post.objects.all().order_by("-date")
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.action == "create":
@@ -32,20 +92,32 @@ class PostViewSet(viewsets.ModelViewSet):
         return PostSerializer
 
     def get_queryset(self):
-        queryset = Post.objects.all().order_by("-date")
+        queryset = Post.objects.select_related("author").order_by("-date")
 
         # Filter by author if provided
         author = self.request.query_params.get("author", None)
         if author:
             queryset = queryset.filter(author__username=author)
 
-        # Filter by content search
-        search = self.request.query_params.get("search", None)
-        if search:
-            queryset = queryset.filter(content__icontains=search)
-
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get("search", None)
+        if not query:
+            return super().list(request, *args, **kwargs)
+
+        # Ranked full-text search, one index range per page
+        paginator = SearchPagination()
+        author = request.query_params.get("author", None)
+        keys = paginator.paginate_fetch(
+            lambda position, reverse, limit: search.search_keys(
+                query, position, reverse, limit, author=author
+            ),
+            request,
+        )
+        posts = hydrate_posts([post_id for _, post_id in keys])
+        return post_page_response(request, paginator, posts)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -66,40 +138,55 @@ class PostViewSet(viewsets.ModelViewSet):
     )
     def like(self, request, pk=None):
         """Like or unlike a post"""
-        post = self.get_object()
-        user = request.user
-
-        try:
-            like = Like.objects.get(post=post, user=user)
-            like.delete()
-            return Response({"status": "unliked"})
-        except Like.DoesNotExist:
-            Like.objects.create(post=post, user=user)
-            return Response({"status": "liked"})
+        result = self.toggle_interaction(services.toggle_like, pk)
+        return Response(
+            {
+                "status": "liked" if result.active else "unliked",
+                "likes_count": result.count,
+            }
+        )
 
     @action(
         detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated]
     )
     def dislike(self, request, pk=None):
         """Dislike or undislike a post"""
-        post = self.get_object()
-        user = request.user
-
+        result = self.toggle_interaction(services.toggle_dislike, pk)
+        return Response(
+            {
+                "status": "disliked" if result.active else "undisliked",
+                "dislikes_count": result.count,
+            }
+        )
+
+    def toggle_interaction(self, toggle, pk):
+        # One conditional write instead of get_object() plus get-then-write
         try:
-            dislike = Dislike.objects.get(post=post, user=user)
-            dislike.delete()
-            return Response({"status": "undisliked"})
-        except Dislike.DoesNotExist:
-            Dislike.objects.create(post=post, user=user)
-            return Response({"status": "disliked"})
+            return toggle(self.request.user.pk, int(pk))
+        except (ValueError, Post.DoesNotExist):
+            raise NotFound()
+
+    @action(
+        detail=False, methods=["post"], permission_classes=[permissions.IsAuthenticated]
+    )
+    def bulk(self, request):
+        """Create a batch of posts"""
+        return bulk_write_response(request, BulkPostSerializer, bulk.create_posts)
+
+    @action(
+        detail=False, methods=["post"], permission_classes=[permissions.IsAuthenticated]
+    )
+    def bulk_reactions(self, request):
+        """Add or remove a batch of likes and dislikes"""
+        return bulk_write_response(request, BulkReactionSerializer, bulk.set_reactions)
 
     @action(detail=True, methods=["get"])
     def comments(self, request, pk=None):
         """Get comments for a specific post"""
         post = self.get_object()
-        comments = post.comments.all().order_by("-date")
+        comments = self.paginate_queryset(post.comments.select_related("user"))
         serializer = CommentSerializer(comments, many=True)
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     @action(
         detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated]
@@ -137,29 +224,38 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
 
         return queryset
 
+    @action(detail=False, methods=["get"])
+    def typeahead(self, request):
+        """Suggest users whose username starts with ``?q=``, for mentions"""
+        return Response(typeahead.suggest(request.query_params.get("q"), request.user))
+
     @action(detail=True, methods=["get"])
     def posts(self, request, pk=None):
         """Get posts by a specific user"""
         user = self.get_object()
-        posts = user.author.all().order_by("-date")
-        serializer = PostSerializer(posts, many=True, context={"request": request})
-        return Response(serializer.data)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(
+            user.author.select_related("author"), request, view=self
+        )
+        return post_page_response(request, paginator, page)
 
     @action(detail=True, methods=["get"])
     def followers(self, request, pk=None):
         """Get followers of a user"""
         user = self.get_object()
-        followers = user.followers.all()
-        serializer = UserSerializer(followers, many=True)
-        return Response(serializer.data)
+        followers = User.objects.filter(following__second_user=user).order_by("pk")
+        page = self.paginate_queryset(followers)
+        serializer = UserSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=["get"])
     def following(self, request, pk=None):
         """Get users that this user follows"""
         user = self.get_object()
-        following = user.following.all()
-        serializer = UserSerializer(following, many=True)
-        return Response(serializer.data)
+        following = User.objects.filter(followers__current_user=user).order_by("pk")
+        page = self.paginate_queryset(following)
+        serializer = UserSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 
 class CommentViewSet(viewsets.ModelViewSet):
@@ -167,20 +263,27 @@ class CommentViewSet(viewsets.ModelViewSet):
     ViewSet for Comment model
     """
 
-    queryset = Comment.objects.all().order_by("-date")
+    queryset = Comment.objects.select_related("user").order_by("-date")
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(
+        detail=False, methods=["post"], permission_classes=[permissions.IsAuthenticated]
+    )
+    def bulk(self, request):
+        """Create a batch of comments"""
+        return bulk_write_response(request, BulkCommentSerializer, bulk.create_comments)
+
 
 class LikeViewSet(viewsets.ModelViewSet):
     """
     ViewSet for Like model
     """
 
-    queryset = Like.objects.all()
+    queryset = Like.objects.select_related("user", "post__author")
     serializer_class = LikeSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -193,7 +296,7 @@ class DislikeViewSet(viewsets.ModelViewSet):
     ViewSet for Dislike model
     """
 
-    queryset = Dislike.objects.all()
+    queryset = Dislike.objects.select_related("user", "post__author")
     serializer_class = DislikeSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -202,13 +305,14 @@ class DislikeViewSet(viewsets.ModelViewSet):
 
 
 # Additional API endpoints for specific functionality
-class PostListCreateView(generics.ListCreateAPIView):
+class PostListCreateView(CachedPostListMixin, generics.ListCreateAPIView):
     """
     List all posts or create a new post
     """
 
-    queryset = Post.objects.all().order_by("-date")
+    queryset = Post.objects.select_related("author").order_by("-date")
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.request.method == "POST":
@@ -224,7 +328,7 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
     Retrieve, update or delete a post
     """
 
-    queryset = Post.objects.all()
+    queryset = PostSerializer.setup_eager_loading(Post.objects.all())
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
@@ -241,14 +345,15 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
         instance.delete()
 
 
-class UserPostsView(generics.ListAPIView):
+class UserPostsView(CachedPostListMixin, generics.ListAPIView):
     """
     Get all posts by a specific user
     """
 
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         username = self.kwargs["username"]
-        return Post.objects.filter(author__username=username).order_by("-date")
+        return Post.objects.filter(author__username=username).select_related("author")
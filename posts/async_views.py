@@ -0,0 +1,90 @@
+"""
+Async versions of the post read views, served by social_network.async_urls.
+"""
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render
+from rest_framework.exceptions import NotFound
+
+from . import cache as post_cache
+from .models import Post
+from .pagination import (
+    KeysetPagination,
+    apaginate_request,
+    aqueryset_fetcher,
+)
+from .viewer_state import aresolve_viewer_state, liked_post_ids
+from social_network.async_support import error_response, json_response, not_found
+from social_network.conditional import aconditional_response, compute_etag
+
+
+async def post_page_response(request, paginator, posts):
+    """``posts.api_views.post_page_response`` for the async views"""
+    etag = compute_etag(
+        request,
+        request.user.pk,
+        tuple((post.pk, post.version, post.author.username) for post in posts),
+    )
+
+    async def build():
+        data = await post_cache.aserialize_posts(posts, request)
+        return json_response(paginator.get_paginated_data(data))
+
+    return await aconditional_response(request, etag, build)
+
+
+def _posts(request):
+    # PostViewSet.get_queryset
+    queryset = Post.objects.select_related("author")
+    author = request.GET.get("author", None)
+    if author:
+        queryset = queryset.filter(author__username=author)
+    return queryset
+
+
+async def post_list(request):
+    """``PostViewSet.list``; ranked search stays on the sync view"""
+    if request.GET.get("search", None):
+        return None
+    paginator = KeysetPagination()
+    try:
+        posts = await paginator.apaginate_fetch(
+            aqueryset_fetcher(_posts(request)), request
+        )
+    except NotFound as exc:
+        return error_response(exc)
+    return await post_page_response(request, paginator, posts)
+
+
+async def post_detail(request, pk):
+    """``PostViewSet.retrieve``"""
+    try:
+        post = await _posts(request).aget(pk=pk)
+    except Post.DoesNotExist:
+        return not_found(Post)
+    except ValueError:
+        return error_response(NotFound())
+    data = await post_cache.aserialize_posts([post], request)
+    return json_response(data[0])
+
+
+async def index(request):
+    request.user = await request.auser()
+    posts_of_the_page = []
+    user_liked_id = []
+    if request.user.is_authenticated:
+        posts = Post.objects.select_related("author")
+        # Keyset pagination on (date, id)
+        posts_of_the_page = await apaginate_request(request, aqueryset_fetcher(posts))
+
+        user_liked_id = liked_post_ids(
+            await aresolve_viewer_state(
+                request.user, [post.id for post in posts_of_the_page]
+            )
+        )
+    # Templates read the cache and lazy attributes synchronously
+    return await sync_to_async(render)(
+        request,
+        "posts/index.html",
+        {"posts_of_the_page": posts_of_the_page, "user_liked_id": user_liked_id},
+    )
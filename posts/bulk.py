@@ -0,0 +1,145 @@
+"""
+Bulk writes of posts, comments and reactions for integrations and schedulers.
+
+A batch of up to ``BULK_WRITE_MAX_ITEMS`` items is validated item by item
+with a ``many=True`` serializer (posts.serializers.BulkListSerializer), and
+the valid items are written in one transaction with ``bulk_create`` or a
+single conditional insert/delete. Every item gets a result at its index,
+so one bad item does not fail the rest. A batch costs a fixed number of
+queries however many items it holds.
+
+Bulk writes send no model signals, so the counters, version bumps and
+timeline fan-out that posts.signals, interactions.signals and social.signals
+apply to single writes are applied here once per batch.
+"""
+
+from collections import Counter
+
+from django.db import connection, transaction
+
+from .models import Post
+from .serializers import InvalidItem
+from interactions import services
+from interactions.models import Comment, Dislike, Like
+from social import timelines
+from social_network import live
+from users.models import adjust_counter
+
+CREATED = "created"
+DELETED = "deleted"
+UNCHANGED = "unchanged"
+DUPLICATE = "duplicate"
+INVALID = "invalid"
+NOT_FOUND = "not_found"
+
+REACTION_MODELS = {"like": Like, "dislike": Dislike}
+
+
+def valid_items(items):
+    """``(index, data)`` for every item that passed validation"""
+    return [
+        (index, data)
+        for index, data in enumerate(items)
+        if not isinstance(data, InvalidItem)
+    ]
+
+
+def results(items, outcomes):
+    """One result dict per item, from ``{index: {"status": ..., ...}}``"""
+    return [
+        (
+            {"index": index, "status": INVALID, "errors": data.errors}
+            if isinstance(data, InvalidItem)
+            else {"index": index, **outcomes[index]}
+        )
+        for index, data in enumerate(items)
+    ]
+
+
+def existing_posts(post_ids):
+    return set(Post.objects.filter(pk__in=post_ids).values_list("pk", flat=True))
+
+
+def create_posts(author, items):
+    """Create the valid posts of a validated batch; return one result per item"""
+    valid = valid_items(items)
+    with transaction.atomic():
+        posts = Post.objects.bulk_create(
+            [Post(author=author, **data) for _, data in valid]
+        )
+        if posts:
+            adjust_counter(author.pk, "posts_count", len(posts))
+            timelines.fan_out_posts(author.pk, posts)
+            live.publish_posts(posts)
+    return results(
+        items,
+        {
+            index: {"status": CREATED, "id": post.pk}
+            for (index, _), post in zip(valid, posts)
+        },
+    )
+
+
+def create_comments(user, items):
+    """Create the valid comments of a validated batch; return one result per item"""
+    valid = valid_items(items)
+    found = existing_posts({data["post_id"] for _, data in valid})
+    outcomes = {}
+    commented = [(index, data) for index, data in valid if data["post_id"] in found]
+    with transaction.atomic():
+        comments = Comment.objects.bulk_create(
+            [Comment(user=user, **data) for _, data in commented]
+        )
+        services.shift_counters(
+            Comment, Counter(comment.post_id for comment in comments)
+        )
+    for (index, _), comment in zip(commented, comments):
+        outcomes[index] = {"status": CREATED, "id": comment.pk}
+    for index, data in valid:
+        outcomes.setdefault(index, {"status": NOT_FOUND})
+    return results(items, outcomes)
+
+
+def set_reactions(user, items):
+    """Add or remove the likes and dislikes of a validated batch.
+
+    Setting a state rather than toggling it makes a batch safe to retry.
+    When several items name the same reaction on the same post, the last
+    one wins and the others are reported as duplicates.
+    """
+    valid = valid_items(items)
+    found = existing_posts({data["post_id"] for _, data in valid})
+    outcomes = {}
+    wanted = {}
+    for index, data in valid:
+        if data["post_id"] not in found:
+            outcomes[index] = {"status": NOT_FOUND}
+            continue
+        key = (REACTION_MODELS[data["reaction"]], data["post_id"])
+        if key in wanted:
+            outcomes[wanted[key][0]] = {"status": DUPLICATE}
+        wanted[key] = (index, data["active"])
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model in REACTION_MODELS.values():
+            changed = {}
+            for active in (True, False):
+                post_ids = sorted(
+                    post_id
+                    for (key_model, post_id), (_, state) in wanted.items()
+                    if key_model is model and state is active
+                )
+                for post_id in services.set_states(
+                    cursor, model, user.pk, post_ids, active
+                ):
+                    changed[post_id] = 1 if active else -1
+            services.shift_counters(model, changed)
+            for (key_model, post_id), (index, active) in wanted.items():
+                if key_model is model:
+                    status = (
+                        (CREATED if active else DELETED)
+                        if post_id in changed
+                        else UNCHANGED
+                    )
+                    outcomes[index] = {"status": status}
+    return results(items, outcomes)
@@ -0,0 +1,119 @@
+"""
+Versioned cache of serialized posts.
+
+The viewer-independent part of a post (content, author, image, counters
+and the latest comments preview) is cached under ``post:{id}:{created}:v{version}``.
+Every change to a post bumps ``Post.version`` in the same transaction, so
+stale entries are never read again and simply expire. List endpoints
+multi-get a page, serialize only the misses and then overlay the per-viewer
+flags, the author (loaded with the page, so a rename shows at once) and the
+absolute image URLs. The async variant fills the misses and resolves the
+viewer flags concurrently.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+
+from . import variants
+from .serializers import PostSerializer, UserMinimalSerializer
+from .viewer_state import (
+    ANONYMOUS_STATE,
+    aresolve_viewer_state,
+    resolve_viewer_state,
+)
+from social_network import metrics
+
+POST_CACHE_KEY = "post:{}:{}:v{}"
+
+# Representation field -> ViewerState attribute
+VIEWER_FIELDS = {
+    "is_liked_by_user": "is_liked",
+    "is_disliked_by_user": "is_disliked",
+    "is_commented_by_user": "is_commented",
+    "is_author": "is_author",
+}
+
+
+def cache_key(post):
+    # The creation time guards against IDs reused after a rollback or restore
+    return POST_CACHE_KEY.format(post.pk, post.date.timestamp(), post.version)
+
+
+def _fill(posts):
+    """Serialize posts without a request, ready to be shared by every viewer"""
+    prefetch_related_objects(posts, PostSerializer.latest_comments_prefetch())
+    data = PostSerializer(posts, many=True).data
+    entries = {}
+    for post, representation in zip(posts, data):
+        for field in VIEWER_FIELDS:
+            representation.pop(field, None)
+        entries[cache_key(post)] = dict(representation)
+    cache.set_many(entries, settings.POST_CACHE_TTL)
+    return entries
+
+
+def serialize_posts(posts, request):
+    """Serialize a page of posts for ``request`` through the cache"""
+    posts = list(posts)
+    keys = [cache_key(post) for post in posts]
+    entries = cache.get_many(keys)
+    misses = _count_misses(posts, keys, entries)
+    if misses:
+        with metrics.timer("posts.cache.fill_ms"):
+            entries.update(_fill(misses))
+
+    states = resolve_viewer_state(request.user, [post.pk for post in posts])
+    return _overlay(posts, keys, entries, states, request)
+
+
+async def aserialize_posts(posts, request):
+    """``serialize_posts`` for the async views"""
+    posts = list(posts)
+    keys = [cache_key(post) for post in posts]
+    entries = await cache.aget_many(keys)
+    misses = _count_misses(posts, keys, entries)
+
+    async def fill():
+        if not misses:
+            return {}
+        with metrics.timer("posts.cache.fill_ms"):
+            return await sync_to_async(_fill)(misses)
+
+    filled, states = await asyncio.gather(
+        fill(), aresolve_viewer_state(request.user, [post.pk for post in posts])
+    )
+    entries.update(filled)
+    return _overlay(posts, keys, entries, states, request)
+
+
+def _count_misses(posts, keys, entries):
+    misses = [post for post, key in zip(posts, keys) if key not in entries]
+    metrics.incr("posts.cache.hits", len(posts) - len(misses))
+    metrics.incr("posts.cache.misses", len(misses))
+    return misses
+
+
+def _overlay(posts, keys, entries, states, request):
+    """Add the viewer flags, author and absolute image URLs to cached entries"""
+    data = []
+    for post, key in zip(posts, keys):
+        representation = dict(entries[key])
+        # Replaces the cached copy in place, keeping the field order
+        representation["author"] = UserMinimalSerializer(post.author).data
+        state = states.get(post.pk, ANONYMOUS_STATE)
+        for field, attribute in VIEWER_FIELDS.items():
+            representation[field] = getattr(state, attribute)
+        if representation.get("image_cover"):
+            representation["image_cover"] = request.build_absolute_uri(
+                representation["image_cover"]
+            )
+        if representation.get("image_variants"):
+            representation["image_variants"] = variants.absolutize(
+                representation["image_variants"], request.build_absolute_uri
+            )
+        data.append(representation)
+    return data
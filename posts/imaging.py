@@ -0,0 +1,99 @@
+"""
+Image variant rendering, run in the worker processes of posts.variants.
+
+Only Pillow and the standard library are imported here, so worker
+processes start without setting up Django. ``render`` takes the bytes of an
+upload and returns the encoded variants; storage and the database stay with
+the caller.
+
+JPEG sources are decoded in draft mode: the decoder scales by 1/2, 1/4 or
+1/8 while decoding, down to the smallest size still covering the largest
+variant, which costs a fraction of a full decode of a large photo. Each
+smaller variant is then resized from the previous one. The EXIF
+orientation is applied to the pixels and no metadata is written out.
+"""
+
+import base64
+import io
+import math
+
+from PIL import Image, ImageFilter, ImageOps
+
+# EXIF Orientation tag, and the orientations that swap width and height
+ORIENTATION = 0x0112
+TRANSPOSED = {5, 6, 7, 8}
+
+# Format -> (Pillow format, file extension)
+FORMATS = {
+    "webp": ("WEBP", "webp"),
+    "jpeg": ("JPEG", "jpg"),
+}
+
+
+def open_image(data, largest):
+    """Decode ``data``, in draft mode down to ``largest`` pixels wide"""
+    image = Image.open(io.BytesIO(data))
+    transposed = image.getexif().get(ORIENTATION) in TRANSPOSED
+    display_width = image.height if transposed else image.width
+    if display_width > largest:
+        scale = largest / display_width
+        image.draft(
+            "RGB", (math.ceil(image.width * scale), math.ceil(image.height * scale))
+        )
+    image = ImageOps.exif_transpose(image)
+    if image.mode == "P":
+        image = image.convert("RGBA")
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+    return image
+
+
+def resize(image, width, ratio=None):
+    """``image`` scaled down to ``width``, never up, keeping ``ratio``"""
+    if image.width <= width:
+        return image
+    ratio = ratio or image.height / image.width
+    height = max(1, round(width * ratio))
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def encode(image, output, quality):
+    if output == "jpeg" and image.mode == "RGBA":
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, FORMATS[output][0], quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def placeholder(image, width):
+    """A tiny blurred WebP of ``image`` as a data URI"""
+    small = resize(image, width).filter(ImageFilter.GaussianBlur(1))
+    data = encode(small, "webp", 30)
+    return "data:image/webp;base64," + base64.b64encode(data).decode()
+
+
+def render(data, widths, quality, placeholder_width):
+    """
+    Render the variants of an image.
+
+    ``widths`` maps variant names to their largest width. Returns the
+    placeholder and, per variant, its size and one encoding per format.
+    """
+    image = open_image(data, max(widths.values()))
+    result = {
+        "placeholder": placeholder(image, placeholder_width),
+        "variants": {},
+    }
+    # Largest first, each resized from the one before; heights follow the
+    # decoded image so rounding does not add up
+    ratio = image.height / image.width
+    for name, width in sorted(widths.items(), key=lambda item: -item[1]):
+        image = resize(image, width, ratio)
+        result["variants"][name] = {
+            "width": image.width,
+            "height": image.height,
+            "files": {output: encode(image, output, quality) for output in FORMATS},
+        }
+    return result
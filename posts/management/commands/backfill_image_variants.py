@@ -0,0 +1,107 @@
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, wait
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import imaging, variants
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the resized variants and placeholders of existing post images "
+        "in parallel worker processes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=4, help="Number of worker processes"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of posts read per query",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Render again images that already have variants",
+        )
+
+    def handle(self, *args, **options):
+        workers, chunk_size = options["workers"], options["chunk_size"]
+        if workers < 1 or chunk_size < 1:
+            raise CommandError("--workers and --chunk-size must be positive.")
+
+        self.rendered = self.failed = 0
+        posts = self.pending(chunk_size, options["force"])
+        if workers == 1:
+            for post in posts:
+                data = self.read(post)
+                if data is not None:
+                    self.finish(
+                        post,
+                        partial(imaging.render, data, **variants.render_options()),
+                    )
+        else:
+            with variants.process_pool(workers) as pool:
+                self.run(pool, workers, posts)
+        self.stdout.write(f"Rendered {self.rendered} images, {self.failed} failed")
+
+    def pending(self, chunk_size, force):
+        """Posts with an image and no variants of it, in ID chunks"""
+        posts = (
+            Post.objects.exclude(image_cover="")
+            .exclude(image_cover__isnull=True)
+            .only("pk", "image_cover", "image_variants")
+            .order_by("pk")
+        )
+        last_pk = 0
+        while True:
+            chunk = list(posts.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                return
+            for post in chunk:
+                if force or not variants.current(post):
+                    yield post
+            last_pk = chunk[-1].pk
+
+    def run(self, pool, workers, posts):
+        # Sources are read and variants written here, with at most two
+        # images per worker in flight, so memory stays bounded
+        in_flight = {}
+        for post in posts:
+            if len(in_flight) >= 2 * workers:
+                self.collect(in_flight, FIRST_COMPLETED)
+            data = self.read(post)
+            if data is not None:
+                future = pool.submit(imaging.render, data, **variants.render_options())
+                in_flight[future] = post
+        self.collect(in_flight, ALL_COMPLETED)
+
+    def collect(self, in_flight, return_when):
+        done, _ = wait(in_flight, return_when=return_when)
+        for future in done:
+            self.finish(in_flight.pop(future), future.result)
+
+    def read(self, post):
+        try:
+            return variants.read_source(post.image_cover.name)
+        except OSError as exc:
+            self.fail(post, exc)
+            return None
+
+    def finish(self, post, render):
+        try:
+            rendered = render()
+        except Exception as exc:
+            # Pillow raises a variety of errors for damaged files
+            self.fail(post, exc)
+            return
+        if variants.store(post.pk, post.image_cover.name, rendered) is not None:
+            self.rendered += 1
+
+    def fail(self, post, exc):
+        self.failed += 1
+        self.stderr.write(f"Post {post.pk} ({post.image_cover.name}): {exc}")
@@ -0,0 +1,136 @@
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from interactions import services
+from posts import bulk
+from posts.models import Post
+from posts.serializers import (
+    BulkCommentSerializer,
+    BulkPostSerializer,
+    BulkReactionSerializer,
+    CommentSerializer,
+    PostCreateSerializer,
+)
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the throughput of bulk post, comment and like writes with "
+        "one write per item. Everything runs in a transaction that is rolled "
+        "back. HTTP and auth overhead are not included, so the real gap per "
+        "request is larger."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--items",
+            type=int,
+            default=500,
+            help="Number of items written by each path",
+        )
+
+    def handle(self, *args, **options):
+        items = options["items"]
+        if items < 1:
+            raise CommandError("--items must be positive.")
+
+        try:
+            with transaction.atomic():
+                self.run(items)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, items):
+        user = User.objects.create_user(username="benchmark-bulk-writes")
+        target = Post.objects.create(author=user, content="Benchmark")
+        posts = [{"content": f"Post {i}"} for i in range(items)]
+        comments = [
+            {"post_id": target.pk, "content": f"Comment {i}"} for i in range(items)
+        ]
+
+        # PostCreateSerializer takes the author from the request
+        context = {"request": SimpleNamespace(user=user)}
+
+        def post_one(data):
+            serializer = PostCreateSerializer(data=data, context=context)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+
+        def comment_one(data):
+            serializer = CommentSerializer(
+                data={
+                    "post": data["post_id"],
+                    "content": data["content"],
+                    "user_id": user.pk,
+                }
+            )
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+
+        # Likes need a post each, created outside the timed blocks
+        single_likes = Post.objects.bulk_create(
+            [Post(author=user, content=str(i)) for i in range(items)]
+        )
+        bulk_likes = Post.objects.bulk_create(
+            [Post(author=user, content=str(i)) for i in range(items)]
+        )
+
+        self.compare(
+            "posts",
+            items,
+            lambda: self.each(posts, post_one),
+            lambda: self.batch(BulkPostSerializer, posts, user, bulk.create_posts),
+        )
+        self.compare(
+            "comments",
+            items,
+            lambda: self.each(comments, comment_one),
+            lambda: self.batch(
+                BulkCommentSerializer, comments, user, bulk.create_comments
+            ),
+        )
+        self.compare(
+            "likes",
+            items,
+            lambda: self.each(
+                single_likes, lambda post: services.toggle_like(user.pk, post.pk)
+            ),
+            lambda: self.batch(
+                BulkReactionSerializer,
+                [{"post_id": post.pk, "reaction": "like"} for post in bulk_likes],
+                user,
+                bulk.set_reactions,
+            ),
+        )
+
+    def each(self, items, write):
+        # One transaction per item, as one request per item would have
+        for item in items:
+            with transaction.atomic():
+                write(item)
+
+    def batch(self, serializer_class, items, user, write):
+        serializer = serializer_class(data=items, many=True)
+        serializer.is_valid(raise_exception=True)
+        write(user, serializer.validated_data)
+
+    def compare(self, name, items, single, batched):
+        timings = []
+        for run in (single, batched):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        single_s, bulk_s = timings
+        self.stdout.write(
+            f"{name}: {items / single_s:.0f} items/s one by one, "
+            f"{items / bulk_s:.0f} items/s in bulk ({single_s / bulk_s:.1f}x)"
+        )
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from posts import search
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of post content in ID chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Number of posts re-indexed per transaction",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        backend = search.get_backend()
+        with connection.cursor() as cursor:
+            backend.repair(cursor)
+
+        # Each chunk is swapped in one transaction, so the index stays
+        # searchable and writes keep flowing while the rebuild runs
+        ids = Post.objects.order_by("pk").values_list("pk", flat=True)
+        last_pk = 0
+        total = 0
+        while True:
+            chunk = list(ids.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            with transaction.atomic(), connection.cursor() as cursor:
+                backend.reindex(cursor, chunk[0], chunk[-1])
+            last_pk = chunk[-1]
+            total += len(chunk)
+
+        with connection.cursor() as cursor:
+            backend.optimize(cursor)
+        self.stdout.write(f"Re-indexed {total} posts")
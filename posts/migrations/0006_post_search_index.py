@@ -0,0 +1,84 @@
+from django.db import migrations
+
+# The DDL of posts.search as of this migration, inlined so later changes to
+# the app code cannot alter what this migration does
+
+SQLITE_INSTALL = [
+    # The index keeps its own copy of the text rather than reading it from
+    # posts_post: deleting a row from an external-content index needs the
+    # exact old text, which makes chunked rebuilds unsafe while posts are
+    # being edited
+    """CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts USING fts5(
+        content, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO posts_post_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete AFTER DELETE ON posts_post
+    BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_post_fts_update
+    AFTER UPDATE OF content ON posts_post
+    BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+        INSERT INTO posts_post_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    "DELETE FROM posts_post_fts",
+    "INSERT INTO posts_post_fts(rowid, content) SELECT id, content FROM posts_post",
+]
+
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS posts_post_fts_insert",
+    "DROP TRIGGER IF EXISTS posts_post_fts_delete",
+    "DROP TRIGGER IF EXISTS posts_post_fts_update",
+    "DROP TABLE IF EXISTS posts_post_fts",
+]
+
+POSTGRESQL_INSTALL = [
+    # Adding a stored generated column rewrites the table once, which also
+    # indexes every existing post
+    "ALTER TABLE posts_post ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS posts_post_search_vector_idx "
+    "ON posts_post USING GIN (search_vector)",
+]
+
+POSTGRESQL_UNINSTALL = [
+    "DROP INDEX IF EXISTS posts_post_search_vector_idx",
+    "ALTER TABLE posts_post DROP COLUMN IF EXISTS search_vector",
+]
+
+# Vendor -> (install, uninstall); other databases fall back to LIKE scans
+STATEMENTS = {
+    "sqlite": (SQLITE_INSTALL, SQLITE_UNINSTALL),
+    "postgresql": (POSTGRESQL_INSTALL, POSTGRESQL_UNINSTALL),
+}
+
+
+def run(schema_editor, index):
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements is None:
+        return
+    for statement in statements[index]:
+        schema_editor.execute(statement, params=None)
+
+
+def install_search_index(apps, schema_editor):
+    run(schema_editor, 0)
+
+
+def uninstall_search_index(apps, schema_editor):
+    run(schema_editor, 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0005_post_version"),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -1,6 +1,7 @@
 from django.core.exceptions import ValidationError
 from django.core.validators import FileExtensionValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from users.models import User
 
 
@@ -17,10 +18,48 @@ class Post(models.Model):
     date = models.DateTimeField(auto_now_add=True)
     image_cover = models.ImageField(upload_to='img/', null=True, validators=[
                                     FileExtensionValidator(['jpg', 'jpeg', 'png']), validate_image_size])
+    # Resized variants of image_cover and their placeholder, written in the
+    # background by posts.variants
+    image_variants = models.JSONField(null=True, blank=True, editable=False)
     likes = models.ManyToManyField(
         User, through='interactions.Like', related_name='liked_posts')
     dislikes = models.ManyToManyField(
         User, through='interactions.Dislike', related_name='disliked_posts')
+    # Denormalized engagement counters, maintained by interactions.signals
+    likes_count = models.PositiveIntegerField(default=0)
+    dislikes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    # Bumped on every change to the serialized post, see posts.cache
+    version = models.PositiveIntegerField(default=1)
+
+    COUNTER_FIELDS = ('likes_count', 'dislikes_count', 'comments_count',
+                      'version')
+    # Written in the background with update(), never by a full save
+    BACKGROUND_FIELDS = ('image_variants',)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-date', '-id'], name='post_date_idx'),
+            models.Index(fields=['author', '-date', '-id'],
+                         name='post_author_date_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Counters are only ever written with F() updates, so a full save of
+        # a stale instance must not overwrite them
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS + self.BACKGROUND_FIELDS
+            ]
+        adding = self._state.adding
+        # Keep the row and the author's posts_count from posts.signals together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not adding:
+                Post.objects.filter(pk=self.pk).update(version=F('version') + 1)
+                self.version += 1
 
     def __str__(self) -> str:
         return f"Post {self.id} made by {self.author} on {self.date.strftime('%d %b %Y %H:%M:%S')}"
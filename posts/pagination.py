@@ -0,0 +1,323 @@
+"""
+Keyset (cursor) pagination on ``(date, id)``.
+
+Pages are read with ``WHERE (date, id) < cursor ORDER BY date DESC, id DESC
+LIMIT n + 1``, so no ``COUNT(*)`` or ``OFFSET`` is ever issued and every page
+costs the same no matter how deep the client scrolls. Cursors are opaque
+base64 tokens holding the boundary key and the direction of travel. Ranked
+search results page the same way on ``(score, id)`` (see posts.search), and
+lists without a date, such as a user's mutuals, on a bare ascending ID.
+"""
+
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+CURSOR_QUERY_PARAM = "cursor"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(position, reverse=False):
+    date, pk = position
+    token = f"{date.isoformat()}|{pk}|{int(reverse)}"
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return ``((date, id), reverse)`` for a cursor string"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date, pk, reverse = base64.urlsafe_b64decode(padded).decode().split("|")
+        return (datetime.fromisoformat(date), int(pk)), reverse == "1"
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise InvalidCursor(cursor)
+
+
+def keyset_filter(
+    queryset, position=None, reverse=False, date_field="date", pk_field="id"
+):
+    """Restrict a queryset to the rows after ``position`` in feed order.
+
+    Feed order is newest first; with ``reverse`` the rows before
+    ``position`` are returned oldest first instead.
+    """
+    if position is not None:
+        date, pk = position
+        op = "gt" if reverse else "lt"
+        # The redundant inclusive bound lets the planner turn the OR into
+        # an index range instead of scanning from the top of the index
+        queryset = queryset.filter(
+            Q(**{f"{date_field}__{op}": date})
+            | Q(**{date_field: date, f"{pk_field}__{op}": pk}),
+            **{f"{date_field}__{op}e": date},
+        )
+    if reverse:
+        return queryset.order_by(date_field, pk_field)
+    return queryset.order_by(f"-{date_field}", f"-{pk_field}")
+
+
+def id_keyset_filter(queryset, position=None, reverse=False, field="id"):
+    """``keyset_filter`` for lists in ascending ``field`` order"""
+    if position is not None:
+        op = "lt" if reverse else "gt"
+        queryset = queryset.filter(**{f"{field}__{op}": position})
+    return queryset.order_by(f"-{field}" if reverse else field)
+
+
+def item_key(item):
+    """The ``(date, id)`` sort key of a model instance, or a bare key"""
+    if isinstance(item, (tuple, int)):
+        return item
+    return (item.date, item.pk)
+
+
+class KeysetPage:
+    """One page of results plus the cursors around it"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def encode_rank_cursor(position, reverse=False):
+    score, pk = position
+    token = f"{score!r}|{pk}|{int(reverse)}"
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")
+
+
+def decode_rank_cursor(cursor):
+    """Return ``((score, id), reverse)`` for a search cursor string"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, pk, reverse = base64.urlsafe_b64decode(padded).decode().split("|")
+        return (float(score), int(pk)), reverse == "1"
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise InvalidCursor(cursor)
+
+
+def encode_id_cursor(position, reverse=False):
+    token = f"{position}|{int(reverse)}"
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")
+
+
+def decode_id_cursor(cursor):
+    """Return ``(id, reverse)`` for an ID cursor string"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        pk, reverse = base64.urlsafe_b64decode(padded).decode().split("|")
+        return int(pk), reverse == "1"
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise InvalidCursor(cursor)
+
+
+def paginate(fetch, cursor, page_size, encode=encode_cursor, decode=decode_cursor):
+    """Build a ``KeysetPage`` from a fetch callable.
+
+    ``fetch(position, reverse, limit)`` must return up to ``limit`` items
+    after ``position`` in the requested direction, like ``keyset_filter``.
+    ``encode`` and ``decode`` swap the cursor format for keys other than
+    ``(date, id)``.
+    """
+    position, reverse = decode(cursor) if cursor else (None, False)
+    items = list(fetch(position, reverse, page_size + 1))
+    return _build_page(items, position, reverse, page_size, encode)
+
+
+async def apaginate(
+    fetch, cursor, page_size, encode=encode_cursor, decode=decode_cursor
+):
+    """``paginate`` for a coroutine ``fetch``, as used by the async views"""
+    position, reverse = decode(cursor) if cursor else (None, False)
+    items = list(await fetch(position, reverse, page_size + 1))
+    return _build_page(items, position, reverse, page_size, encode)
+
+
+def _build_page(items, position, reverse, page_size, encode):
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    if reverse:
+        items.reverse()
+        has_next, has_previous = position is not None, has_more
+    else:
+        has_next, has_previous = has_more, position is not None
+
+    next_cursor = previous_cursor = None
+    if items and has_next:
+        next_cursor = encode(item_key(items[-1]))
+    if items and has_previous:
+        previous_cursor = encode(item_key(items[0]), reverse=True)
+    return KeysetPage(items, next_cursor, previous_cursor)
+
+
+def queryset_fetcher(queryset):
+    def fetch(position, reverse, limit):
+        return keyset_filter(queryset, position, reverse)[:limit]
+
+    return fetch
+
+
+def aqueryset_fetcher(queryset):
+    async def fetch(position, reverse, limit):
+        return [
+            item async for item in keyset_filter(queryset, position, reverse)[:limit]
+        ]
+
+    return fetch
+
+
+def paginate_request(request, fetch, page_size=10):
+    """Keyset-paginate for the HTML views; a bad cursor restarts at the top"""
+    try:
+        return paginate(fetch, request.GET.get(CURSOR_QUERY_PARAM), page_size)
+    except InvalidCursor:
+        return paginate(fetch, None, page_size)
+
+
+async def apaginate_request(request, fetch, page_size=10):
+    """``paginate_request`` for a coroutine ``fetch``"""
+    try:
+        return await apaginate(fetch, request.GET.get(CURSOR_QUERY_PARAM), page_size)
+    except InvalidCursor:
+        return await apaginate(fetch, None, page_size)
+
+
+class PageSizePagination(PageNumberPagination):
+    """
+    Default page-number pagination that also honours ``?page_size=``
+    """
+
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    DRF pagination over ``(date, id)`` for posts, comments and feeds
+    """
+
+    page_size = settings.REST_FRAMEWORK["PAGE_SIZE"]
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = CURSOR_QUERY_PARAM
+    invalid_cursor_message = "Invalid cursor"
+    encode_cursor = staticmethod(encode_cursor)
+    decode_cursor = staticmethod(decode_cursor)
+
+    def get_page_size(self, request):
+        # request.GET rather than query_params: the async views page with
+        # plain Django requests
+        try:
+            size = int(request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_fetch(queryset_fetcher(queryset), request)
+
+    def paginate_fetch(self, fetch, request):
+        """Paginate any source exposing the ``fetch`` protocol of ``paginate``"""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        try:
+            self.page = paginate(fetch, *self.get_page_arguments(request))
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        return list(self.page)
+
+    async def apaginate_fetch(self, fetch, request):
+        """``paginate_fetch`` for a coroutine ``fetch``"""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        try:
+            self.page = await apaginate(fetch, *self.get_page_arguments(request))
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        return list(self.page)
+
+    def get_page_arguments(self, request):
+        return (
+            request.GET.get(self.cursor_query_param),
+            self.get_page_size(request),
+            self.encode_cursor,
+            self.decode_cursor,
+        )
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self.get_link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self.get_link(self.page.previous_cursor)
+
+    def get_paginated_data(self, data):
+        return {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class SearchPagination(KeysetPagination):
+    """
+    Keyset pagination over ``(score, id)`` for ranked search results
+    """
+
+    encode_cursor = staticmethod(encode_rank_cursor)
+    decode_cursor = staticmethod(decode_rank_cursor)
+
+
+class IdPagination(KeysetPagination):
+    """
+    Keyset pagination over a bare ID for lists in ID order
+    """
+
+    encode_cursor = staticmethod(encode_id_cursor)
+    decode_cursor = staticmethod(decode_id_cursor)
@@ -0,0 +1,246 @@
+"""
+Full-text search over post content.
+
+Each database gets an index that is kept in sync by the database itself, so
+no application code path can forget to update it:
+
+- SQLite: an FTS5 table ``posts_post_fts`` keyed by post ID, maintained by
+  triggers on ``posts_post``. The update trigger only fires when ``content``
+  changes, so counter and version bumps never touch the index.
+- PostgreSQL: a generated ``tsvector`` column with a GIN index.
+- Anything else: an unindexed ``LIKE`` scan, kept only as a fallback.
+
+Results are ranked (bm25 on SQLite, ``ts_rank_cd`` on PostgreSQL) and read
+one keyset page at a time on ``(score, id)``, lowest score first, where a
+lower score is a better match. The last search term is matched as a prefix
+so results follow the user while they type.
+"""
+
+import re
+
+from django.db import connection
+
+from social_network import metrics
+
+from .models import Post
+from users.models import User
+
+# Search terms beyond this are ignored, bounding the cost of one query
+MAX_TERMS = 8
+# Shorter trailing terms are matched exactly; a one-letter prefix would
+# expand to a large part of the vocabulary
+MIN_PREFIX_LENGTH = 2
+
+TERM_RE = re.compile(r"\w+")
+
+
+def parse_terms(query):
+    """Split a user query into lowercase word terms"""
+    return TERM_RE.findall((query or "").lower())[:MAX_TERMS]
+
+
+class SearchBackend:
+    """
+    Fallback backend: ``LIKE`` on every term, newest matches first
+    """
+
+    table = Post._meta.db_table
+
+    def install(self, cursor):
+        """Create the index structures and index every existing post"""
+
+    def uninstall(self, cursor):
+        """Drop the index structures"""
+
+    def repair(self, cursor):
+        """Restore structures lost to a table rebuild; safe to run any time"""
+
+    def reindex(self, cursor, first_id, last_id):
+        """Re-index the posts with ``first_id <= id <= last_id``"""
+
+    def optimize(self, cursor):
+        """Compact the index after a bulk rebuild"""
+
+    def match(self, terms):
+        """Return ``(from_sql, where_sql, score_sql, params)`` for ``terms``"""
+        where = " AND ".join(
+            f"UPPER({self.table}.content) LIKE UPPER(%s)" for _ in terms
+        )
+        return self.table, where, "0", [f"%{term}%" for term in terms]
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    FTS5 index with a prefix index for two and three letter prefixes
+    """
+
+    fts_table = f"{Post._meta.db_table}_fts"
+
+    def triggers(self):
+        table, fts = self.table, self.fts_table
+        return [
+            f"""CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO {fts}(rowid, content) VALUES (new.id, new.content);
+            END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM {fts} WHERE rowid = old.id;
+            END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {fts}_update
+            AFTER UPDATE OF content ON {table}
+            BEGIN
+                DELETE FROM {fts} WHERE rowid = old.id;
+                INSERT INTO {fts}(rowid, content) VALUES (new.id, new.content);
+            END""",
+        ]
+
+    def install(self, cursor):
+        # The index keeps its own copy of the text rather than reading it
+        # from posts_post: deleting a row from an external-content index
+        # needs the exact old text, which makes chunked rebuilds unsafe
+        # while posts are being edited
+        cursor.execute(
+            f"""CREATE VIRTUAL TABLE IF NOT EXISTS {self.fts_table} USING fts5(
+                content, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+            )"""
+        )
+        for trigger in self.triggers():
+            cursor.execute(trigger)
+        cursor.execute(f"DELETE FROM {self.fts_table}")
+        cursor.execute(
+            f"INSERT INTO {self.fts_table}(rowid, content) "
+            f"SELECT id, content FROM {self.table}"
+        )
+
+    def uninstall(self, cursor):
+        for suffix in ("insert", "delete", "update"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {self.fts_table}_{suffix}")
+        cursor.execute(f"DROP TABLE IF EXISTS {self.fts_table}")
+
+    def repair(self, cursor):
+        # Altering posts_post on SQLite copies it into a new table, which
+        # drops its triggers
+        if self.fts_table in cursor.db.introspection.table_names(cursor):
+            for trigger in self.triggers():
+                cursor.execute(trigger)
+
+    def reindex(self, cursor, first_id, last_id):
+        cursor.execute(
+            f"DELETE FROM {self.fts_table} WHERE rowid BETWEEN %s AND %s",
+            [first_id, last_id],
+        )
+        cursor.execute(
+            f"INSERT INTO {self.fts_table}(rowid, content) "
+            f"SELECT id, content FROM {self.table} WHERE id BETWEEN %s AND %s",
+            [first_id, last_id],
+        )
+
+    def optimize(self, cursor):
+        cursor.execute(
+            f"INSERT INTO {self.fts_table}({self.fts_table}) VALUES ('optimize')"
+        )
+
+    def match(self, terms):
+        phrases = [f'"{term}"' for term in terms]
+        if len(terms[-1]) >= MIN_PREFIX_LENGTH:
+            phrases[-1] += "*"
+        return (
+            f"{self.fts_table} JOIN {self.table} ON {self.table}.id = {self.fts_table}.rowid",
+            f"{self.fts_table} MATCH %s",
+            f"bm25({self.fts_table})",
+            [" ".join(phrases)],
+        )
+
+
+class PostgreSQLSearchBackend(SearchBackend):
+    """
+    Generated ``tsvector`` column with a GIN index
+    """
+
+    config = "english"
+    column = "search_vector"
+
+    def install(self, cursor):
+        # Adding a stored generated column rewrites the table once, which
+        # also indexes every existing post
+        cursor.execute(
+            f"ALTER TABLE {self.table} ADD COLUMN IF NOT EXISTS {self.column} tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('{self.config}', coalesce(content, ''))) "
+            "STORED"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_{self.column}_idx "
+            f"ON {self.table} USING GIN ({self.column})"
+        )
+
+    def uninstall(self, cursor):
+        cursor.execute(f"DROP INDEX IF EXISTS {self.table}_{self.column}_idx")
+        cursor.execute(f"ALTER TABLE {self.table} DROP COLUMN IF EXISTS {self.column}")
+
+    def reindex(self, cursor, first_id, last_id):
+        # Rewriting the rows recomputes the generated column
+        cursor.execute(
+            f"UPDATE {self.table} SET content = content WHERE id BETWEEN %s AND %s",
+            [first_id, last_id],
+        )
+
+    def match(self, terms):
+        lexemes = list(terms)
+        if len(terms[-1]) >= MIN_PREFIX_LENGTH:
+            lexemes[-1] += ":*"
+        return (
+            f"{self.table} CROSS JOIN to_tsquery('{self.config}', %s) AS query",
+            f"{self.table}.{self.column} @@ query",
+            f"-ts_rank_cd({self.table}.{self.column}, query)",
+            [" & ".join(lexemes)],
+        )
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgreSQLSearchBackend,
+}
+
+
+def get_backend(using=None):
+    """The search backend for a connection (the default one if omitted)"""
+    return BACKENDS.get((using or connection).vendor, SearchBackend)()
+
+
+def search_keys(query, position=None, reverse=False, limit=10, author=None):
+    """Return up to ``limit`` ``(score, id)`` keys of posts matching ``query``.
+
+    Keys come best match first, newest first among equal scores, starting
+    after ``position``; with ``reverse`` the keys before ``position`` are
+    returned in the opposite order, like ``pagination.keyset_filter``.
+    ``author`` restricts the results to one username.
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return []
+
+    from_sql, where_sql, score_sql, params = get_backend().match(terms)
+    if author is not None:
+        where_sql += (
+            f" AND {Post._meta.db_table}.author_id IN "
+            f"(SELECT id FROM {User._meta.db_table} WHERE username = %s)"
+        )
+        params.append(author)
+
+    keyset = ""
+    if position is not None:
+        score, pk = position
+        score_op, pk_op = (">", "<") if not reverse else ("<", ">")
+        keyset = f"WHERE score {score_op} %s OR (score = %s AND id {pk_op} %s)"
+        params += [score, score, pk]
+    order = "score DESC, id ASC" if reverse else "score ASC, id DESC"
+
+    sql = (
+        f"SELECT score, id FROM (SELECT {score_sql} AS score, "
+        f"{Post._meta.db_table}.id AS id FROM {from_sql} WHERE {where_sql}) "
+        f"AS matches {keyset} ORDER BY {order} LIMIT %s"
+    )
+    with metrics.timer("posts.search_ms"), connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        return [(float(score), pk) for score, pk in cursor.fetchall()]
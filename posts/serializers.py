@@ -1,16 +1,19 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Prefetch
 from rest_framework import serializers
 from users.models import User
+from posts import variants
 from posts.models import Post
+from posts.viewer_state import resolve_viewer_state, viewer_state_for
 from interactions.models import Comment, Like, Dislike
 
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for User model"""
 
-    posts_count = serializers.SerializerMethodField()
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
-
     class Meta:
         model = User
         fields = [
@@ -25,16 +28,14 @@ class UserSerializer(serializers.ModelSerializer):
             "followers_count",
             "following_count",
         ]
-        read_only_fields = ["id", "date_joined", "last_login"]
-
-    def get_posts_count(self, obj):
-        return obj.author.count()
-
-    def get_followers_count(self, obj):
-        return obj.followers.count()
-
-    def get_following_count(self, obj):
-        return obj.following.count()
+        read_only_fields = [
+            "id",
+            "date_joined",
+            "last_login",
+            "posts_count",
+            "followers_count",
+            "following_count",
+        ]
 
 
 class UserMinimalSerializer(serializers.ModelSerializer):
@@ -62,31 +63,48 @@ class CommentSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class PostListSerializer(serializers.ListSerializer):
+    """Resolve the viewer state of a whole page before serializing it"""
+
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, models.Manager) else data)
+        request = self.context.get("request")
+        if request is not None:
+            self.context.setdefault("viewer_state", {}).update(
+                resolve_viewer_state(request.user, [post.pk for post in posts])
+            )
+        return super().to_representation(posts)
+
+
 class PostSerializer(serializers.ModelSerializer):
     """Serializer for Post model"""
 
     author = UserMinimalSerializer(read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
-    likes_count = serializers.SerializerMethodField()
-    dislikes_count = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
+    latest_comments = serializers.SerializerMethodField()
     is_liked_by_user = serializers.SerializerMethodField()
     is_disliked_by_user = serializers.SerializerMethodField()
+    is_commented_by_user = serializers.SerializerMethodField()
+    is_author = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
+        list_serializer_class = PostListSerializer
         fields = [
             "id",
             "author",
             "content",
             "date",
             "image_cover",
+            "image_variants",
             "likes_count",
             "dislikes_count",
             "comments_count",
             "is_liked_by_user",
             "is_disliked_by_user",
-            "comments",
+            "is_commented_by_user",
+            "is_author",
+            "latest_comments",
         ]
         read_only_fields = [
             "id",
@@ -96,28 +114,61 @@ class PostSerializer(serializers.ModelSerializer):
             "comments_count",
             "is_liked_by_user",
             "is_disliked_by_user",
+            "is_commented_by_user",
+            "is_author",
         ]
 
-    def get_likes_count(self, obj):
-        return obj.likes.count()
-
-    def get_dislikes_count(self, obj):
-        return obj.dislikes.count()
+    @staticmethod
+    def latest_comments_queryset(queryset=None):
+        if queryset is None:
+            queryset = Comment.objects.all()
+        return queryset.select_related("user").order_by("-date", "-id")[
+            : settings.POST_COMMENT_PREVIEW_SIZE
+        ]
 
-    def get_comments_count(self, obj):
-        return obj.comments.count()
+    @classmethod
+    def latest_comments_prefetch(cls):
+        # A sliced prefetch is a single ROW_NUMBER() window query per page
+        return Prefetch(
+            "comments",
+            queryset=cls.latest_comments_queryset(),
+            to_attr="latest_comments",
+        )
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Load everything this serializer reads in a fixed number of queries"""
+        return queryset.select_related("author").prefetch_related(
+            cls.latest_comments_prefetch()
+        )
+
+    def get_latest_comments(self, obj):
+        comments = getattr(obj, "latest_comments", None)
+        if comments is None:
+            comments = self.latest_comments_queryset(obj.comments.all())
+        return CommentSerializer(comments, many=True).data
 
     def get_is_liked_by_user(self, obj):
-        request = self.context.get("request")
-        if request and request.user.is_authenticated:
-            return obj.likes_received.filter(user=request.user).exists()
-        return False
+        return viewer_state_for(obj, self.context).is_liked
 
     def get_is_disliked_by_user(self, obj):
+        return viewer_state_for(obj, self.context).is_disliked
+
+    def get_is_commented_by_user(self, obj):
+        return viewer_state_for(obj, self.context).is_commented
+
+    def get_is_author(self, obj):
+        return viewer_state_for(obj, self.context).is_author
+
+    def get_image_variants(self, obj):
+        meta = variants.current(obj)
+        if meta is None:
+            return None
+        description = variants.describe(meta)
         request = self.context.get("request")
-        if request and request.user.is_authenticated:
-            return obj.dislikes_received.filter(user=request.user).exists()
-        return False
+        if request is not None:
+            description = variants.absolutize(description, request.build_absolute_uri)
+        return description
 
     def create(self, validated_data):
         # Set the author to the current user
@@ -137,6 +188,63 @@ class PostCreateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+# An item of a bulk write that failed validation, with its errors
+InvalidItem = namedtuple("InvalidItem", ["errors"])
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    Validate a batch item by item, keeping the valid items.
+
+    ``validated_data`` holds one entry per item, in order: its validated
+    data, or an ``InvalidItem``. Only a malformed batch (not a list, empty,
+    or longer than ``BULK_WRITE_MAX_ITEMS``) fails ``is_valid()``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("allow_empty", False)
+        kwargs.setdefault("max_length", settings.BULK_WRITE_MAX_ITEMS)
+        super().__init__(*args, **kwargs)
+
+    def run_child_validation(self, data):
+        try:
+            return super().run_child_validation(data)
+        except serializers.ValidationError as exc:
+            return InvalidItem(exc.detail)
+
+
+class BulkPostSerializer(serializers.ModelSerializer):
+    """Serializer for one post of a bulk create (images go through the single create)"""
+
+    class Meta:
+        model = Post
+        fields = ["content"]
+        list_serializer_class = BulkListSerializer
+
+
+class BulkCommentSerializer(serializers.Serializer):
+    """Serializer for one comment of a bulk create"""
+
+    # A plain ID: a related field would look up each item's post separately
+    post_id = serializers.IntegerField(min_value=1)
+    content = serializers.CharField()
+
+    class Meta:
+        list_serializer_class = BulkListSerializer
+
+
+class BulkReactionSerializer(serializers.Serializer):
+    """Serializer for one like or dislike of a bulk write"""
+
+    post_id = serializers.IntegerField(min_value=1)
+    reaction = serializers.ChoiceField(choices=["like", "dislike"])
+    # False removes the reaction
+    active = serializers.BooleanField(default=True)
+
+    class Meta:
+        list_serializer_class = BulkListSerializer
+
+
 class PostMinimalSerializer(serializers.ModelSerializer):
     """Minimal Post serializer to avoid circular imports"""
 
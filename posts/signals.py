@@ -0,0 +1,69 @@
+from functools import partial
+
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from . import search, variants
+from .models import Post
+from social_network import live
+from users.models import User, adjust_counter
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    if created:
+        adjust_counter(instance.author_id, "posts_count", 1)
+
+
+@receiver(post_save, sender=Post)
+def announce_post(sender, instance, created, **kwargs):
+    if created:
+        live.publish_posts([instance])
+
+
+@receiver(post_save, sender=Post)
+def render_image_variants(sender, instance, **kwargs):
+    variants.schedule(instance)
+
+
+@receiver(post_delete, sender=Post)
+def delete_image_variants(sender, instance, **kwargs):
+    if instance.image_variants:
+        transaction.on_commit(partial(variants.delete_files, instance.image_variants))
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    adjust_counter(instance.author_id, "posts_count", -1)
+
+
+@receiver(pre_save, sender=User)
+def note_rename(sender, instance, update_fields=None, **kwargs):
+    instance._renamed = (
+        not instance._state.adding
+        and (update_fields is None or "username" in update_fields)
+        and User.objects.filter(pk=instance.pk)
+        .exclude(username=instance.username)
+        .exists()
+    )
+
+
+@receiver(post_save, sender=User)
+def refresh_commented_posts(sender, instance, **kwargs):
+    # Cached comment previews carry the names of their authors; the post
+    # author is overlaid at read time by posts.cache
+    if getattr(instance, "_renamed", False):
+        Post.objects.filter(comments__user=instance).update(version=F("version") + 1)
+
+
+@receiver(post_migrate)
+def repair_search_index(sender, using, **kwargs):
+    # Migrations that alter posts_post on SQLite rebuild the table and drop
+    # the search triggers with it
+    if sender.name != "posts":
+        return
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        search.get_backend(connection).repair(cursor)
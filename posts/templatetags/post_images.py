@@ -0,0 +1,22 @@
+from django import template
+from django.conf import settings
+
+from posts import variants
+
+register = template.Library()
+
+
+@register.inclusion_tag("posts/components/post_image.html")
+def post_image(post):
+    """The image of a post, as responsive variants once they are rendered"""
+    meta = variants.current(post)
+    return {
+        "post": post,
+        "image": variants.describe(meta) if meta is not None else None,
+    }
+
+
+@register.simple_tag
+def post_cache_ttl():
+    """``POST_CACHE_TTL``, so cached cards expire with cached representations"""
+    return settings.POST_CACHE_TTL
@@ -1,10 +1,32 @@
-from django.test import TestCase
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
+from PIL import Image
+from . import imaging, search, variants
 from .models import Post
+from .serializers import PostSerializer
+from .pagination import decode_cursor, encode_cursor, keyset_filter
+from .viewer_state import ViewerState, resolve_viewer_state
+from django.core.cache import cache
+from social_network import metrics
 from interactions.models import Comment, Like, Dislike
+from social.models import Follow, TimelineEntry
+from social_network.testing import QueryPlanAssertionsMixin
 
 User = get_user_model()
 
@@ -247,8 +269,8 @@ class PostCommentAPITest(APITestCase):
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]["content"], "Test comment")
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["content"], "Test comment")
 
     def test_add_comment_to_post(self):
         """Test adding a comment to a post"""
@@ -268,3 +290,871 @@ class PostCommentAPITest(APITestCase):
         response = self.client.post(url, data)
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(POST_COMMENT_PREVIEW_SIZE=2)
+class PostCommentPreviewTest(APITestCase):
+    """Test bounded comment previews and the paginated comment thread"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="pass")
+        self.post = Post.objects.create(author=self.user, content="Viral post")
+        self.comments = [
+            Comment.objects.create(user=self.user, post=self.post, content=f"C{i}")
+            for i in range(25)
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_embeds_latest_comments_only(self):
+        """Test that a post list carries only the newest comments"""
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("post-list"))
+        post = response.data["results"][0]
+        self.assertNotIn("comments", post)
+        self.assertEqual(
+            [comment["content"] for comment in post["latest_comments"]],
+            ["C24", "C23"],
+        )
+        self.assertEqual(post["comments_count"], 25)
+
+    def test_detail_embeds_latest_comments(self):
+        """Test that a single post carries the same bounded preview"""
+        response = self.client.get(reverse("post-detail", args=[self.post.pk]))
+        self.assertEqual(len(response.data["latest_comments"]), 2)
+
+    def test_serialize_without_prefetch(self):
+        """Test that a post loaded on its own still gets its preview"""
+        data = PostSerializer(Post.objects.get(pk=self.post.pk)).data
+        self.assertEqual(
+            [comment["content"] for comment in data["latest_comments"]],
+            ["C24", "C23"],
+        )
+
+    def test_comment_thread_is_keyset_paginated(self):
+        """Test walking the full comment thread page by page"""
+        url = reverse("post-comments", args=[self.post.pk])
+        contents, params = [], {"page_size": 10}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 10)
+            contents.extend(comment["content"] for comment in response.data["results"])
+            url, params = response.data["next"], {}
+        self.assertEqual(contents, [f"C{i}" for i in reversed(range(25))])
+
+
+class PostCursorPaginationTest(APITestCase):
+    """Test keyset pagination of post listings"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        self.posts = [
+            Post.objects.create(author=self.user, content=f"Post {i}")
+            for i in range(5)
+        ]
+        # Two posts sharing a timestamp must still page deterministically
+        Post.objects.filter(pk=self.posts[2].pk).update(date=self.posts[1].date)
+
+    def collect(self, url, **params):
+        ids = []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            ids.extend(post["id"] for post in response.data["results"])
+            url, params = response.data["next"], {}
+        return ids
+
+    def test_cursor_walks_every_post_once(self):
+        """Test that following next links returns each post once, newest first"""
+        ids = self.collect(reverse("post-list"), page_size=2)
+
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(len(set(ids)), 5)
+        self.assertEqual(ids[0], self.posts[4].id)
+        self.assertEqual(ids[-1], self.posts[0].id)
+
+    def test_previous_link_returns_previous_page(self):
+        """Test walking back with the previous link"""
+        first = self.client.get(reverse("post-list"), {"page_size": 2})
+        second = self.client.get(first.data["next"])
+        back = self.client.get(second.data["previous"])
+
+        self.assertIsNone(first.data["previous"])
+        self.assertEqual(
+            [post["id"] for post in back.data["results"]],
+            [post["id"] for post in first.data["results"]],
+        )
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is rejected"""
+        response = self.client.get(reverse("post-list"), {"cursor": "not-a-cursor"})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_round_trip(self):
+        """Test that cursors decode back to their key and direction"""
+        post = self.posts[0]
+        cursor = encode_cursor((post.date, post.id), reverse=True)
+
+        self.assertEqual(decode_cursor(cursor), ((post.date, post.id), True))
+
+    def test_index_page_uses_cursor(self):
+        """Test that the HTML index pages with cursors"""
+        for i in range(10):
+            Post.objects.create(author=self.user, content=f"More {i}")
+        self.client.force_login(self.user)
+
+        first = self.client.get(reverse("posts:index"))
+        page = first.context["posts_of_the_page"]
+        self.assertEqual(len(page), 10)
+        self.assertTrue(page.has_next())
+
+        second = self.client.get(reverse("posts:index"), {"cursor": page.next_cursor})
+        self.assertEqual(len(second.context["posts_of_the_page"]), 5)
+
+    def test_list_query_count_ignores_engagement(self):
+        """Test that counters do not cost a query per post"""
+        other = User.objects.create_user(username="other", password="testpass123")
+        for post in self.posts:
+            Like.objects.create(user=other, post=post)
+            Comment.objects.create(user=other, post=post, content="Hi")
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("post-list"))
+        self.assertFalse(
+            [q["sql"] for q in queries.captured_queries if "COUNT(" in q["sql"]]
+        )
+        self.assertEqual(response.data["results"][0]["likes_count"], 1)
+        self.assertEqual(response.data["results"][0]["comments_count"], 1)
+
+
+class ViewerStateTest(APITestCase):
+    """Test batched resolution of per-viewer post flags"""
+
+    def setUp(self):
+        self.viewer = User.objects.create_user(username="viewer", password="pass")
+        self.author = User.objects.create_user(username="author", password="pass")
+        self.own = Post.objects.create(author=self.viewer, content="Mine")
+        self.liked = Post.objects.create(author=self.author, content="Liked")
+        self.other = Post.objects.create(author=self.author, content="Other")
+        Like.objects.create(user=self.viewer, post=self.liked)
+        Dislike.objects.create(user=self.viewer, post=self.other)
+        Comment.objects.create(user=self.viewer, post=self.other, content="Hm")
+        Like.objects.create(user=self.author, post=self.other)
+
+    def test_resolve_in_one_query(self):
+        """Test that every flag of every post comes from a single query"""
+        with self.assertNumQueries(1):
+            states = resolve_viewer_state(
+                self.viewer, [self.own.pk, self.liked.pk, self.other.pk]
+            )
+        self.assertEqual(states[self.own.pk], ViewerState(False, False, False, True))
+        self.assertEqual(states[self.liked.pk], ViewerState(True, False, False, False))
+        self.assertEqual(states[self.other.pk], ViewerState(False, True, True, False))
+
+    def test_list_flags(self):
+        """Test that list responses carry the viewer flags"""
+        self.client.force_authenticate(user=self.viewer)
+        response = self.client.get(reverse("post-list"))
+        flags = {
+            post["id"]: (
+                post["is_liked_by_user"],
+                post["is_disliked_by_user"],
+                post["is_commented_by_user"],
+                post["is_author"],
+            )
+            for post in response.data["results"]
+        }
+        self.assertEqual(flags[self.own.pk], (False, False, False, True))
+        self.assertEqual(flags[self.liked.pk], (True, False, False, False))
+        self.assertEqual(flags[self.other.pk], (False, True, True, False))
+
+    def test_detail_flags(self):
+        """Test that a single post resolves its own flags"""
+        self.client.force_authenticate(user=self.viewer)
+        response = self.client.get(reverse("post-detail", args=[self.liked.pk]))
+        self.assertTrue(response.data["is_liked_by_user"])
+        self.assertFalse(response.data["is_author"])
+
+    def test_anonymous_flags(self):
+        """Test that anonymous viewers get every flag unset"""
+        response = self.client.get(reverse("post-list"))
+        self.assertFalse(
+            any(post["is_liked_by_user"] for post in response.data["results"])
+        )
+
+    def test_index_liked_ids(self):
+        """Test that the HTML index marks liked posts from the same layer"""
+        self.client.force_login(self.viewer)
+        response = self.client.get(reverse("posts:index"))
+        self.assertEqual(response.context["user_liked_id"], [self.liked.pk])
+
+
+class PostRepresentationCacheTest(APITestCase):
+    """Test the versioned cache of serialized posts"""
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.author = User.objects.create_user(username="author", password="pass")
+        self.reader = User.objects.create_user(username="reader", password="pass")
+        self.post = Post.objects.create(author=self.author, content="Cached")
+
+    def get_post(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse("post-list"))
+        return response.data["results"][0]
+
+    def test_second_read_is_a_hit(self):
+        """Test that a repeated list is served from the cache"""
+        self.get_post(self.reader)
+        self.get_post(self.reader)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["counters"]["posts.cache.misses"], 1)
+        self.assertEqual(snapshot["counters"]["posts.cache.hits"], 1)
+        self.assertEqual(snapshot["ratios"]["posts.cache.hit_ratio"], 0.5)
+        self.assertEqual(snapshot["samples"]["posts.cache.fill_ms"]["count"], 1)
+
+    def test_viewer_flags_are_overlaid(self):
+        """Test that one cached entry serves viewers with different flags"""
+        Like.objects.create(user=self.reader, post=self.post)
+        self.assertTrue(self.get_post(self.reader)["is_liked_by_user"])
+        author_view = self.get_post(self.author)
+        self.assertFalse(author_view["is_liked_by_user"])
+        self.assertTrue(author_view["is_author"])
+        self.assertEqual(metrics.snapshot()["counters"]["posts.cache.hits"], 1)
+
+    def test_interactions_bump_version(self):
+        """Test that likes and comments invalidate the cached post"""
+        self.get_post(self.reader)
+        Like.objects.create(user=self.reader, post=self.post)
+        comment = Comment.objects.create(user=self.reader, post=self.post, content="A")
+        self.assertEqual(self.get_post(self.reader)["likes_count"], 1)
+
+        comment.content = "B"
+        comment.save()
+        post = self.get_post(self.reader)
+        self.assertEqual(post["latest_comments"][0]["content"], "B")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.version, 4)
+
+    def test_renames_are_not_stale(self):
+        """Test that renamed post and comment authors show at once"""
+        Comment.objects.create(user=self.reader, post=self.post, content="Hi")
+        self.get_post(self.reader)
+        self.author.username = "writer"
+        self.author.save()
+        self.reader.username = "commenter"
+        self.reader.save()
+
+        post = self.get_post(self.reader)
+        self.assertEqual(post["author"]["username"], "writer")
+        self.assertEqual(post["latest_comments"][0]["user"]["username"], "commenter")
+
+    def test_edits_bump_version(self):
+        """Test that API and HTML edits invalidate the cached post"""
+        self.get_post(self.author)
+        self.client.patch(
+            reverse("post-detail", args=[self.post.pk]), {"content": "API edit"}
+        )
+        self.assertEqual(self.get_post(self.author)["content"], "API edit")
+
+        self.client.force_login(self.author)
+        self.client.post(
+            reverse("posts:edit_post", args=[self.post.pk]),
+            json.dumps({"content": "HTML edit"}),
+            content_type="application/json",
+        )
+        self.assertEqual(self.get_post(self.author)["content"], "HTML edit")
+
+
+class PostConditionalGetTest(APITestCase):
+    """Test ETags and 304 responses on post lists"""
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.user = User.objects.create_user(username="reader", password="pass")
+        self.post = Post.objects.create(author=self.user, content="Poll me")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("post-list")
+
+    def test_headers(self):
+        """Test that post lists are private, revalidated and vary on the viewer"""
+        response = self.client.get(self.url)
+        self.assertTrue(response.has_header("ETag"))
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("no-cache", response["Cache-Control"])
+        for header in ("Accept", "Cookie", "Authorization"):
+            self.assertIn(header, response["Vary"])
+
+    def test_author_rename_changes_etag(self):
+        """Test that a renamed author is not answered with a 304"""
+        etag = self.client.get(self.url)["ETag"]
+        self.user.username = "renamed"
+        self.user.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["author"]["username"], "renamed")
+
+    def test_not_modified_skips_serialization(self):
+        """Test that a matching If-None-Match costs only the page query"""
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+        counters = metrics.snapshot()["counters"]
+        self.assertEqual(counters["posts.cache.misses"], 1)
+        self.assertEqual(counters["posts.cache.hits"], 0)
+        self.assertEqual(counters["http.not_modified"], 1)
+
+    def test_interaction_changes_etag(self):
+        """Test that a like invalidates the viewer's validator"""
+        etag = self.client.get(self.url)["ETag"]
+        Like.objects.create(user=self.user, post=self.post)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["results"][0]["is_liked_by_user"])
+
+    def test_etag_depends_on_viewer(self):
+        """Test that another viewer does not reuse the validator"""
+        etag = self.client.get(self.url)["ETag"]
+        other = User.objects.create_user(username="other", password="pass")
+        self.client.force_authenticate(user=other)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class PostCardFragmentCacheTest(TestCase):
+    """Test the fragment-cached post cards of the HTML pages"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="author", password="pass")
+        self.reader = User.objects.create_user(username="reader", password="pass")
+        self.post = Post.objects.create(author=self.user, content="Original")
+        Like.objects.create(user=self.reader, post=self.post)
+        self.post.refresh_from_db()
+
+    def test_cards_are_cached_per_version(self):
+        """Test that a card is reused until the post version changes"""
+        self.client.force_login(self.reader)
+        self.assertContains(self.client.get(reverse("posts:index")), "Original")
+
+        # Bypasses the version bump, so the cached card is still served
+        Post.objects.filter(pk=self.post.pk).update(content="Sneaky")
+        self.assertContains(self.client.get(reverse("posts:index")), "Original")
+
+        self.post.content = "Edited"
+        self.post.save()
+        self.assertContains(self.client.get(reverse("posts:index")), "Edited")
+
+    @override_settings(POST_CACHE_TTL=0)
+    def test_cards_expire_with_post_cache_ttl(self):
+        """Test that cards are cached for POST_CACHE_TTL seconds"""
+        self.client.force_login(self.reader)
+        self.client.get(reverse("posts:index"))
+
+        Post.objects.filter(pk=self.post.pk).update(content="Sneaky")
+        self.assertContains(self.client.get(reverse("posts:index")), "Sneaky")
+
+    def test_cards_follow_author_renames(self):
+        """Test that a renamed author does not get a stale card"""
+        self.client.force_login(self.reader)
+        self.client.get(reverse("posts:index"))
+        self.user.username = "writer"
+        self.user.save()
+        response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, 'data-author="writer"')
+        self.assertNotContains(response, 'data-author="author"')
+
+    def test_viewer_state_is_an_overlay(self):
+        """Test that cards carry no viewer state and the page ships it as JSON"""
+        for user, liked in ((self.reader, [self.post.pk]), (self.user, [])):
+            self.client.force_login(user)
+            response = self.client.get(reverse("posts:index"))
+            self.assertContains(response, 'data-author="author"')
+            self.assertNotContains(response, "onclick=")
+            self.assertContains(
+                response,
+                f'<script id="liked-post-ids" type="application/json">{json.dumps(liked)}</script>',
+                html=False,
+            )
+
+    def test_scripts_ship_once(self):
+        """Test that the client code is one static file, not inline per card"""
+        Post.objects.create(author=self.user, content="Second")
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, "social_network/posts.js", count=1)
+        self.assertNotContains(response, "function getCookie")
+        self.assertContains(response, 'id="modal_edit_post"', count=1)
+
+
+class PostSearchTest(APITestCase):
+    """Test ranked full-text search of post content"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="pw")
+        self.other = User.objects.create_user(username="other", password="pw")
+        self.weak = Post.objects.create(author=self.user, content="Django tips")
+        self.strong = Post.objects.create(
+            author=self.other, content="Django django django"
+        )
+        Post.objects.create(author=self.user, content="Nothing relevant")
+
+    def search(self, query, **params):
+        response = self.client.get(reverse("post-list"), {"search": query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def ids(self, response):
+        return [post["id"] for post in response.data["results"]]
+
+    def test_results_are_ranked(self):
+        """Test that better matches come first"""
+        self.assertEqual(
+            self.ids(self.search("django")), [self.strong.id, self.weak.id]
+        )
+
+    def test_prefix_of_last_term(self):
+        """Test that the last term matches as a prefix"""
+        self.assertEqual(len(self.ids(self.search("tips dja"))), 1)
+        self.assertEqual(self.ids(self.search("dj")), [self.strong.id, self.weak.id])
+        self.assertEqual(self.ids(self.search("d")), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Test that the index is kept in sync with post content"""
+        self.weak.content = "Flask tips"
+        self.weak.save()
+        self.assertEqual(self.ids(self.search("flask")), [self.weak.id])
+        self.assertEqual(self.ids(self.search("django")), [self.strong.id])
+
+        self.strong.delete()
+        self.assertEqual(self.ids(self.search("django")), [])
+
+    def test_cursor_pages(self):
+        """Test walking ranked results with next and previous links"""
+        for i in range(3):
+            Post.objects.create(author=self.user, content=f"Django note {i}")
+        first = self.search("django", page_size=2)
+        second = self.client.get(first.data["next"])
+        third = self.client.get(second.data["next"])
+        back = self.client.get(second.data["previous"])
+
+        ids = self.ids(first) + self.ids(second) + self.ids(third)
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(len(set(ids)), 5)
+        self.assertIsNone(third.data["next"])
+        self.assertEqual(self.ids(back), self.ids(first))
+
+    def test_filter_by_author(self):
+        """Test combining search with the author filter"""
+        self.assertEqual(
+            self.ids(self.search("django", author="testuser")), [self.weak.id]
+        )
+
+    def test_invalid_cursor(self):
+        """Test that a date cursor is not accepted by search"""
+        cursor = encode_cursor((self.weak.date, self.weak.id))
+        response = self.client.get(
+            reverse("post-list"), {"search": "django", "cursor": cursor}
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_rebuild_command(self):
+        """Test that the rebuild command restores a damaged index"""
+        backend = search.get_backend()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {backend.fts_table}")
+        self.assertEqual(self.ids(self.search("django")), [])
+
+        out = StringIO()
+        call_command("rebuild_search_index", chunk_size=2, stdout=out)
+
+        self.assertIn("Re-indexed 3 posts", out.getvalue())
+        self.assertEqual(
+            self.ids(self.search("django")), [self.strong.id, self.weak.id]
+        )
+
+
+class BulkWriteTest(APITestCase):
+    """Test the bulk post, comment and reaction endpoints"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="writer", password="pw")
+        self.follower = User.objects.create_user(username="reader", password="pw")
+        Follow.objects.create(current_user=self.follower, second_user=self.user)
+        self.post = Post.objects.create(author=self.user, content="Existing")
+        self.client.force_authenticate(user=self.user)
+
+    def post_batch(self, name, items):
+        return self.client.post(reverse(name), items, format="json")
+
+    def statuses(self, response):
+        return [result["status"] for result in response.data["results"]]
+
+    def test_bulk_create_posts(self):
+        """Test that valid posts are created and invalid ones reported"""
+        response = self.post_batch(
+            "post-bulk",
+            [{"content": "One"}, {"content": "x" * 141}, {"content": "Two"}],
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(self.statuses(response), ["created", "invalid", "created"])
+        self.assertIn("content", response.data["results"][1]["errors"])
+        created = [response.data["results"][i]["id"] for i in (0, 2)]
+        self.assertEqual(
+            list(Post.objects.filter(pk__in=created).values_list("content", flat=True)),
+            ["One", "Two"],
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.posts_count, 3)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.follower, post__in=created).count(),
+            2,
+        )
+
+    def test_bulk_create_comments(self):
+        """Test bulk comments, including one on a missing post"""
+        response = self.post_batch(
+            "comment-bulk",
+            [
+                {"post_id": self.post.pk, "content": "First"},
+                {"post_id": 999999, "content": "Lost"},
+                {"post_id": self.post.pk, "content": "Second"},
+            ],
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(self.statuses(response), ["created", "not_found", "created"])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        self.assertEqual(self.post.version, 2)
+
+    def test_bulk_reactions(self):
+        """Test setting likes and dislikes in one batch"""
+        other = Post.objects.create(author=self.follower, content="Other")
+        Like.objects.create(user=self.user, post=other)
+        items = [
+            {"post_id": self.post.pk, "reaction": "like"},
+            {"post_id": other.pk, "reaction": "like", "active": False},
+            {"post_id": other.pk, "reaction": "dislike"},
+            {"post_id": self.post.pk, "reaction": "like"},
+        ]
+
+        response = self.post_batch("post-bulk-reactions", items)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            self.statuses(response), ["duplicate", "deleted", "created", "created"]
+        )
+        self.post.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.dislikes_count), (1, 0))
+        self.assertEqual((other.likes_count, other.dislikes_count), (0, 1))
+
+        # Replaying the batch changes nothing
+        response = self.post_batch("post-bulk-reactions", items[1:])
+        self.assertEqual(self.statuses(response), ["unchanged"] * 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        """Test that every bulk endpoint costs the same for 1 and 20 items"""
+        batches = {
+            "post-bulk": lambda n: [{"content": str(i)} for i in range(n)],
+            "comment-bulk": lambda n: [
+                {"post_id": self.post.pk, "content": str(i)} for i in range(n)
+            ],
+            "post-bulk-reactions": lambda n: [
+                {"post_id": post.pk, "reaction": "like"}
+                for post in Post.objects.bulk_create(
+                    [Post(author=self.follower, content=str(i)) for i in range(n)]
+                )
+            ],
+        }
+        for name, make in batches.items():
+            with self.subTest(name):
+                counts = []
+                for size in (1, 20):
+                    items = make(size)
+                    with CaptureQueriesContext(connection) as queries:
+                        self.post_batch(name, items)
+                    counts.append(len(queries))
+                self.assertEqual(counts[0], counts[1])
+
+    @override_settings(BULK_WRITE_MAX_ITEMS=2)
+    def test_batch_cap(self):
+        """Test that oversized, empty and malformed batches are rejected"""
+        for items in ([{"content": "x"}] * 3, [], {"content": "x"}):
+            response = self.post_batch("post-bulk", items)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_requires_authentication(self):
+        """Test that anonymous users cannot write in bulk"""
+        self.client.force_authenticate(user=None)
+        response = self.post_batch("post-bulk", [{"content": "x"}])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class PostQueryPlanTest(QueryPlanAssertionsMixin, TestCase):
+    """Test that hot post querysets are served from indexes"""
+
+    position = (timezone.now(), 10)
+
+    def test_latest_posts_page(self):
+        """Test the first page of the global feed"""
+        self.assertIndexedPlan(keyset_filter(Post.objects.all())[:11])
+
+    def test_latest_posts_cursor_pages(self):
+        """Test later pages of the global feed in both directions"""
+        plan = self.assertIndexedPlan(
+            keyset_filter(Post.objects.all(), self.position)[:11]
+        )
+        self.assertIn("post_date_idx (date<?)", plan[0])
+        self.assertIndexedPlan(
+            keyset_filter(Post.objects.all(), self.position, reverse=True)[:11]
+        )
+
+    def test_author_posts_page(self):
+        """Test a page of one author's posts"""
+        plan = self.assertIndexedPlan(
+            keyset_filter(Post.objects.filter(author_id=1), self.position)[:11]
+        )
+        self.assertIn("post_author_date_idx (author_id=? AND date<?)", plan[0])
+
+    def test_index_page(self):
+        """Test the HTML index queryset now that counters are columns"""
+        self.assertIndexedPlan(
+            keyset_filter(Post.objects.select_related("author"), self.position)[:11]
+        )
+
+    def test_author_posts_by_username(self):
+        """Test the UserPostsView queryset joining on username"""
+        self.assertIndexedPlan(
+            keyset_filter(Post.objects.filter(author__username="testuser"))[:11]
+        )
+
+
+def jpeg_bytes(size, orientation=None):
+    image = Image.new("RGB", size, "red")
+    exif = image.getexif()
+    exif[0x010F] = "Camera"
+    if orientation:
+        exif[imaging.ORIENTATION] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+WIDTHS = {"thumb": 40, "card": 100, "full": 200}
+
+
+class ImageRenderingTest(TestCase):
+    """Test the rendering of image variants"""
+
+    def test_draft_mode_decoding(self):
+        """Test that JPEGs decode scaled down, but not below the largest variant"""
+        image = imaging.open_image(jpeg_bytes((1600, 800)), 300)
+        self.assertEqual(image.size, (400, 200))
+
+    def test_variants(self):
+        """Test sizes, orientation, formats and stripped metadata"""
+        rendered = imaging.render(jpeg_bytes((400, 300), orientation=6), WIDTHS, 80, 8)
+        sizes = {
+            name: (variant["width"], variant["height"])
+            for name, variant in rendered["variants"].items()
+        }
+        # Rotated upright by the EXIF orientation
+        self.assertEqual(
+            sizes, {"full": (200, 267), "card": (100, 133), "thumb": (40, 53)}
+        )
+        for variant in rendered["variants"].values():
+            for output, data in variant["files"].items():
+                image = Image.open(io.BytesIO(data))
+                self.assertEqual(image.format, imaging.FORMATS[output][0])
+                self.assertEqual(dict(image.getexif()), {})
+        self.assertTrue(rendered["placeholder"].startswith("data:image/webp;base64,"))
+
+    def test_small_transparent_png(self):
+        """Test that small images are not upscaled and JPEGs lose the alpha"""
+        buffer = io.BytesIO()
+        Image.new("RGBA", (60, 30), (0, 0, 0, 0)).save(buffer, "PNG")
+        rendered = imaging.render(buffer.getvalue(), WIDTHS, 80, 8)
+        full = rendered["variants"]["full"]
+        self.assertEqual((full["width"], full["height"]), (60, 30))
+        self.assertEqual(Image.open(io.BytesIO(full["files"]["jpeg"])).mode, "RGB")
+        self.assertEqual(Image.open(io.BytesIO(full["files"]["webp"])).mode, "RGBA")
+
+
+class ImageVariantPipelineTest(APITestCase):
+    """Test the variants of post images and how they are served"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        overrides = override_settings(
+            MEDIA_ROOT=self.media_root,
+            IMAGE_WORKERS=0,
+            IMAGE_VARIANT_WIDTHS=WIDTHS,
+            IMAGE_PLACEHOLDER_WIDTH=8,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        cache.clear()
+        self.user = User.objects.create_user(username="author", password="pass")
+
+    def upload(self, name="photo.jpg", size=(400, 300)):
+        return SimpleUploadedFile(name, jpeg_bytes(size), content_type="image/jpeg")
+
+    def create_post(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(
+                author=self.user, content="Photo", image_cover=self.upload(), **kwargs
+            )
+        post.refresh_from_db()
+        return post
+
+    def test_variants_are_rendered_after_commit(self):
+        """Test that a new image gets its variants and bumps the version"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            post = Post.objects.create(
+                author=self.user, content="Photo", image_cover=self.upload()
+            )
+        self.assertIsNone(Post.objects.get(pk=post.pk).image_variants)
+        for callback in callbacks:
+            callback()
+
+        post.refresh_from_db()
+        meta = variants.current(post)
+        self.assertEqual(meta["source"], post.image_cover.name)
+        self.assertEqual(post.version, 2)
+        for variant in meta["variants"].values():
+            for output in imaging.FORMATS:
+                path = os.path.join(self.media_root, variant[output])
+                self.assertTrue(os.path.exists(path))
+
+    def test_edits_keep_the_variants(self):
+        """Test that saving an instance loaded before the variants keeps them"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            stale = Post.objects.create(
+                author=self.user, content="Photo", image_cover=self.upload()
+            )
+        for callback in callbacks:
+            callback()
+        stale.content = "Edited"
+        stale.save()
+
+        post = Post.objects.get(pk=stale.pk)
+        self.assertEqual(post.content, "Edited")
+        self.assertIsNotNone(variants.current(post))
+
+    def test_replaced_image(self):
+        """Test that a new image replaces the variants and their files"""
+        post = self.create_post()
+        old = post.image_variants["variants"]["card"]["webp"]
+        post.image_cover = self.upload("other.jpg", (120, 80))
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants["source"], post.image_cover.name)
+        self.assertEqual(post.image_variants["variants"]["full"]["width"], 120)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, old)))
+
+    def test_deleted_post_removes_files(self):
+        """Test that deleting a post deletes its variants"""
+        post = self.create_post()
+        path = os.path.join(
+            self.media_root, post.image_variants["variants"]["thumb"]["jpeg"]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertFalse(os.path.exists(path))
+
+    def test_api_srcset(self):
+        """Test the absolute srcset URLs of the API, cached or not"""
+        post = self.create_post()
+        self.client.force_authenticate(self.user)
+        for url in (reverse("post-detail", args=[post.pk]), reverse("post-list")):
+            response = self.client.get(url)
+            data = (
+                response.data if "id" in response.data else response.data["results"][0]
+            )
+            image = data["image_variants"]
+            self.assertEqual(
+                image["srcset"]["webp"].split(", "),
+                [
+                    f"http://testserver/media/{post.image_variants['variants'][name]['webp']} {width}w"
+                    for name, width in (("thumb", 40), ("card", 100), ("full", 200))
+                ],
+            )
+            self.assertTrue(image["src"].startswith("http://testserver/media/"))
+            self.assertEqual((image["width"], image["height"]), (200, 150))
+
+    def test_pending_variants(self):
+        """Test that the upload is served until the variants exist"""
+        post = Post.objects.create(
+            author=self.user, content="Photo", image_cover=self.upload()
+        )
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, f'src="/media/{post.image_cover.name}"')
+        self.assertNotContains(response, "<picture>")
+        self.assertIsNone(
+            self.client.get(reverse("post-detail", args=[post.pk])).data[
+                "image_variants"
+            ]
+        )
+
+    def test_card_picture(self):
+        """Test the responsive picture of the post card"""
+        post = self.create_post()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, "<picture>")
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, "100w")
+        self.assertContains(response, "background-image: url('data:image/webp;base64,")
+        self.assertNotContains(response, f'src="/media/{post.image_cover.name}"')
+
+    def test_failures_are_logged(self):
+        """Test that a damaged upload is logged and leaves the post alone"""
+        with self.assertLogs("posts.variants", "ERROR"):
+            with self.captureOnCommitCallbacks(execute=True):
+                post = Post.objects.create(
+                    author=self.user,
+                    content="Broken",
+                    image_cover=SimpleUploadedFile("broken.jpg", b"not an image"),
+                )
+        post.refresh_from_db()
+        self.assertIsNone(post.image_variants)
+
+    def test_backfill_command(self):
+        """Test the parallel backfill of existing images"""
+        posts = Post.objects.bulk_create(
+            [Post(author=self.user, content=f"Old {i}") for i in range(3)]
+        )
+        for post in posts:
+            post.image_cover.save(f"old{post.pk}.jpg", self.upload(), save=False)
+            Post.objects.filter(pk=post.pk).update(image_cover=post.image_cover.name)
+        # Workers of the parallel test runner are daemons and cannot start
+        # a process pool
+        workers = 1 if multiprocessing.current_process().daemon else 2
+        out = StringIO()
+        call_command("backfill_image_variants", workers=workers, stdout=out)
+        self.assertIn("Rendered 3 images, 0 failed", out.getvalue())
+        for post in Post.objects.filter(pk__in=[post.pk for post in posts]):
+            self.assertIsNotNone(variants.current(post))
+
+        out = StringIO()
+        call_command("backfill_image_variants", "--workers", "1", stdout=out)
+        self.assertIn("Rendered 0 images", out.getvalue())
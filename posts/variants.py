@@ -0,0 +1,191 @@
+"""
+Background pipeline of the resized variants of ``Post.image_cover``.
+
+Every uploaded image gets ``IMAGE_VARIANT_WIDTHS`` variants (thumbnail, card
+and full) in WebP and JPEG, without EXIF, plus a tiny blurred placeholder;
+see posts.imaging for the rendering. Saving a post with a new image
+schedules the work once the transaction commits: a thread reads the upload
+from storage, hands the bytes to a process pool of ``IMAGE_WORKERS`` and
+writes the variants back, so neither the request nor the GIL pays for the
+resizing. With ``IMAGE_WORKERS = 0`` the variants are rendered inline.
+
+The result is recorded in ``Post.image_variants`` together with the image
+it was rendered from, with one update that also bumps ``Post.version`` so
+cached cards and representations pick it up. Until then, and for images
+replaced since, the original upload is served. The
+backfill_image_variants command renders existing images in parallel.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import F
+
+from . import imaging
+from .models import Post
+from social_network import metrics
+
+logger = logging.getLogger(__name__)
+
+VARIANT_DIR = "img/variants"
+
+_lock = threading.Lock()
+_pools = None
+
+
+def render_options():
+    return {
+        "widths": settings.IMAGE_VARIANT_WIDTHS,
+        "quality": settings.IMAGE_VARIANT_QUALITY,
+        "placeholder_width": settings.IMAGE_PLACEHOLDER_WIDTH,
+    }
+
+
+def process_pool(workers):
+    # Spawned workers only import posts.imaging; forking a threaded server
+    # could copy locks held by other threads
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def current(post):
+    """The variants of the post's current image, or None"""
+    meta = post.image_variants
+    if meta and post.image_cover and meta.get("source") == post.image_cover.name:
+        return meta
+    return None
+
+
+def variant_name(source, variant, output):
+    stem = os.path.basename(source).replace(".", "_")
+    return f"{VARIANT_DIR}/{stem}/{variant}.{imaging.FORMATS[output][1]}"
+
+
+def read_source(name):
+    with default_storage.open(name, "rb") as file:
+        return file.read()
+
+
+def store(post_id, source, rendered):
+    """Save the variants rendered from ``source`` and record them on the post"""
+    meta = {"source": source, "placeholder": rendered["placeholder"], "variants": {}}
+    for name, variant in rendered["variants"].items():
+        entry = {"width": variant["width"], "height": variant["height"]}
+        for output, data in variant["files"].items():
+            path = variant_name(source, name, output)
+            default_storage.delete(path)
+            entry[output] = default_storage.save(path, ContentFile(data))
+        meta["variants"][name] = entry
+
+    previous = (
+        Post.objects.filter(pk=post_id).values_list("image_variants", flat=True).first()
+    )
+    updated = Post.objects.filter(pk=post_id, image_cover=source).update(
+        image_variants=meta, version=F("version") + 1
+    )
+    if not updated:
+        # The post was deleted or its image replaced meanwhile
+        delete_files(meta)
+        return None
+    if previous and previous["source"] != source:
+        delete_files(previous)
+    metrics.incr("posts.images.rendered")
+    return meta
+
+
+def delete_files(meta):
+    for variant in meta["variants"].values():
+        for output in imaging.FORMATS:
+            if variant.get(output):
+                default_storage.delete(variant[output])
+
+
+def schedule(post):
+    """Render the variants of a new image of ``post`` once committed"""
+    if post.image_cover and not current(post):
+        transaction.on_commit(partial(submit, post.pk, post.image_cover.name))
+
+
+def submit(post_id, source):
+    if not settings.IMAGE_WORKERS:
+        _render(post_id, source, None)
+        return
+    global _pools
+    with _lock:
+        if _pools is None:
+            _pools = (
+                ThreadPoolExecutor(
+                    settings.IMAGE_WORKERS, thread_name_prefix="image-variants"
+                ),
+                process_pool(settings.IMAGE_WORKERS),
+            )
+    threads, processes = _pools
+    threads.submit(_render, post_id, source, processes)
+
+
+def _render(post_id, source, processes):
+    try:
+        data = read_source(source)
+        with metrics.timer("posts.images.render_ms"):
+            if processes is None:
+                rendered = imaging.render(data, **render_options())
+            else:
+                rendered = processes.submit(
+                    imaging.render, data, **render_options()
+                ).result()
+        store(post_id, source, rendered)
+    except Exception:
+        metrics.incr("posts.images.failures")
+        logger.exception("Could not render the variants of %s", source)
+    finally:
+        if processes is not None:
+            connection.close()
+
+
+def describe(meta):
+    """The placeholder, size, fallback URL and srcsets of recorded variants"""
+    variants = sorted(meta["variants"].values(), key=lambda variant: variant["width"])
+    largest = variants[-1]
+    srcset = {}
+    for output in imaging.FORMATS:
+        # Variants of a small image can share a width; keep one of each
+        candidates = {variant["width"]: variant[output] for variant in variants}
+        srcset[output] = ", ".join(
+            f"{default_storage.url(name)} {width}w"
+            for width, name in candidates.items()
+        )
+    card = meta["variants"].get("card", largest)
+    return {
+        "placeholder": meta["placeholder"],
+        "width": largest["width"],
+        "height": largest["height"],
+        "src": default_storage.url(card["jpeg"]),
+        "srcset": srcset,
+    }
+
+
+def absolutize(description, build_absolute_uri):
+    """``description`` with absolute URLs, as for ``image_cover``"""
+
+    def entries(srcset):
+        for entry in srcset.split(", "):
+            url, width = entry.rsplit(" ", 1)
+            yield f"{build_absolute_uri(url)} {width}"
+
+    return {
+        **description,
+        "src": build_absolute_uri(description["src"]),
+        "srcset": {
+            output: ", ".join(entries(srcset))
+            for output, srcset in description["srcset"].items()
+        },
+    }
@@ -0,0 +1,71 @@
+"""
+Per-viewer flags for pages of posts.
+
+Whether the requesting user liked, disliked, commented on or wrote each post
+is resolved for a whole page in one query (one ``EXISTS`` subquery per flag)
+instead of one ``.exists()`` call per post and flag.
+"""
+
+from collections import namedtuple
+
+from django.db.models import Exists, OuterRef
+
+from .models import Post
+from interactions.models import Comment, Dislike, Like
+
+ViewerState = namedtuple(
+    "ViewerState", ["is_liked", "is_disliked", "is_commented", "is_author"]
+)
+
+ANONYMOUS_STATE = ViewerState(False, False, False, False)
+
+
+def _viewer_state_rows(user, post_ids):
+    return (
+        Post.objects.filter(pk__in=post_ids)
+        .annotate(
+            is_liked=Exists(Like.objects.filter(post=OuterRef("pk"), user=user)),
+            is_disliked=Exists(Dislike.objects.filter(post=OuterRef("pk"), user=user)),
+            is_commented=Exists(Comment.objects.filter(post=OuterRef("pk"), user=user)),
+        )
+        .values_list("pk", "is_liked", "is_disliked", "is_commented", "author_id")
+    )
+
+
+def _viewer_states(user, rows):
+    return {
+        pk: ViewerState(liked, disliked, commented, author_id == user.pk)
+        for pk, liked, disliked, commented, author_id in rows
+    }
+
+
+def resolve_viewer_state(user, post_ids):
+    """Return ``{post_id: ViewerState}`` for ``post_ids`` as seen by ``user``"""
+    post_ids = list(post_ids)
+    if not post_ids or user is None or not user.is_authenticated:
+        return {}
+    return _viewer_states(user, _viewer_state_rows(user, post_ids))
+
+
+async def aresolve_viewer_state(user, post_ids):
+    """``resolve_viewer_state`` on the async ORM"""
+    post_ids = list(post_ids)
+    if not post_ids or user is None or not user.is_authenticated:
+        return {}
+    rows = [row async for row in _viewer_state_rows(user, post_ids)]
+    return _viewer_states(user, rows)
+
+
+def viewer_state_for(post, context):
+    """Look up the state of one post, resolving and caching it when missing"""
+    request = context.get("request")
+    user = getattr(request, "user", None)
+    states = context.setdefault("viewer_state", {})
+    if post.pk not in states:
+        states.update(resolve_viewer_state(user, [post.pk]))
+    return states.get(post.pk, ANONYMOUS_STATE)
+
+
+def liked_post_ids(states):
+    """The IDs of the posts the viewer liked, for the HTML templates"""
+    return sorted(pk for pk, state in states.items() if state.is_liked)
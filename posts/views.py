@@ -3,34 +3,23 @@ from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render
 from django.urls import reverse
-from django.db.models import Count
-from django.core.paginator import Paginator
 from .models import Post
+from .pagination import paginate_request, queryset_fetcher
+from .viewer_state import liked_post_ids, resolve_viewer_state
 from users.models import User
-from interactions.models import Like
 
 
 def index(request):
     posts_of_the_page = []
     user_liked_id = []
     if request.user.is_authenticated:
-        posts = (
-            Post.objects.all()
-            .order_by("-date")
-            .annotate(
-                num_likes=Count("likes"),
-                num_dislikes=Count("dislikes"),
-            )
-        )
-        # Pagination
-        paginator = Paginator(posts, 10)
-        page_number = request.GET.get("page")
-        posts_of_the_page = paginator.get_page(page_number)
+        posts = Post.objects.select_related("author")
+        # Keyset pagination on (date, id)
+        posts_of_the_page = paginate_request(request, queryset_fetcher(posts))
 
-        user_liked = Like.objects.filter(user=request.user).filter(
-            post__in=posts_of_the_page
+        user_liked_id = liked_post_ids(
+            resolve_viewer_state(request.user, [post.id for post in posts_of_the_page])
         )
-        user_liked_id = [like.post.id for like in user_liked]
     return render(
         request,
         "posts/index.html",
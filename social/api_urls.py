@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import api_views
+from . import api_views, views
 
 # Create a router and register our viewsets with it
 router = DefaultRouter()
@@ -21,6 +21,10 @@ urlpatterns = [
         api_views.UserFollowStatsView.as_view(),
         name="user-follow-stats",
     ),
+    # Server-Sent Events. The stream is served by the ASGI deployment only
+    # (see social_network.async_urls); a WSGI worker would be pinned for as
+    # long as the connection stays open, so this map answers 501
+    path("events/", views.live_events_unavailable, name="live-events"),
 ]
 
 # The API URLs are now determined automatically by the router
@@ -29,7 +33,11 @@ urlpatterns = [
 # - /api/social/follows/{id}/ (retrieve, update, delete)
 # - /api/social/follows/my_following/ (custom action)
 # - /api/social/follows/my_followers/ (custom action)
+# - /api/social/follows/mutuals/ (custom action)
 # - /api/social/follows/{id}/unfollow/ (custom action)
 # - /api/social/follows/follow_user/ (custom action)
+# - /api/social/follows/bulk_follow/ (custom action)
+# - /api/social/follows/bulk_unfollow/ (custom action)
 # - /api/social/following-posts/ (posts from followed users)
 # - /api/social/users/{username}/follow-stats/ (user follow statistics)
+# - /api/social/events/?posts= (live updates over Server-Sent Events, ASGI only)
@@ -2,13 +2,22 @@ from rest_framework import viewsets, generics, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.db import IntegrityError
 from django.db.models import Q
 
+from . import follows, timelines
 from .models import Follow
-from .serializers import FollowSerializer, FollowCreateSerializer
+from .serializers import (
+    BulkFollowSerializer,
+    FollowSerializer,
+    FollowCreateSerializer,
+    UserMinimalSerializer,
+)
 from users.models import User
-from posts.models import Post
+from posts.api_views import post_page_response
+from posts.pagination import IdPagination, KeysetPagination, id_keyset_filter
 from posts.serializers import PostSerializer
+from social_network.conditional import PUBLIC, compute_etag, conditional_response
 
 
 class FollowViewSet(viewsets.ModelViewSet):
@@ -16,7 +25,7 @@ class FollowViewSet(viewsets.ModelViewSet):
     ViewSet for Follow model
     """
 
-    queryset = Follow.objects.all()
+    queryset = Follow.objects.select_related("current_user", "second_user")
     permission_classes = [permissions.IsAuthenticated]
 
     def get_serializer_class(self):
@@ -25,7 +34,7 @@ class FollowViewSet(viewsets.ModelViewSet):
         return FollowSerializer
 
     def get_queryset(self):
-        queryset = Follow.objects.all()
+        queryset = Follow.objects.select_related("current_user", "second_user")
 
         # Filter by current user if provided
         current_user = self.request.query_params.get("current_user", None)
@@ -42,17 +51,39 @@ class FollowViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["get"])
     def my_following(self, request):
         """Get users that the current user follows"""
-        following = Follow.objects.filter(current_user=request.user)
+        following = self.get_queryset().filter(current_user=request.user)
         serializer = self.get_serializer(following, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=["get"])
     def my_followers(self, request):
         """Get users who follow the current user"""
-        followers = Follow.objects.filter(second_user=request.user)
+        followers = self.get_queryset().filter(second_user=request.user)
         serializer = self.get_serializer(followers, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["get"])
+    def mutuals(self, request):
+        """Get users who follow the current user back"""
+        # A range of follow_mutual_idx after the cursor, then the page's
+        # users. each_other=True compiles to a bare column test on SQLite,
+        # which cannot seek the index; IN (true) can
+        follows = Follow.objects.filter(
+            current_user=request.user, each_other__in=[True]
+        ).values_list("second_user_id", flat=True)
+        paginator = IdPagination()
+        user_ids = paginator.paginate_fetch(
+            lambda position, reverse, limit: id_keyset_filter(
+                follows, position, reverse, "second_user_id"
+            )[:limit],
+            request,
+        )
+        users = User.objects.in_bulk(user_ids)
+        serializer = UserMinimalSerializer(
+            [users[pk] for pk in user_ids if pk in users], many=True
+        )
+        return paginator.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=["post"])
     def unfollow(self, request, pk=None):
         """Unfollow a user"""
@@ -99,12 +130,35 @@ class FollowViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        follow = Follow.objects.create(
-            current_user=request.user, second_user=user_to_follow
-        )
+        try:
+            follow = Follow.objects.create(
+                current_user=request.user, second_user=user_to_follow
+            )
+        except IntegrityError:
+            # Lost a race with a concurrent request for the same follow
+            return Response(
+                {"error": "You are already following this user."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         serializer = self.get_serializer(follow)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=["post"])
+    def bulk_follow(self, request):
+        """Follow many users by ID and/or username"""
+        return self.bulk(request, follows.follow_many)
+
+    @action(detail=False, methods=["post"])
+    def bulk_unfollow(self, request):
+        """Unfollow many users by ID and/or username"""
+        return self.bulk(request, follows.unfollow_many)
+
+    def bulk(self, request, apply):
+        serializer = BulkFollowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = apply(request.user, **serializer.validated_data)
+        return Response({"results": results})
+
 
 class FollowingPostsView(generics.ListAPIView):
     """
@@ -113,15 +167,18 @@ class FollowingPostsView(generics.ListAPIView):
 
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
-
-    def get_queryset(self):
-        # Get users that the current user follows
-        following_users = Follow.objects.filter(
-            current_user=self.request.user
-        ).values_list("second_user", flat=True)
-
-        # Get posts from those users
-        return Post.objects.filter(author__in=following_users).order_by("-date")
+    pagination_class = KeysetPagination
+
+    def list(self, request, *args, **kwargs):
+        # Page over the materialized timeline, then hydrate only that page
+        keys = self.paginator.paginate_fetch(
+            lambda position, reverse, limit: timelines.timeline_keys(
+                request.user, limit, position, reverse
+            ),
+            request,
+        )
+        posts = timelines.hydrate_posts([post_id for _, post_id in keys])
+        return post_page_response(request, self.paginator, posts)
 
 
 class UserFollowStatsView(generics.RetrieveAPIView):
@@ -136,22 +193,33 @@ class UserFollowStatsView(generics.RetrieveAPIView):
         username = self.kwargs["username"]
         user = get_object_or_404(User, username=username)
 
-        # Return follow statistics
-        following_count = Follow.objects.filter(current_user=user).count()
-        followers_count = Follow.objects.filter(second_user=user).count()
-
+        # Return follow statistics from the denormalized counters
         return {
             "user": user,
-            "following_count": following_count,
-            "followers_count": followers_count,
+            "following_count": user.following_count,
+            "followers_count": user.followers_count,
         }
 
     def retrieve(self, request, *args, **kwargs):
         stats = self.get_object()
-        return Response(
-            {
-                "user": {"id": stats["user"].id, "username": stats["user"].username},
-                "following_count": stats["following_count"],
-                "followers_count": stats["followers_count"],
-            }
+        etag = compute_etag(
+            request,
+            stats["user"].username,
+            stats["following_count"],
+            stats["followers_count"],
+        )
+        return conditional_response(
+            request,
+            etag,
+            lambda: Response(
+                {
+                    "user": {
+                        "id": stats["user"].id,
+                        "username": stats["user"].username,
+                    },
+                    "following_count": stats["following_count"],
+                    "followers_count": stats["followers_count"],
+                }
+            ),
+            cache_control=PUBLIC,
         )
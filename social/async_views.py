@@ -0,0 +1,105 @@
+"""
+Async versions of the feed and follow stats views, served by
+social_network.async_urls, and the live updates stream.
+"""
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import NotAuthenticated, NotFound, ValidationError
+
+from . import timelines
+from .models import Follow
+from posts.async_views import post_page_response
+from posts.pagination import KeysetPagination
+from social_network import live
+from social_network.async_support import error_response, json_response, not_found
+from social_network.conditional import PUBLIC, aconditional_response, compute_etag
+from users.models import User
+
+
+async def following_posts(request):
+    """``FollowingPostsView``; only reached by authenticated users"""
+    paginator = KeysetPagination()
+    try:
+        keys = await paginator.apaginate_fetch(
+            lambda position, reverse, limit: timelines.atimeline_keys(
+                request.user, limit, position, reverse
+            ),
+            request,
+        )
+    except NotFound as exc:
+        return error_response(exc)
+    posts = await timelines.ahydrate_posts([post_id for _, post_id in keys])
+    return await post_page_response(request, paginator, posts)
+
+
+async def follow_stats(request, username):
+    """``UserFollowStatsView``"""
+    try:
+        user = await User.objects.aget(username=username)
+    except User.DoesNotExist:
+        return not_found(User)
+    etag = compute_etag(
+        request, user.username, user.following_count, user.followers_count
+    )
+
+    async def build():
+        return json_response(
+            {
+                "user": {"id": user.id, "username": user.username},
+                "following_count": user.following_count,
+                "followers_count": user.followers_count,
+            }
+        )
+
+    return await aconditional_response(request, etag, build, cache_control=PUBLIC)
+
+
+def watched_posts(request):
+    """Parse ``?posts=1,2,3``, the posts on the viewer's screen"""
+    value = request.GET.get("posts", "")
+    try:
+        post_ids = {int(post_id) for post_id in value.split(",") if post_id}
+    except ValueError:
+        raise ValidationError({"posts": "Expected comma separated post IDs."})
+    if len(post_ids) > settings.LIVE_MAX_POSTS:
+        raise ValidationError(
+            {"posts": f"Watch at most {settings.LIVE_MAX_POSTS} posts at a time."}
+        )
+    return post_ids
+
+
+async def live_events(request):
+    """Stream new posts of followed authors and count changes of ``?posts=``.
+
+    Server-Sent Events: ``post`` events carry ``{id, author_id, date}`` and
+    ``counts`` events ``{post, likes, dislikes, comments}`` deltas (zero
+    deltas are left out). The followed authors are read once, on connect;
+    reconnect to pick up new follows or another set of posts.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        # As DRF answers session clients
+        return json_response({"detail": NotAuthenticated.default_detail}, 403)
+    try:
+        post_ids = watched_posts(request)
+    except ValidationError as exc:
+        return error_response(exc)
+
+    authors = [
+        author_id
+        async for author_id in Follow.objects.filter(current_user=user).values_list(
+            "second_user_id", flat=True
+        )
+    ]
+    subscription = live.broker.subscribe(
+        [live.author_topic(author_id) for author_id in authors]
+        + [live.post_topic(post_id) for post_id in post_ids]
+    )
+    response = StreamingHttpResponse(
+        live.stream(subscription), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Stops nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,10 @@
+from django.urls import resolve, reverse
+
+from . import async_views
+
+
+def live_events(request):
+    """The URL of the live updates stream, if this deployment serves it"""
+    url = reverse("live-events")
+    served = resolve(url).func is async_views.live_events
+    return {"live_events_url": url if served else ""}
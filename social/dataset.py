@@ -0,0 +1,275 @@
+"""
+Synthetic social graph for reproducing scaling problems locally.
+
+The graph is planned up front from a seed and generated in fixed shards of
+``SHARD_SIZE`` users, each with its own random generator, so the output does
+not depend on how many worker processes run the shards or in which order.
+Users, posts and post IDs are assigned explicitly from the plan; like,
+dislike and comment IDs come from the database but their contents are
+deterministic too.
+
+Shapes:
+
+- Each user gets a popularity weight from a Zipf law over a seeded random
+  ranking. Follow targets are drawn by popularity, so follower counts are
+  power-law distributed; following counts, posts per user and likes,
+  dislikes and comments per post are Pareto distributed around the
+  requested means.
+- Post times follow ``HOURLY_ACTIVITY``, a day/night curve, over the last
+  ``days`` days before ``end``; comments arrive an exponential delay after
+  their post.
+
+Rows are streamed with ``bulk_create`` in ``batch_size`` batches and no
+model signals run, so post counters are written with the rows and the
+caller recomputes ``each_other`` flags and user counters afterwards (see
+the generate_dataset command).
+"""
+
+import random
+from bisect import bisect
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from .models import Follow
+from interactions.models import Comment, Dislike, Like
+from posts.models import Post
+from users.models import User, normalize_username
+
+# Users per shard, the unit of work handed to a worker
+SHARD_SIZE = 250
+
+# Relative activity per hour of the day: quiet nights, a lunch bump and an
+# evening peak
+HOURLY_ACTIVITY = (
+    [2, 1, 1, 1, 1, 2]  # 00:00-05:59
+    + [4, 7, 9, 9, 9, 10]  # 06:00-11:59
+    + [12, 11, 9, 9, 10, 12]  # 12:00-17:59
+    + [15, 18, 19, 17, 12, 6]  # 18:00-23:59
+)
+
+WORDS = (
+    "the a of and to in is you that it for on was with as have be at one "
+    "this from by hot but some what there we can out other were all your "
+    "when up use word how said an each she which do their time if will way "
+    "about many then them would write like so these her long make thing see "
+    "him two has look more day could go come did my sound no most people "
+    "over know water than call first who may down side been now find coffee "
+    "music game movie city travel photo code weekend news book food team"
+).split()
+
+_plan = None
+
+
+def power_law(rng, mean, cap, alpha):
+    """A Pareto distributed count with the given mean, at most ``cap``"""
+    if mean <= 0 or cap <= 0:
+        return 0
+    # paretovariate(alpha) - 1 has mean 1 / (alpha - 1)
+    value = (rng.paretovariate(alpha) - 1) * (alpha - 1) * mean
+    # Random rounding keeps the mean of small values
+    return min(cap, int(value + rng.random()))
+
+
+class Plan:
+    """Everything the shards share, derived from the options alone"""
+
+    def __init__(self, options):
+        self.options = options
+        self.users = options["users"]
+        self.alpha = options["alpha"]
+        self.shards = range((self.users + SHARD_SIZE - 1) // SHARD_SIZE)
+
+        rng = self.rng("popularity")
+        ranks = list(range(self.users))
+        rng.shuffle(ranks)
+        self.popularity = list(accumulate((rank + 1) ** -1.0 for rank in ranks))
+
+        rng = self.rng("posts")
+        self.posts_per_user = [
+            power_law(rng, options["posts_per_user"], options["max_posts"], self.alpha)
+            for _ in range(self.users)
+        ]
+        # First post ID of every shard
+        self.post_ids = [options["post_base"]]
+        for shard in self.shards:
+            self.post_ids.append(
+                self.post_ids[-1] + sum(self.posts_per_user[self.span(shard)])
+            )
+        self.hours = list(accumulate(HOURLY_ACTIVITY))
+
+    def rng(self, *key):
+        return random.Random(":".join(map(str, (self.options["seed"], *key))))
+
+    def span(self, shard):
+        return slice(shard * SHARD_SIZE, min(self.users, (shard + 1) * SHARD_SIZE))
+
+    def user_id(self, index):
+        return self.options["user_base"] + index
+
+    def username(self, index):
+        return f"{self.options['prefix']}{index}"
+
+    def total_posts(self):
+        return self.post_ids[-1] - self.post_ids[0]
+
+    def timestamp(self, rng):
+        """A time in the window, weighted by the hour of the day"""
+        day = rng.randrange(self.options["days"])
+        hour = bisect(self.hours, rng.random() * self.hours[-1])
+        moment = self.options["end"] - timedelta(days=day + 1) + timedelta(hours=hour)
+        return moment + timedelta(seconds=rng.randrange(3600))
+
+
+def init_worker(options):
+    """Pool initializer: build the plan once per worker process"""
+    global _plan
+    _plan = Plan(options)
+
+
+@contextmanager
+def explicit_dates():
+    """Let bulk_create keep the generated ``date`` values"""
+    fields = [Post._meta.get_field("date"), Comment._meta.get_field("date")]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Writer:
+    """Buffers rows per model and writes them ``batch_size`` at a time"""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.rows = {}
+        self.written = Counter()
+
+    def add(self, obj):
+        rows = self.rows.setdefault(type(obj), [])
+        rows.append(obj)
+        if len(rows) >= self.batch_size:
+            self.write(type(obj))
+
+    def write(self, model):
+        # Foreign keys are checked when each batch commits, so buffered rows
+        # this model references must be written first
+        for field in model._meta.concrete_fields:
+            if field.is_relation and field.related_model in self.rows:
+                self.write(field.related_model)
+        rows = self.rows.pop(model, [])
+        if rows:
+            model.objects.bulk_create(rows)
+            self.written[model._meta.label] += len(rows)
+
+    def close(self):
+        for model in list(self.rows):
+            self.write(model)
+        return dict(self.written)
+
+
+def generate_shard(phase, shard):
+    """Write one shard of one phase; return ``{model label: row count}``"""
+    writer = Writer(_plan.options["batch_size"])
+    with explicit_dates():
+        PHASES[phase](_plan, shard, writer)
+        return writer.close()
+
+
+def _users(plan, shard, writer):
+    rng = plan.rng("users", shard)
+    for index in range(plan.users)[plan.span(shard)]:
+        username = plan.username(index)
+        writer.add(
+            User(
+                id=plan.user_id(index),
+                username=username,
+                username_normalized=normalize_username(username),
+                email=f"{username}@example.com",
+                # Unusable, and much cheaper than hashing a password per row
+                password="!",
+                date_joined=plan.timestamp(rng),
+            )
+        )
+
+
+def _follows(plan, shard, writer):
+    rng = plan.rng("follows", shard)
+    options = plan.options
+    for index in range(plan.users)[plan.span(shard)]:
+        count = power_law(rng, options["follows_per_user"], plan.users - 1, plan.alpha)
+        targets = set()
+        # Popular users are drawn again and again; redraw a bounded number
+        # of times to reach the wanted number of distinct targets
+        for _ in range(4):
+            missing = count - len(targets)
+            if not missing:
+                break
+            targets.update(
+                rng.choices(range(plan.users), cum_weights=plan.popularity, k=missing)
+            )
+            targets.discard(index)
+        for target in sorted(targets):
+            writer.add(
+                Follow(
+                    current_user_id=plan.user_id(index),
+                    second_user_id=plan.user_id(target),
+                )
+            )
+
+
+def _posts(plan, shard, writer):
+    rng = plan.rng("posts", shard)
+    options = plan.options
+    post_id = plan.post_ids[shard]
+    for index in range(plan.users)[plan.span(shard)]:
+        for _ in range(plan.posts_per_user[index]):
+            date = plan.timestamp(rng)
+            likers = _audience(plan, rng, options["likes_per_post"])
+            dislikers = _audience(plan, rng, options["dislikes_per_post"])
+            comments = power_law(
+                rng, options["comments_per_post"], options["max_comments"], plan.alpha
+            )
+            writer.add(
+                Post(
+                    id=post_id,
+                    author_id=plan.user_id(index),
+                    content=_sentence(rng),
+                    date=date,
+                    likes_count=len(likers),
+                    dislikes_count=len(dislikers),
+                    comments_count=comments,
+                )
+            )
+            for liker in likers:
+                writer.add(Like(post_id=post_id, user_id=plan.user_id(liker)))
+            for disliker in dislikers:
+                writer.add(Dislike(post_id=post_id, user_id=plan.user_id(disliker)))
+            for _ in range(comments):
+                writer.add(
+                    Comment(
+                        post_id=post_id,
+                        user_id=plan.user_id(rng.randrange(plan.users)),
+                        content=_sentence(rng),
+                        date=date + timedelta(seconds=int(rng.expovariate(1 / 3600))),
+                    )
+                )
+            post_id += 1
+
+
+def _audience(plan, rng, mean):
+    count = power_law(rng, mean, plan.users, plan.alpha)
+    return sorted(rng.sample(range(plan.users), count))
+
+
+def _sentence(rng):
+    return " ".join(rng.choices(WORDS, k=rng.randint(3, 20)))[
+        : Post.content.field.max_length
+    ]
+
+
+PHASES = {"users": _users, "follows": _follows, "posts": _posts}
@@ -0,0 +1,126 @@
+"""
+Bulk follow and unfollow for contact import and account migration.
+
+A batch costs a fixed number of queries however many users it names: the
+targets are resolved in one query, self-follows and existing follows are
+dropped with one set difference, the new rows go in with ``bulk_create``,
+and user counters, ``each_other`` flags and the home timeline are updated
+once for the whole batch: the recent posts of every new pushed author are
+read with one query and the timeline is trimmed once. Bulk writes send no model signals, so this module
+does by hand what social.signals does for a single follow.
+"""
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+
+from . import timelines
+from .models import Follow, TimelineEntry
+from users.models import User, adjust_counter
+
+FOLLOWED = "followed"
+UNFOLLOWED = "unfollowed"
+ALREADY_FOLLOWING = "already_following"
+NOT_FOLLOWING = "not_following"
+SELF = "self"
+NOT_FOUND = "not_found"
+
+
+def resolve(user_ids=(), usernames=()):
+    """Map each requested ID and username to a user ID, in one query"""
+    rows = User.objects.filter(
+        Q(pk__in=user_ids) | Q(username__in=usernames)
+    ).values_list("pk", "username")
+    by_id = {pk: pk for pk, _ in rows}
+    by_name = {username: pk for pk, username in rows}
+    return {("user_id", value): by_id.get(value) for value in user_ids} | {
+        ("username", value): by_name.get(value) for value in usernames
+    }
+
+
+def outcomes(targets, statuses):
+    """One ``{<key>: value, "status": ...}`` dict per requested item"""
+    return [
+        {key: value, "status": statuses.get(target_id, NOT_FOUND)}
+        for (key, value), target_id in targets.items()
+    ]
+
+
+def follow_many(user, user_ids=(), usernames=()):
+    """Follow every named user; return the outcome of each item"""
+    targets = resolve(user_ids, usernames)
+    wanted = {pk for pk in targets.values() if pk is not None} - {user.pk}
+    try:
+        created = _follow(user, wanted)
+    except IntegrityError:
+        # A concurrent request followed some of them first; the retry's
+        # set difference skips those
+        created = _follow(user, wanted)
+
+    statuses = {pk: FOLLOWED if pk in created else ALREADY_FOLLOWING for pk in wanted}
+    statuses[user.pk] = SELF
+    return outcomes(targets, statuses)
+
+
+def _follow(user, wanted):
+    with transaction.atomic():
+        existing = set(
+            Follow.objects.filter(
+                current_user=user, second_user_id__in=wanted
+            ).values_list("second_user_id", flat=True)
+        )
+        new = wanted - existing
+        if not new:
+            return set()
+        mutual = set(
+            Follow.objects.filter(
+                current_user_id__in=new, second_user=user
+            ).values_list("current_user_id", flat=True)
+        )
+        Follow.objects.bulk_create(
+            [
+                Follow(current_user=user, second_user_id=pk, each_other=pk in mutual)
+                for pk in sorted(new)
+            ]
+        )
+        Follow.objects.filter(current_user_id__in=mutual, second_user=user).update(
+            each_other=True
+        )
+        adjust_counter(user.pk, "following_count", len(new))
+        User.objects.filter(pk__in=new).update(followers_count=F("followers_count") + 1)
+        timelines.backfill_authors(user.pk, new)
+    return new
+
+
+def unfollow_many(user, user_ids=(), usernames=()):
+    """Unfollow every named user; return the outcome of each item"""
+    targets = resolve(user_ids, usernames)
+    wanted = {pk for pk in targets.values() if pk is not None} - {user.pk}
+    with transaction.atomic():
+        existing = dict(
+            Follow.objects.filter(
+                current_user=user, second_user_id__in=wanted
+            ).values_list("second_user_id", "each_other")
+        )
+        if existing:
+            removed = sorted(existing)
+            # A raw delete: the ORM would load every row to send post_delete
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {Follow._meta.db_table} WHERE current_user_id = %s "
+                    f"AND second_user_id IN ({', '.join(['%s'] * len(removed))})",
+                    [user.pk, *removed],
+                )
+            Follow.objects.filter(
+                current_user_id__in=[pk for pk, mutual in existing.items() if mutual],
+                second_user=user,
+            ).update(each_other=False)
+            adjust_counter(user.pk, "following_count", -len(removed))
+            User.objects.filter(pk__in=removed).update(
+                followers_count=F("followers_count") - 1
+            )
+            TimelineEntry.objects.filter(user=user, author_id__in=removed).delete()
+            timelines.backfill_followers(removed)
+
+    statuses = {pk: UNFOLLOWED if pk in existing else NOT_FOLLOWING for pk in wanted}
+    statuses[user.pk] = SELF
+    return outcomes(targets, statuses)
@@ -0,0 +1,157 @@
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, time as dt_time, timezone as dt_timezone
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections
+from django.db.models import Max
+
+from posts.models import Post
+from social import dataset
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic social graph (users, follows, posts, "
+        "likes, dislikes and comments) with power-law degrees and day/night "
+        "post times, in parallel worker processes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--posts-per-user", type=float, default=20)
+        parser.add_argument("--follows-per-user", type=float, default=50)
+        parser.add_argument("--likes-per-post", type=float, default=5)
+        parser.add_argument("--dislikes-per-post", type=float, default=0.5)
+        parser.add_argument("--comments-per-post", type=float, default=1)
+        parser.add_argument(
+            "--max-posts", type=int, default=5000, help="Most posts of one user"
+        )
+        parser.add_argument(
+            "--max-comments", type=int, default=500, help="Most comments on one post"
+        )
+        parser.add_argument(
+            "--alpha",
+            type=float,
+            default=2.0,
+            help="Pareto shape of the count distributions; lower is more skewed",
+        )
+        parser.add_argument("--days", type=int, default=30)
+        parser.add_argument(
+            "--end",
+            type=datetime.fromisoformat,
+            help="End of the post time window (default: start of today, UTC)",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--prefix", default="synthetic", help="Prefix of generated usernames"
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Worker processes; on SQLite writers take turns, so 1 is as fast",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["batch_size"] < 1 or options["days"] < 1:
+            raise CommandError("--users, --batch-size and --days must be positive.")
+        if options["alpha"] <= 1:
+            raise CommandError("--alpha must be greater than 1.")
+        if options["workers"] < 1:
+            raise CommandError("--workers must be positive.")
+        if User.objects.filter(username__startswith=options["prefix"]).exists():
+            raise CommandError(
+                f"Users named {options['prefix']}... already exist; "
+                "pass another --prefix."
+            )
+
+        end = options["end"] or datetime.combine(
+            datetime.now(dt_timezone.utc).date(), dt_time()
+        )
+        if end.tzinfo is None:
+            end = end.replace(tzinfo=dt_timezone.utc)
+        plan_options = {
+            key: options[key]
+            for key in (
+                "users",
+                "posts_per_user",
+                "follows_per_user",
+                "likes_per_post",
+                "dislikes_per_post",
+                "comments_per_post",
+                "max_posts",
+                "max_comments",
+                "alpha",
+                "days",
+                "seed",
+                "prefix",
+                "batch_size",
+            )
+        }
+        plan_options.update(
+            end=end,
+            user_base=(User.objects.aggregate(last=Max("pk"))["last"] or 0) + 1,
+            post_base=(Post.objects.aggregate(last=Max("pk"))["last"] or 0) + 1,
+        )
+        plan = dataset.Plan(plan_options)
+        self.stdout.write(
+            f"Generating {plan.users} users and {plan.total_posts()} posts "
+            f"in {len(plan.shards)} shards"
+        )
+
+        start = time.perf_counter()
+        written = Counter()
+        written += self.run(plan_options, options["workers"], ["users"], plan.shards)
+        written += self.run(
+            plan_options, options["workers"], ["follows", "posts"], plan.shards
+        )
+        elapsed = time.perf_counter() - start
+        for label, count in sorted(written.items()):
+            self.stdout.write(f"{label}: {count} rows")
+        self.stdout.write(
+            f"Wrote {sum(written.values())} rows in {elapsed:.1f}s "
+            f"({sum(written.values()) / elapsed:.0f} rows/s)"
+        )
+
+        # Explicit IDs leave PostgreSQL sequences behind
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [User, Post]):
+                cursor.execute(sql)
+        call_command("repair_mutual_follows", stdout=self.stdout)
+        call_command("reconcile_user_counters", stdout=self.stdout)
+        self.stdout.write(
+            "Run rebuild_timelines --all to materialize the home timelines."
+        )
+
+    def run(self, plan_options, workers, phases, shards):
+        tasks = [(phase, shard) for phase in phases for shard in shards]
+        written = Counter()
+        if workers == 1:
+            dataset.init_worker(plan_options)
+            for task in tasks:
+                written.update(dataset.generate_shard(*task))
+            return written
+
+        # Workers open their own connections; forked copies of an open one
+        # would share its socket
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=dataset.init_worker,
+            initargs=(plan_options,),
+        ) as pool:
+            futures = [pool.submit(dataset.generate_shard, *task) for task in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                written.update(future.result())
+                if done % 100 == 0:
+                    self.stdout.write(f"{'/'.join(phases)}: {done}/{len(tasks)} shards")
+        return written
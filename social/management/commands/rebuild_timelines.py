@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from social.timelines import rebuild_timeline
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized home timelines from the Follow table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("usernames", nargs="*", help="Users to rebuild")
+        parser.add_argument(
+            "--all", action="store_true", help="Rebuild the timeline of every user"
+        )
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            users = User.objects.order_by("pk").iterator(chunk_size=500)
+        elif options["usernames"]:
+            users = User.objects.filter(username__in=options["usernames"])
+            missing = set(options["usernames"]) - {user.username for user in users}
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+        else:
+            raise CommandError("Pass one or more usernames or --all.")
+
+        for user in users:
+            count = rebuild_timeline(user)
+            self.stdout.write(f"{user.username}: {count} entries")
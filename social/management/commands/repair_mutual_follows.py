@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from social.models import Follow
+
+
+class Command(BaseCommand):
+    help = "Recompute the each_other flag of follows in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of follows checked per transaction",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        reverse = Exists(
+            Follow.objects.filter(
+                current_user=OuterRef("second_user"),
+                second_user=OuterRef("current_user"),
+            )
+        )
+        ids = Follow.objects.order_by("pk").values_list("pk", flat=True)
+        last_pk = 0
+        total = fixed = 0
+        while True:
+            chunk = list(ids.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            rows = Follow.objects.filter(pk__gte=chunk[0], pk__lte=chunk[-1])
+            with transaction.atomic():
+                fixed += rows.filter(reverse, each_other=False).update(each_other=True)
+                fixed += rows.filter(~reverse, each_other=True).update(each_other=False)
+            last_pk = chunk[-1]
+            total += len(chunk)
+        self.stdout.write(f"Checked {total} follows, fixed {fixed}")
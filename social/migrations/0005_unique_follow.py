@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:03
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+CHUNK_SIZE = 1000
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .values(field)
+            .annotate(count=Count("id"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def dedupe_follows(apps, schema_editor):
+    """Keep the oldest row of each follow pair and recount both users"""
+    Follow = apps.get_model("social", "Follow")
+    User = apps.get_model("users", "User")
+    duplicates = (
+        Follow.objects.values("current_user", "second_user")
+        .annotate(keep=Min("id"), rows=Count("id"))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    while True:
+        chunk = list(duplicates[:CHUNK_SIZE])
+        if not chunk:
+            break
+        with transaction.atomic():
+            for pair in chunk:
+                Follow.objects.filter(
+                    current_user=pair["current_user"], second_user=pair["second_user"]
+                ).exclude(pk=pair["keep"]).delete()
+            # Historical models send no signals, so counters are rebuilt here
+            users = {pair["current_user"] for pair in chunk}
+            users |= {pair["second_user"] for pair in chunk}
+            User.objects.filter(pk__in=users).update(
+                followers_count=count_subquery(Follow, "second_user"),
+                following_count=count_subquery(Follow, "current_user"),
+            )
+
+
+class Migration(migrations.Migration):
+    # Duplicates are removed one chunk per transaction
+    atomic = False
+
+    dependencies = [
+        ("social", "0004_hot_path_indexes"),
+        ("users", "0002_user_counters"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="follow",
+            constraint=models.UniqueConstraint(
+                fields=("current_user", "second_user"), name="unique_follow"
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="follow",
+            name="follow_current_second_idx",
+        ),
+    ]
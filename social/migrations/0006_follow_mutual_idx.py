@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social", "0005_unique_follow"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="follow",
+            index=models.Index(
+                fields=["current_user", "each_other", "second_user"],
+                name="follow_mutual_idx",
+            ),
+        ),
+    ]
@@ -1,7 +1,19 @@
-from django.db import models
+from django.db import models, transaction
 from users.models import User
 
 
+class FollowQuerySet(models.QuerySet):
+    def delete(self):
+        from .signals import unfollowed
+
+        with transaction.atomic():
+            follows = list(self)
+            deleted = super().delete()
+            for follow in follows:
+                unfollowed(follow)
+        return deleted
+
+
 class Follow(models.Model):
     current_user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='following')
@@ -9,12 +21,69 @@ class Follow(models.Model):
         User, on_delete=models.CASCADE, related_name='followers')
     each_other = models.BooleanField(default=False)
 
+    objects = FollowQuerySet.as_manager()
+
+    class Meta:
+        # Also serves the (current_user, second_user) lookups
+        constraints = [
+            models.UniqueConstraint(
+                fields=['current_user', 'second_user'], name='unique_follow'),
+        ]
+        indexes = [
+            models.Index(fields=['second_user', 'current_user'],
+                         name='follow_second_current_idx'),
+            # Serves a user's mutuals in second_user order
+            models.Index(fields=['current_user', 'each_other', 'second_user'],
+                         name='follow_mutual_idx'),
+        ]
+
     def save(self, *args, **kwargs):
-        # Check if the users follow each other
-        if self.current_user.following.filter(id=self.second_user.id).exists() and \
-                self.second_user.following.filter(id=self.current_user.id).exists():
-            self.each_other = True
-        else:
+        if self._state.adding:
+            # Set on both rows of the pair by social.signals once inserted
             self.each_other = False
 
-        super().save(*args, **kwargs)
+        # Keep the row, the user counters and each_other on both rows of
+        # the pair (maintained by social.signals) together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        from .signals import unfollowed
+
+        # Not a post_delete receiver, which would turn off fast deletes for
+        # the cascades from User; social.signals handles those in bulk
+        with transaction.atomic():
+            deleted = super().delete(*args, **kwargs)
+            unfollowed(self)
+        return deleted
+
+
+class TimelineEntry(models.Model):
+    """A post materialized into one follower's home timeline.
+
+    Entries only hold the post reference and its sort key, so edits show up
+    on the next read and deletes cascade through the foreign key.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(
+        'posts.Post', on_delete=models.CASCADE, related_name='timeline_entries')
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+')
+    date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-date', '-post'],
+                         name='timeline_user_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"Post {self.post_id} in timeline of {self.user_id}"
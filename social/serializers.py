@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 from .models import Follow
 from users.models import User
@@ -51,24 +53,55 @@ class FollowCreateSerializer(serializers.ModelSerializer):
         fields = ["second_user_id"]
 
     def create(self, validated_data):
-        from users.models import User
-
-        second_user_id = validated_data.pop("second_user_id")
-        second_user = User.objects.get(id=second_user_id)
+        # validate_second_user_id already swapped the ID for the user
+        second_user = validated_data.pop("second_user_id")
 
         validated_data["current_user"] = self.context["request"].user
         validated_data["second_user"] = second_user
-        return super().create(validated_data)
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            # Already following, or lost a race with a concurrent request
+            # for the same follow; the unique constraint decides either way
+            raise serializers.ValidationError(
+                {"second_user_id": ["You are already following this user."]}
+            )
 
     def validate_second_user_id(self, value):
-        from users.models import User
-
         try:
-            User.objects.get(id=value)
+            second_user = User.objects.get(id=value)
         except User.DoesNotExist:
             raise serializers.ValidationError("User does not exist.")
 
         if value == self.context["request"].user.id:
             raise serializers.ValidationError("You cannot follow yourself.")
 
-        return value
+        return second_user
+
+
+class BulkFollowSerializer(serializers.Serializer):
+    """Users to follow or unfollow in one request, by ID and/or username"""
+
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        default=list,
+        max_length=settings.FOLLOW_BULK_MAX_USERS,
+    )
+    usernames = serializers.ListField(
+        child=serializers.CharField(),
+        required=False,
+        default=list,
+        max_length=settings.FOLLOW_BULK_MAX_USERS,
+    )
+
+    def validate(self, data):
+        total = len(data["user_ids"]) + len(data["usernames"])
+        if not total:
+            raise serializers.ValidationError("Pass user_ids or usernames.")
+        if total > settings.FOLLOW_BULK_MAX_USERS:
+            raise serializers.ValidationError(
+                f"At most {settings.FOLLOW_BULK_MAX_USERS} users per request."
+            )
+        return data
@@ -0,0 +1,86 @@
+from django.db.models import Exists, F, Q
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import timelines
+from .models import Follow
+from posts.models import Post
+from users.models import User, adjust_counter
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_timelines(sender, instance, created, **kwargs):
+    if created:
+        timelines.fan_out_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def drop_post_from_recent_posts(sender, instance, **kwargs):
+    timelines.forget_recent_posts(instance.author_id)
+
+
+def adjust_follow_counters(follow, delta):
+    # Both user rows are locked in ID order, so concurrent changes to the
+    # same pair (A follows B while B follows A) queue instead of deadlocking,
+    # and the second one sees the first one's row when it sets each_other
+    for user_id, field in sorted(
+        [
+            (follow.current_user_id, "following_count"),
+            (follow.second_user_id, "followers_count"),
+        ]
+    ):
+        adjust_counter(user_id, field, delta)
+
+
+def reverse_follow(follow):
+    return Follow.objects.filter(
+        current_user_id=follow.second_user_id, second_user_id=follow.current_user_id
+    )
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline_on_follow(sender, instance, created, **kwargs):
+    if created:
+        adjust_follow_counters(instance, 1)
+        # One statement flags both rows of the pair when the reverse exists
+        mutual = Follow.objects.filter(
+            Q(
+                current_user_id=instance.current_user_id,
+                second_user_id=instance.second_user_id,
+            )
+            | Q(
+                current_user_id=instance.second_user_id,
+                second_user_id=instance.current_user_id,
+            ),
+            Exists(reverse_follow(instance)),
+        ).update(each_other=True)
+        instance.each_other = bool(mutual)
+        timelines.backfill_author(instance.current_user_id, instance.second_user_id)
+
+
+def unfollowed(follow):
+    """Update the counters, flags and timeline after deleting a follow"""
+    adjust_follow_counters(follow, -1)
+    # Not trusting follow.each_other: the instance may predate the reverse
+    reverse_follow(follow).filter(each_other=True).update(each_other=False)
+    timelines.remove_author(follow.current_user_id, follow.second_user_id)
+    timelines.backfill_followers([follow.second_user_id])
+
+
+@receiver(pre_delete, sender=User)
+def unfollow_deleted_user(sender, instance, **kwargs):
+    # The user's follows go with fast cascade deletes, and so do the
+    # timeline entries of and by the user; the rows left on both sides
+    # of a mutual pair are deleted too, so only counters need updating
+    following = list(
+        Follow.objects.filter(current_user=instance).values_list(
+            "second_user_id", flat=True
+        )
+    )
+    User.objects.filter(pk__in=following).update(
+        followers_count=F("followers_count") - 1
+    )
+    User.objects.filter(following__second_user=instance).update(
+        following_count=F("following_count") - 1
+    )
+    timelines.backfill_followers(following)
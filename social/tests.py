@@ -1,10 +1,27 @@
-from django.test import TestCase
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
-from .models import Follow
+from .models import Follow, TimelineEntry
+from . import timelines
+from posts import bulk
 from posts.models import Post
+from posts.pagination import id_keyset_filter, keyset_filter
+from interactions import services
+from social_network import live, metrics
+from social_network.testing import QueryPlanAssertionsMixin
 
 User = get_user_model()
 
@@ -41,6 +58,312 @@ class FollowModelTest(TestCase):
         self.assertTrue(follow1.each_other)
         self.assertTrue(follow2.each_other)
 
+    def count_user_delete_queries(self, follows):
+        user = User.objects.create_user(username=f"user{follows}", password="pw")
+        for index in range(follows):
+            other = User.objects.create_user(
+                username=f"other{follows}-{index}", password="pw"
+            )
+            Follow.objects.create(current_user=user, second_user=other)
+            Follow.objects.create(current_user=other, second_user=user)
+        with CaptureQueriesContext(connection) as queries:
+            user.delete()
+        return len(queries)
+
+    def test_user_deletion_updates_counters_in_bulk(self):
+        """Test that deleting a user does not update each follow one by one"""
+        Follow.objects.create(current_user=self.user1, second_user=self.user2)
+        Follow.objects.create(current_user=self.user2, second_user=self.user1)
+        self.user1.delete()
+
+        self.user2.refresh_from_db()
+        self.assertEqual(
+            (self.user2.followers_count, self.user2.following_count), (0, 0)
+        )
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(
+            self.count_user_delete_queries(1), self.count_user_delete_queries(5)
+        )
+
+
+class MutualFollowTest(APITestCase):
+    """Test symmetric maintenance of each_other and the mutuals endpoint"""
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(username="user1", password="pw")
+        self.user2 = User.objects.create_user(username="user2", password="pw")
+        self.user3 = User.objects.create_user(username="user3", password="pw")
+
+    def flags(self):
+        return dict(
+            Follow.objects.values_list("current_user__username", "each_other").order_by(
+                "pk"
+            )
+        )
+
+    def test_unfollow_clears_reverse_row(self):
+        """Test that breaking a mutual follow clears the remaining row"""
+        Follow.objects.create(current_user=self.user1, second_user=self.user2)
+        follow = Follow.objects.create(current_user=self.user2, second_user=self.user1)
+        self.assertTrue(follow.each_other)
+
+        follow.delete()
+        self.assertEqual(self.flags(), {"user1": False})
+
+        Follow.objects.create(current_user=self.user2, second_user=self.user1)
+        self.assertEqual(self.flags(), {"user1": True, "user2": True})
+
+    def test_stale_instance_delete(self):
+        """Test unfollowing with an instance loaded before the follow back"""
+        follow = Follow.objects.create(current_user=self.user1, second_user=self.user2)
+        Follow.objects.create(current_user=self.user2, second_user=self.user1)
+
+        follow.delete()
+        self.assertEqual(self.flags(), {"user2": False})
+
+    def test_mutuals_endpoint(self):
+        """Test listing the users who follow the viewer back"""
+        for other in (self.user2, self.user3):
+            Follow.objects.create(current_user=self.user1, second_user=other)
+        Follow.objects.create(current_user=self.user3, second_user=self.user1)
+        self.client.force_authenticate(user=self.user1)
+
+        response = self.client.get(reverse("follow-mutuals"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [user["username"] for user in response.data["results"]], ["user3"]
+        )
+        self.assertIsNone(response.data["next"])
+
+    def test_mutuals_pages(self):
+        """Test paging through mutuals in user ID order without counting"""
+        others = [User.objects.create_user(username=f"mutual{i}") for i in range(3)]
+        for other in others:
+            Follow.objects.create(current_user=self.user1, second_user=other)
+            Follow.objects.create(current_user=other, second_user=self.user1)
+        self.client.force_authenticate(user=self.user1)
+
+        first = self.client.get(reverse("follow-mutuals"), {"page_size": 2}).data
+        second = self.client.get(first["next"]).data
+        previous = self.client.get(second["previous"]).data
+
+        self.assertNotIn("count", first)
+        self.assertEqual(
+            [user["id"] for user in first["results"] + second["results"]],
+            [other.pk for other in others],
+        )
+        self.assertIsNone(second["next"])
+        self.assertEqual(previous["results"], first["results"])
+
+    def test_repair_command(self):
+        """Test that the repair command fixes drifted flags"""
+        Follow.objects.create(current_user=self.user1, second_user=self.user2)
+        Follow.objects.create(current_user=self.user2, second_user=self.user1)
+        Follow.objects.create(current_user=self.user1, second_user=self.user3)
+        Follow.objects.update(each_other=False)
+        Follow.objects.filter(second_user=self.user3).update(each_other=True)
+
+        out = StringIO()
+        call_command("repair_mutual_follows", chunk_size=2, stdout=out)
+
+        self.assertIn("Checked 3 follows, fixed 3", out.getvalue())
+        self.assertEqual(
+            set(Follow.objects.filter(each_other=True).values_list("second_user")),
+            {(self.user1.pk,), (self.user2.pk,)},
+        )
+
+
+class BulkFollowTest(APITestCase):
+    """Test bulk follow and unfollow"""
+
+    def setUp(self):
+        self.viewer = User.objects.create_user(username="viewer", password="pw")
+        self.others = [
+            User.objects.create_user(username=f"user{i}", password="pw")
+            for i in range(4)
+        ]
+        self.client.force_authenticate(user=self.viewer)
+
+    def post(self, name, data):
+        return self.client.post(reverse(f"follow-{name}"), data, format="json")
+
+    def test_bulk_follow_outcomes(self):
+        """Test the per-item outcome of a bulk follow"""
+        user0, user1, user2, _ = self.others
+        Follow.objects.create(current_user=self.viewer, second_user=user0)
+        Follow.objects.create(current_user=user1, second_user=self.viewer)
+        Post.objects.create(author=user2, content="Hello")
+
+        response = self.post(
+            "bulk-follow",
+            {
+                "user_ids": [user0.pk, user1.pk, self.viewer.pk, 999999],
+                "usernames": ["user2", "missing"],
+            },
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["status"] for item in response.data["results"]],
+            ["already_following", "followed", "self", "not_found"]
+            + ["followed", "not_found"],
+        )
+        self.assertEqual(
+            response.data["results"][4], {"username": "user2", "status": "followed"}
+        )
+        self.viewer.refresh_from_db()
+        user2.refresh_from_db()
+        self.assertEqual(self.viewer.following_count, 3)
+        self.assertEqual(user2.followers_count, 1)
+        self.assertEqual(
+            set(Follow.objects.filter(each_other=True).values_list("current_user")),
+            {(self.viewer.pk,), (user1.pk,)},
+        )
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.viewer, author=user2).exists()
+        )
+
+    def test_bulk_unfollow(self):
+        """Test unfollowing many users at once"""
+        user0, user1, user2, _ = self.others
+        for other in (user0, user1):
+            Follow.objects.create(current_user=self.viewer, second_user=other)
+        Follow.objects.create(current_user=user1, second_user=self.viewer)
+        Post.objects.create(author=user0, content="Hello")
+
+        response = self.post(
+            "bulk-unfollow", {"user_ids": [user0.pk, user1.pk, user2.pk]}
+        )
+
+        self.assertEqual(
+            [item["status"] for item in response.data["results"]],
+            ["unfollowed", "unfollowed", "not_following"],
+        )
+        self.assertFalse(Follow.objects.filter(current_user=self.viewer).exists())
+        self.assertFalse(Follow.objects.get(current_user=user1).each_other)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.viewer).exists())
+        self.viewer.refresh_from_db()
+        user1.refresh_from_db()
+        self.assertEqual(self.viewer.following_count, 0)
+        self.assertEqual(user1.followers_count, 0)
+
+    @override_settings(TIMELINE_BACKFILL_SIZE=2, TIMELINE_FANOUT_FOLLOWER_THRESHOLD=1)
+    def test_bulk_follow_backfills_new_authors(self):
+        """Test that a bulk follow adds the new authors' recent posts"""
+        user0, user1, user2, user3 = self.others
+        Follow.objects.create(current_user=self.viewer, second_user=user0)
+        kept = Post.objects.create(author=user0, content="Kept")
+        for i in range(3):
+            Post.objects.create(author=user1, content=f"Post {i}")
+        Post.objects.create(author=user2, content="Pulled")
+        for follower in (user0, user3):
+            Follow.objects.create(current_user=follower, second_user=user2)
+
+        self.post("bulk-follow", {"user_ids": [user1.pk, user2.pk]})
+
+        entries = TimelineEntry.objects.filter(user=self.viewer)
+        self.assertTrue(entries.filter(post=kept).exists())
+        # user2 is past the threshold, so merged in at read time instead
+        self.assertEqual(
+            list(entries.exclude(post=kept).values_list("post__content", flat=True)),
+            ["Post 2", "Post 1"],
+        )
+
+    def count_queries(self, users):
+        with CaptureQueriesContext(connection) as queries:
+            self.post("bulk-follow", {"user_ids": [user.pk for user in users]})
+        return len(queries)
+
+    def test_bulk_follow_query_count_is_constant(self):
+        """Test that a batch's query count does not grow with its size"""
+        single = self.count_queries(self.others[:1])
+        Follow.objects.all().delete()
+
+        self.assertEqual(self.count_queries(self.others), single)
+
+    @override_settings(FOLLOW_BULK_MAX_USERS=2)
+    def test_bulk_follow_cap(self):
+        """Test that oversized and empty batches are rejected"""
+        response = self.post(
+            "bulk-follow",
+            {"user_ids": [self.others[0].pk], "usernames": ["user1", "user2"]},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.post("bulk-follow", {})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Follow.objects.exists())
+
+
+class GenerateDatasetTest(TestCase):
+    """Test the synthetic dataset generator"""
+
+    options = {
+        "users": 40,
+        "posts_per_user": 3,
+        "follows_per_user": 5,
+        "seed": 7,
+        "end": datetime(2026, 1, 1, tzinfo=dt_timezone.utc),
+        "days": 7,
+        "workers": 1,
+        "stdout": StringIO(),
+    }
+
+    def snapshot(self):
+        return (
+            set(
+                Follow.objects.values_list(
+                    "current_user__username", "second_user__username", "each_other"
+                )
+            ),
+            set(
+                Post.objects.values_list(
+                    "author__username", "content", "date", "likes_count"
+                )
+            ),
+        )
+
+    def test_counters_and_dates_are_consistent(self):
+        """Test that counters match the rows and dates fall in the window"""
+        call_command("generate_dataset", **self.options)
+
+        self.assertEqual(
+            User.objects.filter(username__startswith="synthetic").count(), 40
+        )
+        self.assertTrue(Follow.objects.exists())
+        for user in User.objects.all():
+            self.assertEqual(user.followers_count, user.followers.count())
+            self.assertEqual(user.posts_count, user.author.count())
+        for post in Post.objects.all():
+            self.assertEqual(post.likes_count, post.likes_received.count())
+            self.assertEqual(post.comments_count, post.comments.count())
+            self.assertLess(post.date, self.options["end"])
+            self.assertGreaterEqual(post.date, self.options["end"] - timedelta(days=7))
+        for follow in Follow.objects.all():
+            self.assertEqual(
+                follow.each_other,
+                Follow.objects.filter(
+                    current_user=follow.second_user, second_user=follow.current_user
+                ).exists(),
+            )
+
+    def test_same_seed_same_dataset(self):
+        """Test that a seed reproduces the dataset whatever the batch size"""
+        call_command("generate_dataset", **self.options)
+        first = self.snapshot()
+        User.objects.all().delete()
+
+        call_command("generate_dataset", batch_size=7, **self.options)
+
+        self.assertEqual(self.snapshot(), first)
+
+    def test_existing_prefix_is_rejected(self):
+        """Test that generating twice with one prefix fails"""
+        call_command("generate_dataset", **self.options)
+        with self.assertRaises(CommandError):
+            call_command("generate_dataset", **self.options)
+
 
 class FollowAPITest(APITestCase):
     """Test Follow API endpoints"""
@@ -81,9 +404,9 @@ class FollowAPITest(APITestCase):
 
     def test_create_follow(self):
         """Test creating a follow relationship"""
-        self.client.force_authenticate(user=self.user1)
+        self.client.force_authenticate(user=self.user2)
         url = reverse("follow-list")
-        data = {"second_user_id": self.user2.id}
+        data = {"second_user_id": self.user1.id}
         response = self.client.post(url, data)
 
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
@@ -314,9 +637,441 @@ class UserFollowStatsAPITest(APITestCase):
         self.assertEqual(response.data["following_count"], 1)  # Following user2
         self.assertEqual(response.data["followers_count"], 1)  # Followed by user3
 
+    def test_user_follow_stats_conditional_get(self):
+        """Test that follow stats revalidate against the user counters"""
+        url = reverse("user-follow-stats", args=[self.user1.username])
+        response = self.client.get(url)
+        self.assertIn("public", response["Cache-Control"])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Follow.objects.create(current_user=self.user2, second_user=self.user1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["followers_count"], 2)
+
     def test_user_follow_stats_nonexistent_user(self):
         """Test getting follow stats for nonexistent user"""
         url = reverse("user-follow-stats", args=["nonexistent"])
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TimelineTest(TestCase):
+    """Test materialized home timelines"""
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            username="user1", email="user1@example.com", password="testpass123"
+        )
+        self.user2 = User.objects.create_user(
+            username="user2", email="user2@example.com", password="testpass123"
+        )
+
+    def test_new_post_is_pushed_to_followers(self):
+        """Test that creating a post fans it out to followers"""
+        Follow.objects.create(current_user=self.user1, second_user=self.user2)
+        post = Post.objects.create(author=self.user2, content="Fresh post")
+
+        self.assertEqual(timelines.timeline_post_ids(self.user1), [post.id])
+        self.assertEqual(timelines.timeline_post_ids(self.user2), [])
+
+    def test_follow_backfills_recent_posts(self):
+        """Test that following an author backfills their recent posts"""
+        older = Post.objects.create(author=self.user2, content="Older")
+        newer = Post.objects.create(author=self.user2, content="Newer")
+        Follow.objects.create(current_user=self.user1, second_user=self.user2)
+
+        self.assertEqual(timelines.timeline_post_ids(self.user1), [newer.id, older.id])
+
+    def test_unfollow_removes_author_posts(self):
+        """Test that unfollowing clears the author's posts"""
+        follow = Follow.objects.create(current_user=self.user1, second_user=self.user2)
+        Post.objects.create(author=self.user2, content="Post")
+        follow.delete()
+
+        self.assertEqual(timelines.timeline_post_ids(self.user1), [])
+
+    def test_edits_and_deletes_are_propagated(self):
+        """Test that hydration reflects edits and deletes cascade"""
+        Follow.objects.create(current_user=self.user1, second_user=self.user2)
+        post = Post.objects.create(author=self.user2, content="Before")
+        post.content = "After"
+        post.save()
+
+        posts = timelines.hydrate_posts(timelines.timeline_post_ids(self.user1))
+        self.assertEqual(posts[0].content, "After")
+
+        post.delete()
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_backfill_trims_timeline(self):
+        """Test that timelines are capped at TIMELINE_MAX_LENGTH entries"""
+        posts = [
+            Post.objects.create(author=self.user2, content=f"Post {i}")
+            for i in range(4)
+        ]
+        Follow.objects.create(current_user=self.user1, second_user=self.user2)
+
+        self.assertEqual(
+            timelines.timeline_post_ids(self.user1, limit=10),
+            [posts[3].id, posts[2].id],
+        )
+
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_fan_out_trims_timelines(self):
+        """Test that fan-out keeps every follower's timeline capped"""
+        user3 = User.objects.create_user(username="user3", password="testpass123")
+        Follow.objects.create(current_user=self.user1, second_user=self.user2)
+        Follow.objects.create(current_user=user3, second_user=self.user2)
+        posts = [
+            Post.objects.create(author=self.user2, content=f"Post {i}")
+            for i in range(4)
+        ]
+
+        for follower in (self.user1, user3):
+            self.assertEqual(
+                list(
+                    TimelineEntry.objects.filter(user=follower)
+                    .order_by("-date", "-post_id")
+                    .values_list("post_id", flat=True)
+                ),
+                [posts[3].id, posts[2].id],
+            )
+
+    def test_rebuild_timelines_command(self):
+        """Test rebuilding a timeline from scratch"""
+        Follow.objects.create(current_user=self.user1, second_user=self.user2)
+        post = Post.objects.create(author=self.user2, content="Post")
+        TimelineEntry.objects.all().delete()
+
+        out = StringIO()
+        call_command("rebuild_timelines", "user1", stdout=out)
+
+        self.assertIn("user1: 1 entries", out.getvalue())
+        self.assertEqual(timelines.timeline_post_ids(self.user1), [post.id])
+
+
+@override_settings(TIMELINE_FANOUT_FOLLOWER_THRESHOLD=1)
+class HybridTimelineTest(TestCase):
+    """Test push/pull feed assembly for high-follower authors"""
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.viewer = User.objects.create_user(
+            username="viewer", email="viewer@example.com", password="testpass123"
+        )
+        self.other = User.objects.create_user(
+            username="other", email="other@example.com", password="testpass123"
+        )
+        self.celebrity = User.objects.create_user(
+            username="celebrity", email="celebrity@example.com", password="testpass123"
+        )
+        self.regular = User.objects.create_user(
+            username="regular", email="regular@example.com", password="testpass123"
+        )
+        Follow.objects.create(current_user=self.viewer, second_user=self.celebrity)
+        Follow.objects.create(current_user=self.other, second_user=self.celebrity)
+        Follow.objects.create(current_user=self.viewer, second_user=self.regular)
+
+    def test_high_follower_posts_are_not_fanned_out(self):
+        """Test that authors above the threshold skip the fan-out"""
+        Post.objects.create(author=self.celebrity, content="Big news")
+
+        self.assertFalse(TimelineEntry.objects.filter(author=self.celebrity).exists())
+        self.assertEqual(
+            metrics.snapshot()["counters"]["timeline.fanout.skipped_posts"], 1
+        )
+
+    def test_pulled_posts_are_merged_by_date(self):
+        """Test that pushed and pulled posts are merged newest first"""
+        first = Post.objects.create(author=self.regular, content="1")
+        second = Post.objects.create(author=self.celebrity, content="2")
+        third = Post.objects.create(author=self.regular, content="3")
+        fourth = Post.objects.create(author=self.celebrity, content="4")
+
+        self.assertEqual(
+            timelines.timeline_post_ids(self.viewer),
+            [fourth.id, third.id, second.id, first.id],
+        )
+        samples = metrics.snapshot()["samples"]
+        self.assertEqual(samples["timeline.merge.sources"]["max"], 2)
+        self.assertEqual(samples["timeline.merge.pulled_entries"]["max"], 2)
+
+    def test_merge_drops_duplicates(self):
+        """Test that a post present in both sources is returned once"""
+        post = Post.objects.create(author=self.regular, content="Post")
+        key = (post.date, post.id)
+
+        self.assertEqual(timelines.merge_timelines([[key], [key]], 10), [key])
+
+    def test_following_posts_endpoint_includes_pulled_posts(self):
+        """Test the following feed endpoint in hybrid mode"""
+        Post.objects.create(author=self.celebrity, content="Pulled post")
+        self.client.force_login(self.viewer)
+
+        response = self.client.get(reverse("following-posts"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["content"], "Pulled post")
+
+    @override_settings(
+        TIMELINE_FANOUT_FOLLOWER_THRESHOLD=2,
+        TIMELINE_FANOUT_HYSTERESIS=1,
+        TIMELINE_BACKFILL_WORKERS=0,
+    )
+    def test_falling_below_the_threshold_pushes_pulled_posts(self):
+        """Test that posts made while pulled are pushed once followers drop"""
+        pushed = Post.objects.create(author=self.celebrity, content="Pushed")
+        Follow.objects.create(current_user=self.regular, second_user=self.celebrity)
+        pulled = Post.objects.create(author=self.celebrity, content="Pulled")
+        self.assertEqual(
+            User.objects.get(pk=self.celebrity.pk).timeline_pulled_since, pulled.date
+        )
+
+        # Back at the threshold, but within the hysteresis
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Follow.objects.get(
+                current_user=self.regular, second_user=self.celebrity
+            ).delete()
+        self.assertEqual(callbacks, [])
+        self.assertTrue(timelines.is_pull_author(self.celebrity.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.get(
+                current_user=self.other, second_user=self.celebrity
+            ).delete()
+
+        self.assertFalse(timelines.is_pull_author(self.celebrity.pk))
+        self.assertEqual(
+            list(
+                TimelineEntry.objects.filter(author=self.celebrity)
+                .order_by("post_id")
+                .values_list("user_id", "post_id")
+            ),
+            [(self.viewer.id, pushed.id), (self.viewer.id, pulled.id)],
+        )
+        self.assertEqual(
+            timelines.timeline_post_ids(self.viewer), [pulled.id, pushed.id]
+        )
+
+    @override_settings(TIMELINE_RECENT_POSTS_SIZE=2)
+    def test_pages_past_the_cached_window(self):
+        """Test that older pulled posts are read from the database"""
+        posts = [
+            Post.objects.create(author=self.celebrity, content=str(i)) for i in range(4)
+        ]
+        keys = [(post.date, post.id) for post in posts]
+
+        self.assertEqual(timelines.timeline_keys(self.viewer, limit=10), keys[::-1])
+        self.assertEqual(
+            timelines.timeline_keys(self.viewer, limit=10, position=keys[2]),
+            keys[1::-1],
+        )
+        self.assertEqual(
+            timelines.timeline_keys(
+                self.viewer, limit=10, position=keys[0], reverse=True
+            ),
+            keys[1:],
+        )
+
+    def test_following_posts_cursor_pages_through_merged_feed(self):
+        """Test keyset pagination across pushed and pulled posts"""
+        expected = [
+            Post.objects.create(author=author, content=str(i)).id
+            for i, author in enumerate([self.regular, self.celebrity] * 2)
+        ][::-1]
+        self.client.force_login(self.viewer)
+
+        ids, url, params = [], reverse("following-posts"), {"page_size": 1}
+        while url:
+            response = self.client.get(url, params)
+            ids.extend(post["id"] for post in response.data["results"])
+            url, params = response.data["next"], {}
+
+        self.assertEqual(ids, expected)
+
+
+class FollowQueryPlanTest(QueryPlanAssertionsMixin, TestCase):
+    """Test that hot follow and timeline querysets are served from indexes"""
+
+    def test_follow_lookup(self):
+        """Test checking whether one user follows another"""
+        self.assertIndexedPlan(
+            Follow.objects.filter(current_user_id=1, second_user_id=2)
+        )
+
+    def test_following_ids(self):
+        """Test listing who a user follows"""
+        self.assertIndexedPlan(
+            Follow.objects.filter(current_user_id=1).values_list("second_user_id")
+        )
+
+    def test_mutuals_page(self):
+        """Test a page of a user's mutuals after a cursor"""
+        plan = self.assertIndexedPlan(
+            id_keyset_filter(
+                Follow.objects.filter(
+                    current_user_id=1, each_other__in=[True]
+                ).values_list("second_user_id", flat=True),
+                5,
+                field="second_user_id",
+            )[:10]
+        )
+        self.assertIn(
+            "follow_mutual_idx (current_user_id=? AND each_other=? AND "
+            "second_user_id>?)",
+            plan[0],
+        )
+
+    def test_follower_ids(self):
+        """Test listing a user's followers"""
+        self.assertIndexedPlan(
+            Follow.objects.filter(second_user_id=1).values_list("current_user_id")
+        )
+
+    def test_timeline_page(self):
+        """Test reading a page of a materialized timeline"""
+        plan = self.assertIndexedPlan(
+            keyset_filter(
+                TimelineEntry.objects.filter(user_id=1),
+                (timezone.now(), 5),
+                pk_field="post_id",
+            ).values_list("date", "post_id")[:11]
+        )
+        self.assertIn("timeline_user_date_idx (user_id=? AND date<?)", plan[0])
+
+
+@override_settings(LIVE_COALESCE_SECONDS=0, ROOT_URLCONF="social_network.async_urls")
+class LiveEventsTest(TestCase):
+    """Test the in-process pub/sub and the Server-Sent Events stream"""
+
+    def setUp(self):
+        self.broker = live.broker
+        live.broker = live.Broker()
+        self.viewer = User.objects.create_user(username="viewer", password="pw")
+        self.author = User.objects.create_user(username="author", password="pw")
+        self.stranger = User.objects.create_user(username="stranger", password="pw")
+        Follow.objects.create(current_user=self.viewer, second_user=self.author)
+        self.post = Post.objects.create(author=self.stranger, content="On screen")
+        self.client.force_login(self.viewer)
+        self.async_client.cookies = self.client.cookies
+
+    def tearDown(self):
+        live.broker = self.broker
+
+    def events(self, *frames):
+        """Decode SSE frames into ``(event, data)`` pairs"""
+        decoded = []
+        for frame in frames:
+            lines = dict(
+                line.split(": ", 1) for line in frame.decode().split("\n") if line
+            )
+            decoded.append((lines["event"], json.loads(lines["data"])))
+        return decoded
+
+    async def test_fan_out_encodes_once(self):
+        """Test that one event reaches every subscriber as the same frame"""
+        first = live.broker.subscribe(["author:1"])
+        second = live.broker.subscribe(["author:1", "post:2"])
+        other = live.broker.subscribe(["author:3"])
+        live.broker.publish("author:1", "post", {"id": 5})
+        frames = [await first.get(1), await second.get(1)]
+        self.assertIs(frames[0], frames[1])
+        self.assertEqual(self.events(frames[0]), [("post", {"id": 5})])
+        self.assertTrue(other.queue.empty())
+
+        first.close()
+        second.close()
+        self.assertEqual(live.broker.subscriber_count("author:1"), 0)
+        self.assertEqual(live.broker.subscriber_count("post:2"), 0)
+
+    async def test_slow_subscriber_is_dropped(self):
+        """Test that an overflowing subscriber gets CLOSED and is unsubscribed"""
+        subscription = live.broker.subscribe(["author:1"], size=2)
+        for i in range(3):
+            live.broker.publish("author:1", "post", {"id": i})
+        self.assertIs(await subscription.get(1), live.CLOSED)
+        self.assertEqual(live.broker.subscriber_count("author:1"), 0)
+
+    @override_settings(LIVE_COALESCE_SECONDS=60)
+    async def test_counts_are_coalesced(self):
+        """Test that counter shifts of a post are summed into one event"""
+        subscription = live.broker.subscribe([live.post_topic(self.post.pk)])
+        unwatched = await Post.objects.acreate(author=self.author, content="Off")
+
+        def react():
+            with self.captureOnCommitCallbacks(execute=True):
+                services.toggle_like(self.viewer.pk, self.post.pk)
+                services.toggle_like(self.author.pk, self.post.pk)
+                services.toggle_like(self.viewer.pk, self.post.pk)
+                services.toggle_dislike(self.viewer.pk, self.post.pk)
+                bulk.create_comments(
+                    self.viewer, [{"post_id": self.post.pk, "content": "Hi"}]
+                )
+                # Nobody watches this post, so nothing is kept for it
+                services.toggle_like(self.viewer.pk, unwatched.pk)
+
+        await sync_to_async(react)()
+        self.assertTrue(subscription.queue.empty())
+        live.broker.flush()
+        self.assertEqual(
+            self.events(await subscription.get(1)),
+            [
+                (
+                    "counts",
+                    {"post": self.post.pk, "likes": 1, "dislikes": 1, "comments": 1},
+                )
+            ],
+        )
+        self.assertEqual(dict(live.broker._counts), {})
+
+    async def test_stream(self):
+        """Test streaming new posts of followed authors and watched counts"""
+        response = await self.async_client.get(
+            reverse("live-events"), {"posts": f"{self.post.pk}"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b"retry: "))
+
+        def write():
+            with self.captureOnCommitCallbacks(execute=True):
+                Post.objects.create(author=self.stranger, content="Not followed")
+                post = Post.objects.create(author=self.author, content="Followed")
+                services.toggle_like(self.viewer.pk, self.post.pk)
+            return post
+
+        post = await sync_to_async(write)()
+        (event, data), counts = self.events(await anext(stream), await anext(stream))
+        self.assertEqual(event, "post")
+        self.assertEqual((data["id"], data["author_id"]), (post.pk, self.author.pk))
+        self.assertEqual(counts, ("counts", {"post": self.post.pk, "likes": 1}))
+
+    def test_stream_is_asgi_only(self):
+        """Test that only the ASGI URL map streams and pages advertise it"""
+        url = reverse("live-events")
+        page = self.client.get(reverse("posts:index"))
+        self.assertContains(page, f'data-live-events="{url}"')
+
+        with self.settings(ROOT_URLCONF="social_network.urls"):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+            page = self.client.get(reverse("posts:index"))
+            self.assertContains(page, 'data-live-events=""')
+
+    async def test_rejected_connections(self):
+        """Test anonymous viewers and malformed post lists"""
+        anonymous = await AsyncClient().get(reverse("live-events"))
+        self.assertEqual(anonymous.status_code, status.HTTP_403_FORBIDDEN)
+        for posts in ("1,x", ",".join(str(i) for i in range(201))):
+            response = await self.async_client.get(
+                reverse("live-events"), {"posts": posts}
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(live.broker._topics, {})
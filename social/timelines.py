@@ -0,0 +1,525 @@
+"""
+Materialized home timelines for the following feed.
+
+Every follower keeps a ``TimelineEntry`` row per post from the authors they
+follow, so reading the feed is a range read on ``(user, -date, -post)``
+followed by one batched query to hydrate the posts.
+
+Authors with more than ``TIMELINE_FANOUT_FOLLOWER_THRESHOLD`` followers (read
+from ``User.followers_count``) are not fanned out. Their newest post keys
+live in a per-author "recent posts" list in the cache and are merged into
+the pushed timeline at read time; pages past that cached window read the
+author's posts from the database.
+
+The first post an author makes while pulled is recorded in
+``User.timeline_pulled_since``, and the author stays pulled until their
+followers drop ``TIMELINE_FANOUT_HYSTERESIS`` below the threshold, so
+follows around the threshold do not flip them back and forth. Only then
+are the posts made since pushed to their followers, by a background worker
+once the unfollow commits.
+"""
+
+import asyncio
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Q, Subquery, Window
+from django.db.models.functions import RowNumber
+
+from .models import Follow, TimelineEntry
+from posts.models import Post
+from posts.pagination import keyset_filter
+from social_network import metrics
+from users.models import User
+
+logger = logging.getLogger(__name__)
+
+RECENT_POSTS_KEY = "timeline:recent:{}"
+TRIM_BATCH_SIZE = 200
+
+_lock = threading.Lock()
+_executor = None
+
+
+def _entries_for(post, follower_ids):
+    return [
+        TimelineEntry(
+            user_id=follower_id, post=post, author_id=post.author_id, date=post.date
+        )
+        for follower_id in follower_ids
+    ]
+
+
+def pull_author_queryset(**filters):
+    """The users served by pull instead of push, narrowed by ``filters``"""
+    return User.objects.filter(
+        Q(followers_count__gt=settings.TIMELINE_FANOUT_FOLLOWER_THRESHOLD)
+        | Q(timeline_pulled_since__isnull=False),
+        **filters,
+    )
+
+
+def pull_authors(author_ids):
+    """Return the subset of ``author_ids`` that are served by pull instead of push"""
+    return set(pull_author_queryset(pk__in=author_ids).values_list("pk", flat=True))
+
+
+def is_pull_author(author_id):
+    return bool(pull_authors([author_id]))
+
+
+def _load_recent_posts(author_id):
+    return list(
+        Post.objects.filter(author_id=author_id)
+        .order_by("-date", "-id")
+        .values_list("date", "id")[: settings.TIMELINE_RECENT_POSTS_SIZE]
+    )
+
+
+def recent_posts(author_ids):
+    """Return ``{author_id: [(date, post_id), ...]}`` newest first"""
+    keys = {RECENT_POSTS_KEY.format(author_id): author_id for author_id in author_ids}
+    cached = cache.get_many(keys)
+    lists = {keys[key]: value for key, value in cached.items()}
+    for author_id in author_ids:
+        if author_id not in lists:
+            metrics.incr("timeline.recent_posts.miss")
+            lists[author_id] = _load_recent_posts(author_id)
+            cache.set(
+                RECENT_POSTS_KEY.format(author_id),
+                lists[author_id],
+                settings.TIMELINE_RECENT_POSTS_TTL,
+            )
+    return lists
+
+
+def push_recent_post(post):
+    """Prepend a post to its author's recent posts list"""
+    key = RECENT_POSTS_KEY.format(post.author_id)
+    keys = cache.get(key)
+    if keys is None:
+        keys = _load_recent_posts(post.author_id)
+    else:
+        keys = [(post.date, post.id)] + [k for k in keys if k[1] != post.id]
+    cache.set(
+        key,
+        keys[: settings.TIMELINE_RECENT_POSTS_SIZE],
+        settings.TIMELINE_RECENT_POSTS_TTL,
+    )
+
+
+def forget_recent_posts(author_id):
+    cache.delete(RECENT_POSTS_KEY.format(author_id))
+
+
+def fan_out_post(post):
+    """Push a new post into the timeline of every follower of its author"""
+    fan_out_posts(post.author_id, [post])
+
+
+def fan_out_posts(author_id, posts):
+    """Push new posts of one author into the timeline of every follower"""
+    if is_pull_author(author_id):
+        metrics.incr("timeline.fanout.skipped_posts", len(posts))
+        User.objects.filter(pk=author_id, timeline_pulled_since__isnull=True).update(
+            timeline_pulled_since=min(post.date for post in posts)
+        )
+        for post in posts:
+            push_recent_post(post)
+        return
+
+    followers = _push_to_followers(author_id, posts)
+    metrics.incr("timeline.fanout.pushed_posts", len(posts))
+    metrics.incr("timeline.fanout.entries_written", followers * len(posts))
+    for _ in posts:
+        metrics.observe("timeline.fanout.size", followers)
+
+
+def _push_to_followers(author_id, posts):
+    """Insert posts into every follower's timeline; return the follower count"""
+    # Keeps each bulk insert at about TIMELINE_FANOUT_BATCH_SIZE rows
+    batch_size = max(1, settings.TIMELINE_FANOUT_BATCH_SIZE // len(posts))
+    followers = 0
+    follower_ids = (
+        Follow.objects.filter(second_user_id=author_id)
+        .values_list("current_user_id", flat=True)
+        .iterator(chunk_size=batch_size)
+    )
+    batch = []
+    for follower_id in follower_ids:
+        batch.append(follower_id)
+        if len(batch) >= batch_size:
+            _push(posts, batch)
+            followers += len(batch)
+            batch = []
+    if batch:
+        _push(posts, batch)
+        followers += len(batch)
+    return followers
+
+
+def _push(posts, follower_ids):
+    TimelineEntry.objects.bulk_create(
+        [entry for post in posts for entry in _entries_for(post, follower_ids)],
+        ignore_conflicts=True,
+    )
+    trim_timelines(follower_ids)
+
+
+def backfill_author(follower_id, author_id):
+    """Copy an author's recent posts into a new follower's timeline"""
+    if is_pull_author(author_id):
+        # Their posts are merged in at read time
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by("-date", "-id")[
+        : settings.TIMELINE_BACKFILL_SIZE
+    ]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user_id=follower_id, post=post, author_id=author_id, date=post.date
+            )
+            for post in posts
+        ],
+        ignore_conflicts=True,
+    )
+    trim_timeline(follower_id)
+
+
+def backfill_authors(follower_id, author_ids):
+    """``backfill_author`` for many new authors at once, trimming once"""
+    pushed = set(author_ids) - pull_authors(author_ids)
+    if not pushed:
+        return
+    posts = (
+        Post.objects.filter(author_id__in=pushed)
+        .annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=F("author_id"),
+                order_by=[F("date").desc(), F("id").desc()],
+            )
+        )
+        .filter(rank__lte=settings.TIMELINE_BACKFILL_SIZE)
+        .only("id", "author_id", "date")
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user_id=follower_id, post=post, author_id=post.author_id, date=post.date
+            )
+            for post in posts
+        ],
+        batch_size=settings.TIMELINE_FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim_timeline(follower_id)
+
+
+def returning_authors(author_ids):
+    """The pulled ``author_ids`` whose followers fell far enough to be pushed"""
+    return User.objects.filter(
+        pk__in=author_ids,
+        timeline_pulled_since__isnull=False,
+        followers_count__lte=settings.TIMELINE_FANOUT_FOLLOWER_THRESHOLD
+        - settings.TIMELINE_FANOUT_HYSTERESIS,
+    )
+
+
+def backfill_followers(author_ids):
+    """Push returning authors again once the unfollow commits.
+
+    ``author_ids`` are authors that just lost followers; the posts they made
+    while pulled were never fanned out and are pushed in the background.
+    """
+    if returning_authors(author_ids).exists():
+        transaction.on_commit(partial(submit, list(author_ids)))
+
+
+def submit(author_ids):
+    if not settings.TIMELINE_BACKFILL_WORKERS:
+        push_returning_authors(author_ids)
+        return
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                settings.TIMELINE_BACKFILL_WORKERS, thread_name_prefix="timelines"
+            )
+    _executor.submit(_push_in_background, author_ids)
+
+
+def _push_in_background(author_ids):
+    try:
+        push_returning_authors(author_ids)
+    except Exception:
+        metrics.incr("timeline.backfill.failures")
+        logger.exception("Could not push the posts of authors %s", author_ids)
+    finally:
+        connection.close()
+
+
+def push_returning_authors(author_ids):
+    """Fan out the posts made while pulled and mark the authors pushed"""
+    returning = returning_authors(author_ids).values_list("pk", "timeline_pulled_since")
+    for author_id, since in returning:
+        posts = _posts_since(author_id, since)
+        if posts:
+            _push_to_followers(author_id, posts)
+        # New posts are fanned out from here on, unless followers came back
+        if (
+            not returning_authors([author_id])
+            .filter(timeline_pulled_since=since)
+            .update(timeline_pulled_since=None)
+        ):
+            continue
+        # Posts skipped while the ones above were being pushed
+        late = _posts_since(author_id, posts[0].date if posts else since)
+        if late:
+            _push_to_followers(author_id, late)
+        forget_recent_posts(author_id)
+        metrics.incr("timeline.backfill.returning_authors")
+
+
+def _posts_since(author_id, date):
+    return list(
+        Post.objects.filter(author_id=author_id, date__gte=date)
+        .order_by("-date", "-id")
+        .only("id", "author_id", "date")[: settings.TIMELINE_BACKFILL_SIZE]
+    )
+
+
+def remove_author(follower_id, author_id):
+    """Drop every post of an author from a former follower's timeline"""
+    TimelineEntry.objects.filter(user_id=follower_id, author_id=author_id).delete()
+
+
+def trim_timeline(user_id):
+    """Keep only the newest ``TIMELINE_MAX_LENGTH`` entries of a timeline"""
+    trim_timelines([user_id])
+
+
+def trim_timelines(user_ids):
+    """``trim_timeline`` for a batch of timelines.
+
+    One query probes each timeline for an entry at offset
+    ``TIMELINE_MAX_LENGTH`` through its ``(user, -date, -post)`` index; only
+    the timelines that have one are cut there, with index range deletes.
+    """
+    newest = TimelineEntry.objects.filter(user_id=OuterRef("pk")).order_by(
+        "-date", "-post_id"
+    )
+    edge = slice(settings.TIMELINE_MAX_LENGTH, settings.TIMELINE_MAX_LENGTH + 1)
+    cutoffs = [
+        (user_id, date, post_id)
+        for user_id, date, post_id in User.objects.filter(pk__in=user_ids)
+        .annotate(
+            cutoff_date=Subquery(newest.values("date")[edge]),
+            cutoff_post_id=Subquery(newest.values("post_id")[edge]),
+        )
+        .values_list("pk", "cutoff_date", "cutoff_post_id")
+        if date is not None
+    ]
+    # Two terms per timeline, kept well below SQLite's expression depth limit
+    for start in range(0, len(cutoffs), TRIM_BATCH_SIZE):
+        overflow = Q()
+        for user_id, date, post_id in cutoffs[start : start + TRIM_BATCH_SIZE]:
+            overflow |= Q(user_id=user_id, date__lt=date) | Q(
+                user_id=user_id, date=date, post_id__lte=post_id
+            )
+        TimelineEntry.objects.filter(overflow).delete()
+
+
+def rebuild_timeline(user):
+    """Rebuild a user's timeline from scratch out of the Follow table"""
+    following = list(
+        Follow.objects.filter(current_user=user).values_list("second_user", flat=True)
+    )
+    pushed_authors = set(following) - pull_authors(following)
+    posts = (
+        Post.objects.filter(author__in=pushed_authors)
+        .order_by("-date", "-id")
+        .only("id", "author_id", "date")[: settings.TIMELINE_MAX_LENGTH]
+    )
+    entries = [
+        TimelineEntry(user=user, post=post, author_id=post.author_id, date=post.date)
+        for post in posts
+    ]
+    # Readers never see the timeline empty, and fan-outs running meanwhile
+    # may already have inserted some of the rows
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user=user).delete()
+        TimelineEntry.objects.bulk_create(
+            entries,
+            batch_size=settings.TIMELINE_FANOUT_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+    return len(entries)
+
+
+def merge_timelines(sources, limit, reverse=False):
+    """K-way merge of ``(date, post_id)`` lists sorted newest first.
+
+    Uses a heap over the heads of every list and drops duplicate post IDs,
+    which appear when an author crosses the fan-out threshold. With
+    ``reverse`` the lists are sorted oldest first instead.
+    """
+    seen = set()
+    merged = []
+    for key in heapq.merge(*sources, reverse=not reverse):
+        if key[1] in seen:
+            continue
+        seen.add(key[1])
+        merged.append(key)
+        if len(merged) >= limit:
+            break
+    return merged
+
+
+def _slice_keys(keys, position, reverse, limit):
+    """Apply a keyset position to an in-memory list sorted newest first"""
+    if position is None:
+        return list(islice(keys, limit))
+    if reverse:
+        return [key for key in reversed(keys) if key > position][:limit]
+    return list(islice((key for key in keys if key < position), limit))
+
+
+def timeline_keys(user, limit=None, position=None, reverse=False):
+    """Return ``(date, post_id)`` keys of a user's feed after ``position``.
+
+    Keys come newest first, or oldest first with ``reverse``, which is the
+    fetch protocol used by ``posts.pagination.paginate``.
+    """
+    if limit is None:
+        limit = settings.TIMELINE_MAX_LENGTH
+
+    with metrics.timer("timeline.read_ms"):
+        pushed = list(_pushed_keys(user, position, reverse, limit))
+        authors = set(
+            pull_author_queryset(followers__current_user=user).values_list(
+                "pk", flat=True
+            )
+        )
+        pulled = recent_posts(authors) if authors else {}
+        sources, deep = _pulled_sources(pulled, position, reverse, limit)
+        if deep:
+            sources.append(list(_deep_keys(deep, position, reverse, limit)))
+        return _merge_pulled(pushed, sources, reverse, limit)
+
+
+async def atimeline_keys(user, limit=None, position=None, reverse=False):
+    """``timeline_keys`` on the async ORM.
+
+    The pushed entries and the followed pull authors are independent, so
+    both queries are issued at once.
+    """
+    if limit is None:
+        limit = settings.TIMELINE_MAX_LENGTH
+
+    with metrics.timer("timeline.read_ms"):
+        pushed, authors = await asyncio.gather(
+            _alist(_pushed_keys(user, position, reverse, limit)),
+            _alist(
+                pull_author_queryset(followers__current_user=user).values_list(
+                    "pk", flat=True
+                )
+            ),
+        )
+        pulled = await sync_to_async(recent_posts)(set(authors)) if authors else {}
+        sources, deep = _pulled_sources(pulled, position, reverse, limit)
+        if deep:
+            sources.append(await _alist(_deep_keys(deep, position, reverse, limit)))
+        return _merge_pulled(pushed, sources, reverse, limit)
+
+
+async def _alist(queryset):
+    return [row async for row in queryset]
+
+
+def _pushed_keys(user, position, reverse, limit):
+    return keyset_filter(
+        TimelineEntry.objects.filter(user=user),
+        position,
+        reverse,
+        pk_field="post_id",
+    ).values_list("date", "post_id")[:limit]
+
+
+def _pulled_sources(pulled, position, reverse, limit):
+    """Slice the cached lists of pull authors at ``position``.
+
+    Returns the slices, and the authors whose page reaches past their
+    cached ``TIMELINE_RECENT_POSTS_SIZE`` newest posts and has to be read
+    from the database instead.
+    """
+    sources, deep = [], []
+    for author_id, keys in pulled.items():
+        sliced = _slice_keys(keys, position, reverse, limit)
+        if len(keys) < settings.TIMELINE_RECENT_POSTS_SIZE:
+            # The list holds every post of the author
+            sources.append(sliced)
+        elif reverse:
+            # Older positions can have uncached posts right after them
+            if position is not None and position < tuple(keys[-1]):
+                deep.append(author_id)
+            else:
+                sources.append(sliced)
+        elif len(sliced) < limit:
+            deep.append(author_id)
+        else:
+            sources.append(sliced)
+    return sources, deep
+
+
+def _deep_keys(author_ids, position, reverse, limit):
+    return keyset_filter(
+        Post.objects.filter(author_id__in=author_ids), position, reverse
+    ).values_list("date", "id")[:limit]
+
+
+def _merge_pulled(pushed, sources, reverse, limit):
+    """Merge the pull authors' posts into the pushed keys"""
+    if not sources:
+        return pushed
+
+    sources = [pushed] + sources
+    merged = merge_timelines(sources, limit, reverse)
+
+    pushed_ids = {post_id for _, post_id in pushed}
+    metrics.incr("timeline.merge.reads")
+    metrics.observe("timeline.merge.sources", len(sources))
+    metrics.observe(
+        "timeline.merge.pulled_entries",
+        sum(1 for _, post_id in merged if post_id not in pushed_ids),
+    )
+    return merged
+
+
+def timeline_post_ids(user, limit=None):
+    """Return the newest post IDs of a user's feed, newest first"""
+    return [post_id for _, post_id in timeline_keys(user, limit)]
+
+
+def hydrate_posts(post_ids, queryset=None):
+    """Load posts for a list of IDs in one query, keeping the given order"""
+    if queryset is None:
+        queryset = Post.objects.all()
+    posts = queryset.select_related("author").in_bulk(list(post_ids))
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+
+async def ahydrate_posts(post_ids, queryset=None):
+    """``hydrate_posts`` on the async ORM"""
+    if queryset is None:
+        queryset = Post.objects.all()
+    posts = await queryset.select_related("author").ain_bulk(list(post_ids))
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
@@ -1,26 +1,33 @@
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseRedirect
+from django.db import IntegrityError
+from django.http import HttpResponse, HttpResponseRedirect
 from django.shortcuts import render
 from django.urls import reverse
-from django.db.models import Count
+from . import timelines
 from .models import Follow
 from users.models import User
-from posts.models import Post
+from posts.pagination import paginate_request
+from posts.viewer_state import liked_post_ids, resolve_viewer_state
 
 
 @login_required
 def following_page(request):
     user = request.user
-    following = Follow.objects.filter(current_user=user).values_list(
-        "second_user", flat=True
-    )
-    posts_of_the_page = (
-        Post.objects.filter(author__in=following)
-        .order_by("-date")
-        .annotate(num_likes=Count("likes"), num_dislikes=Count("dislikes"))
+    posts_of_the_page = paginate_request(
+        request,
+        lambda position, reverse, limit: timelines.timeline_keys(
+            user, limit, position, reverse
+        ),
     )
+    post_ids = [post_id for _, post_id in posts_of_the_page]
+    posts_of_the_page.object_list = timelines.hydrate_posts(post_ids)
     return render(
-        request, "social/following.html", {"posts_of_the_page": posts_of_the_page}
+        request,
+        "social/following.html",
+        {
+            "posts_of_the_page": posts_of_the_page,
+            "user_liked_id": liked_post_ids(resolve_viewer_state(user, post_ids)),
+        },
     )
 
 
@@ -31,7 +38,11 @@ def follow(request):
         user = request.user
         second_user = User.objects.get(pk=id)
         follow_method = Follow(current_user=user, second_user=second_user)
-        follow_method.save()
+        try:
+            follow_method.save()
+        except IntegrityError:
+            # Already following, e.g. a double-submitted form
+            pass
         return HttpResponseRedirect(
             reverse("users:profile", kwargs={"username": second_user.username})
         )
@@ -50,3 +61,8 @@ def unfollow(request):
         return HttpResponseRedirect(
             reverse("users:profile", kwargs={"username": second_user.username})
         )
+
+
+def live_events_unavailable(request):
+    """The live updates stream, in the URL map of the sync deployment"""
+    return HttpResponse("Live updates need the ASGI deployment.", status=501)
@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "social_network.settings")
+# Swap in the async feed, post and profile reads; set it to
+# social_network.urls to serve the sync views over ASGI instead
+os.environ.setdefault("SOCIAL_NETWORK_URLCONF", "social_network.async_urls")
 
 application = get_asgi_application()
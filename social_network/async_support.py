@@ -0,0 +1,86 @@
+"""
+Helpers for the async read path (see social_network.async_urls).
+
+The async views are plain Django coroutine views: DRF views are sync only.
+``read_path`` puts one in front of the DRF view of the same route and serves
+anonymous or session-authenticated JSON GETs itself. Everything else (writes,
+``Authorization`` headers, the browsable API, anything the async view
+declines by returning ``None``) is handed to the DRF view unchanged, so the
+two deployments answer every request the same way. Views marked with
+``file_view`` answer whatever the client accepts, and ``aiterate`` feeds a
+blocking iterator to a streaming response without buffering it.
+"""
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+
+READ_METHODS = ("GET", "HEAD")
+
+
+def json_response(data, status=200):
+    """Render ``data`` the way DRF's ``JSONRenderer`` does"""
+    response = HttpResponse(
+        JSONRenderer().render(data), content_type="application/json", status=status
+    )
+    # The same URL renders the browsable API for browsers
+    patch_vary_headers(response, ("Accept",))
+    return response
+
+
+def error_response(exc):
+    """Answer an ``APIException`` like DRF's exception handler"""
+    return json_response({"detail": exc.detail}, exc.status_code)
+
+
+def not_found(model):
+    """The 404 DRF answers when ``get_object_or_404`` misses"""
+    return error_response(
+        NotFound(f"No {model._meta.object_name} matches the given query.")
+    )
+
+
+def file_view(view):
+    """Mark an async view whose body is a file whatever the client accepts"""
+    view.negotiates = False
+    return view
+
+
+async def aiterate(iterator):
+    """Iterate a blocking iterator, each step on the thread of the sync ORM"""
+    done = object()
+    step = sync_to_async(next)
+    while (item := await step(iterator, done)) is not done:
+        yield item
+
+
+def serves_async(request, kwargs, negotiates=True):
+    """Whether the async view may answer ``request`` at all"""
+    if request.method not in READ_METHODS or "HTTP_AUTHORIZATION" in request.META:
+        return False
+    if not negotiates:
+        return True
+    renderer = kwargs.get("format") or request.GET.get("format") or "json"
+    return renderer == "json" and "text/html" not in request.headers.get("Accept", "")
+
+
+def read_path(async_view, sync_view, login_required=False):
+    """Serve JSON reads with ``async_view`` and the rest with ``sync_view``"""
+
+    negotiates = getattr(async_view, "negotiates", True)
+
+    @csrf_exempt
+    async def view(request, *args, **kwargs):
+        if serves_async(request, kwargs, negotiates):
+            request.user = await request.auser()
+            if request.user.is_authenticated or not login_required:
+                view_kwargs = {k: v for k, v in kwargs.items() if k != "format"}
+                response = await async_view(request, *args, **view_kwargs)
+                if response is not None:
+                    return response
+        return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+    return view
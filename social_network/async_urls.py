@@ -0,0 +1,66 @@
+"""
+URL map of the ASGI deployment (see social_network.asgi).
+
+The routes of social_network.urls, with the heavy read endpoints swapped for
+their async versions. Routes are matched by name, so paths, router actions
+and format suffixes stay exactly as in the sync map.
+"""
+
+from django.urls import URLPattern, URLResolver
+
+from . import urls
+from .async_support import read_path
+from posts import async_views as post_views
+from social import async_views as social_views
+from users import async_views as user_views
+
+# Route name -> (async view, whether it needs a logged in user). The sync
+# view of the route still answers what the async view does not serve.
+READ_VIEWS = {
+    "post-list": (post_views.post_list, False),
+    "post-detail": (post_views.post_detail, False),
+    "following-posts": (social_views.following_posts, True),
+    "user-follow-stats": (social_views.follow_stats, False),
+    "user-profile": (user_views.profile, False),
+    "user-export": (user_views.export, True),
+}
+
+# Route name -> async view replacing the sync one outright
+VIEWS = {
+    "posts:index": post_views.index,
+    # Streams hold their connection open; only served here
+    "live-events": social_views.live_events,
+}
+
+
+def swap_views(patterns, namespace=""):
+    swapped = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            prefix = (
+                f"{namespace}{pattern.namespace}:" if pattern.namespace else namespace
+            )
+            swapped.append(
+                URLResolver(
+                    pattern.pattern,
+                    swap_views(pattern.url_patterns, prefix),
+                    pattern.default_kwargs,
+                    pattern.app_name,
+                    pattern.namespace,
+                )
+            )
+            continue
+        name = f"{namespace}{pattern.name}"
+        callback = pattern.callback
+        if name in READ_VIEWS:
+            async_view, login_required = READ_VIEWS[name]
+            callback = read_path(async_view, callback, login_required)
+        elif name in VIEWS:
+            callback = VIEWS[name]
+        swapped.append(
+            URLPattern(pattern.pattern, callback, pattern.default_args, pattern.name)
+        )
+    return swapped
+
+
+urlpatterns = swap_views(urls.urlpatterns)
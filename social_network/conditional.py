@@ -0,0 +1,61 @@
+"""
+Conditional GET for read endpoints.
+
+ETags are derived from data the endpoint loads anyway (post versions, user
+counter rows), never from the rendered body, so a matching ``If-None-Match``
+is answered with ``304 Not Modified`` before any serialization happens.
+"""
+
+import hashlib
+
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import quote_etag
+
+from . import metrics
+
+# Responses that depend on who is asking: browsers may store them, shared
+# caches may not, and both must revalidate before reuse
+PRIVATE = {"private": True, "no_cache": True}
+# Responses that are the same for every viewer
+PUBLIC = {"public": True, "no_cache": True}
+
+VARY = ("Accept", "Cookie", "Authorization")
+
+
+def compute_etag(request, *parts):
+    """Build a strong ETag from the request's URL and format plus ``parts``"""
+    # Plain Django requests come from the async views, which only render JSON
+    renderer = getattr(request, "accepted_renderer", None)
+    key = (request.get_full_path(), getattr(renderer, "format", "json")) + parts
+    return quote_etag(hashlib.sha1(repr(key).encode()).hexdigest())
+
+
+def conditional_response(request, etag, build, cache_control=PRIVATE):
+    """Return a 304 when the client already holds ``etag``, else ``build()``"""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build()
+    else:
+        metrics.incr("http.not_modified")
+    return _finish(response, etag, cache_control)
+
+
+async def aconditional_response(request, etag, build, cache_control=PRIVATE):
+    """``conditional_response`` for a coroutine function ``build``"""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = await build()
+    else:
+        metrics.incr("http.not_modified")
+    return _finish(response, etag, cache_control)
+
+
+def _finish(response, etag, cache_control):
+    response["ETag"] = etag
+    patch_cache_control(response, **cache_control)
+    patch_vary_headers(response, VARY)
+    return response
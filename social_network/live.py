@@ -0,0 +1,219 @@
+"""
+In-process pub/sub for live updates, streamed as Server-Sent Events by
+social.async_views.live_events.
+
+Subscribers are indexed by topic: ``author:{id}`` carries new posts of an
+author and ``post:{id}`` the engagement of a post. An event is encoded into
+an SSE frame once and the same bytes are handed to every subscriber of its
+topic, so fan-out costs one queue put per connection and never a query.
+
+Writers publish after their transaction commits: new posts from
+posts.signals and posts.bulk, counter shifts from interactions.signals and
+interactions.services. Counter shifts are not sent one by one; they are
+summed per post for ``LIVE_COALESCE_SECONDS`` and sent as one ``counts``
+event of deltas, and only for posts someone is watching.
+
+Publishers run in worker threads and subscribers on the event loop, so
+frames cross over with ``call_soon_threadsafe``. A subscriber that falls
+``LIVE_QUEUE_SIZE`` frames behind is dropped and its stream ends; the
+client reconnects and reloads. The broker is per process: with several
+server processes a subscriber only hears about writes made in its own.
+"""
+
+import asyncio
+import json
+import threading
+from collections import Counter, defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from . import metrics
+
+# Post counter field -> key of the ``counts`` event
+COUNT_KEYS = {
+    "likes_count": "likes",
+    "dislikes_count": "dislikes",
+    "comments_count": "comments",
+}
+
+# Queued in place of a frame when a subscriber overflows
+CLOSED = None
+
+
+def author_topic(author_id):
+    return f"author:{author_id}"
+
+
+def post_topic(post_id):
+    return f"post:{post_id}"
+
+
+def encode(event, data):
+    """One SSE frame"""
+    payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return f"event: {event}\ndata: {payload}\n\n".encode()
+
+
+class Subscription:
+    """The queue of frames of one connection, on its event loop"""
+
+    def __init__(self, broker, topics, size):
+        self.broker = broker
+        self.topics = frozenset(topics)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(size)
+        self.closed = False
+
+    def deliver(self, frame):
+        """Queue a frame from any thread"""
+        try:
+            self.loop.call_soon_threadsafe(self._put, frame)
+        except RuntimeError:
+            # The event loop is gone with the connection
+            self.close()
+
+    def _put(self, frame):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            metrics.incr("live.overflow")
+            self.close()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(CLOSED)
+
+    async def get(self, timeout):
+        """The next frame, or ``CLOSED``; raises TimeoutError after ``timeout``"""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.closed = True
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """Topic -> subscribers, plus the pending counter deltas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._topics = defaultdict(set)
+        self._counts = defaultdict(Counter)
+        self._timer = None
+
+    def subscribe(self, topics, size=None):
+        """Subscribe the running event loop to ``topics``"""
+        subscription = Subscription(self, topics, size or settings.LIVE_QUEUE_SIZE)
+        with self._lock:
+            for topic in subscription.topics:
+                self._topics[topic].add(subscription)
+        metrics.incr("live.subscribed")
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+
+    def subscriber_count(self, topic):
+        with self._lock:
+            return len(self._topics.get(topic, ()))
+
+    def publish(self, topic, event, data):
+        """Send one event to every subscriber of ``topic``"""
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        if not subscribers:
+            return
+        frame = encode(event, data)
+        for subscription in subscribers:
+            subscription.deliver(frame)
+        metrics.incr("live.events")
+        metrics.incr("live.deliveries", len(subscribers))
+
+    def add_counts(self, post_id, deltas):
+        """Add counter deltas of a watched post to the next ``counts`` event"""
+        window = settings.LIVE_COALESCE_SECONDS
+        with self._lock:
+            if post_topic(post_id) not in self._topics:
+                return
+            self._counts[post_id].update(deltas)
+            if window and self._timer is None:
+                self._timer = threading.Timer(window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if not window:
+            self.flush()
+
+    def flush(self):
+        """Publish the coalesced ``counts`` events"""
+        with self._lock:
+            counts, self._counts = self._counts, defaultdict(Counter)
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        for post_id, deltas in counts.items():
+            changed = {key: delta for key, delta in deltas.items() if delta}
+            if changed:
+                self.publish(
+                    post_topic(post_id), "counts", {"post": post_id, **changed}
+                )
+
+
+broker = Broker()
+
+
+def publish_posts(posts):
+    """Announce new posts to their authors' subscribers once committed"""
+    events = [
+        (
+            author_topic(post.author_id),
+            {"id": post.pk, "author_id": post.author_id, "date": post.date},
+        )
+        for post in posts
+    ]
+
+    def publish():
+        for topic, data in events:
+            broker.publish(topic, "post", data)
+
+    transaction.on_commit(publish)
+
+
+def publish_counts(deltas, field):
+    """Queue ``{post_id: delta}`` shifts of a counter field once committed"""
+    key = COUNT_KEYS[field]
+    deltas = {post_id: delta for post_id, delta in deltas.items() if delta}
+    if deltas:
+        transaction.on_commit(partial(_add_counts, deltas, key))
+
+
+def _add_counts(deltas, key):
+    for post_id, delta in deltas.items():
+        broker.add_counts(post_id, {key: delta})
+
+
+async def stream(subscription):
+    """The SSE body of a subscription; ends when it overflows"""
+    try:
+        yield f"retry: {settings.LIVE_RETRY_MS}\n\n".encode()
+        while True:
+            try:
+                frame = await subscription.get(settings.LIVE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Keeps proxies from timing the connection out
+                yield b": keep-alive\n\n"
+                continue
+            if frame is CLOSED:
+                return
+            yield frame
+    finally:
+        subscription.close()
@@ -0,0 +1,484 @@
+"""
+End-to-end load harness for the real URL map.
+
+Virtual users replay a weighted mix of scenarios (browse the index, scroll
+the following feed, like, comment, follow, view a profile, and the API reads
+``post_list``, ``post_detail``, ``user_profile`` and ``follow_stats``)
+against one of:
+
+- ``wsgi``: the WSGI handler in-process, one thread per virtual user;
+- ``asgi``: the ASGI handler in-process, one task per virtual user;
+- a base URL such as ``http://127.0.0.1:8000``: a running server (gunicorn,
+  runserver), one thread and keep-alive connection per virtual user.
+
+Every request is timed and, in-process, its database queries are counted
+through an execute wrapper scoped to the request with a context variable,
+so concurrent requests are counted apart. ``summarize`` turns the samples
+into per-endpoint p50/p95/p99 latency, requests per second, queries per
+request and status counts, as JSON that can be diffed between runs.
+
+Scenarios write to the database they run against: point the harness at a
+disposable dataset (see the generate_dataset command).
+"""
+
+import asyncio
+import contextvars
+import http.client
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, namedtuple
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from . import metrics
+from posts.models import Post
+from users.models import User
+
+Request = namedtuple("Request", ["endpoint", "method", "path", "data"])
+Sample = namedtuple("Sample", ["endpoint", "status", "ms", "queries"])
+
+# A virtual user: who they are and how they authenticate
+Session = namedtuple("Session", ["username", "session_key", "csrf_token"])
+
+# Handed to a scenario in place of the body of a request that raised
+FAILED = object()
+
+DEFAULT_MIX = {
+    "index": 3,
+    "feed": 4,
+    "like": 2,
+    "comment": 1,
+    "follow": 1,
+    "profile": 2,
+}
+
+_queries = contextvars.ContextVar("loadtest_queries", default=None)
+
+
+class Context:
+    """Data the scenarios draw from, loaded once before the run"""
+
+    def __init__(self, post_ids, usernames, scroll_pages):
+        self.post_ids = post_ids
+        self.usernames = usernames
+        self.scroll_pages = scroll_pages
+
+
+def index(context, session, rng):
+    yield Request("index", "GET", reverse("posts:index"), None)
+
+
+def feed(context, session, rng):
+    path = reverse("following-posts")
+    for _ in range(context.scroll_pages):
+        body = yield Request("feed", "GET", path, None)
+        next_url = body.get("next") if isinstance(body, dict) else None
+        if not next_url:
+            return
+        parts = urlsplit(next_url)
+        path = f"{parts.path}?{parts.query}"
+
+
+def like(context, session, rng):
+    post_id = rng.choice(context.post_ids)
+    yield Request("like", "POST", reverse("post-like", args=[post_id]), {})
+
+
+def comment(context, session, rng):
+    post_id = rng.choice(context.post_ids)
+    yield Request(
+        "comment",
+        "POST",
+        reverse("post-add-comment", args=[post_id]),
+        {"content": f"Load test comment {rng.random():.6f}"},
+    )
+
+
+def follow(context, session, rng):
+    # Already following answers 400, which is reported but not an error
+    yield Request(
+        "follow",
+        "POST",
+        reverse("follow-follow-user"),
+        {"username": rng.choice(context.usernames)},
+    )
+
+
+def profile(context, session, rng):
+    username = rng.choice(context.usernames)
+    yield Request("profile", "GET", reverse("users:profile", args=[username]), None)
+
+
+def post_list(context, session, rng):
+    yield Request("post_list", "GET", reverse("post-list"), None)
+
+
+def post_detail(context, session, rng):
+    post_id = rng.choice(context.post_ids)
+    yield Request("post_detail", "GET", reverse("post-detail", args=[post_id]), None)
+
+
+def user_profile(context, session, rng):
+    username = rng.choice(context.usernames)
+    yield Request("user_profile", "GET", reverse("user-profile", args=[username]), None)
+
+
+def follow_stats(context, session, rng):
+    username = rng.choice(context.usernames)
+    yield Request(
+        "follow_stats", "GET", reverse("user-follow-stats", args=[username]), None
+    )
+
+
+SCENARIOS = {
+    "index": index,
+    "feed": feed,
+    "like": like,
+    "comment": comment,
+    "follow": follow,
+    "profile": profile,
+    "post_list": post_list,
+    "post_detail": post_detail,
+    "user_profile": user_profile,
+    "follow_stats": follow_stats,
+}
+
+
+def parse_mix(value):
+    """Parse ``"index=3,feed=4"`` into ``{"index": 3, "feed": 4}``"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name!r}")
+        mix[name] = float(weight) if weight else 1.0
+        if mix[name] < 0:
+            raise ValueError(f"Negative weight for {name!r}")
+    if not any(mix.values()):
+        raise ValueError("The mix has no positive weight")
+    return mix
+
+
+def count_queries(execute, sql, params, many, context):
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def _install_counter(sender, connection, **kwargs):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+class ClientTarget:
+    """The WSGI handler, in-process"""
+
+    def __init__(self, session):
+        self.client = Client()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+    def send(self, request):
+        if request.method == "GET":
+            response = self.client.get(request.path)
+        else:
+            response = self.client.post(
+                request.path, request.data, content_type="application/json"
+            )
+        return response.status_code, _json(
+            response.get("Content-Type"), response.content
+        )
+
+    def close(self):
+        # Connections are per thread; this one ends with its virtual user
+        connections.close_all()
+
+
+class AsyncClientTarget:
+    """The ASGI handler, in-process; sync views run on Django's executor"""
+
+    def __init__(self, session):
+        self.client = AsyncClient()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+    async def send(self, request):
+        if request.method == "GET":
+            response = await self.client.get(request.path)
+        else:
+            response = await self.client.post(
+                request.path, request.data, content_type="application/json"
+            )
+        return response.status_code, _json(
+            response.get("Content-Type"), response.content
+        )
+
+
+class HttpTarget:
+    """A running server, over one keep-alive connection"""
+
+    def __init__(self, session, base_url):
+        parts = urlsplit(base_url)
+        connection_class = (
+            http.client.HTTPSConnection
+            if parts.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self.connection = connection_class(parts.netloc, timeout=60)
+        self.prefix = parts.path.rstrip("/")
+        self.headers = {
+            "Cookie": f"{settings.SESSION_COOKIE_NAME}={session.session_key}; "
+            f"{settings.CSRF_COOKIE_NAME}={session.csrf_token}",
+            "X-CSRFToken": session.csrf_token,
+            "Referer": base_url,
+        }
+
+    def send(self, request):
+        headers = dict(self.headers)
+        body = None
+        if request.method != "GET":
+            body = json.dumps(request.data)
+            headers["Content-Type"] = "application/json"
+        self.connection.request(
+            request.method, self.prefix + request.path, body=body, headers=headers
+        )
+        response = self.connection.getresponse()
+        content = response.read()
+        return response.status, _json(response.getheader("Content-Type"), content)
+
+    def close(self):
+        self.connection.close()
+
+
+def _json(content_type, content):
+    if not (content_type or "").startswith("application/json"):
+        return None
+    return json.loads(content)
+
+
+def sample_dataset(concurrency, scroll_pages):
+    """Load the scenario ``Context`` and the users to run as from the database"""
+    post_ids = list(
+        Post.objects.order_by("-date", "-id").values_list("pk", flat=True)[:1000]
+    )
+    usernames = list(
+        User.objects.order_by("-followers_count", "pk").values_list(
+            "username", flat=True
+        )[:1000]
+    )
+    # The most connected users have the fullest feeds
+    users = list(
+        User.objects.filter(is_active=True).order_by("-following_count", "pk")[
+            :concurrency
+        ]
+    )
+    return Context(post_ids, usernames, scroll_pages), users
+
+
+def make_sessions(users):
+    """Log each user in once; return their sessions"""
+    sessions = []
+    for user in users:
+        client = Client()
+        client.force_login(user)
+        sessions.append(
+            Session(
+                user.username,
+                client.cookies[settings.SESSION_COOKIE_NAME].value,
+                # An unmasked CSRF secret is accepted as both cookie and header
+                get_random_string(32),
+            )
+        )
+    return sessions
+
+
+class Runner:
+    """Drives the virtual users until ``total`` requests have been sent"""
+
+    def __init__(self, target, context, sessions, mix, total, seed=0):
+        self.target = target
+        self.context = context
+        self.sessions = sessions
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.total = total
+        self.seed = seed
+        self.samples = []
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def claim(self):
+        """Reserve one request of the total; every request of a scenario does"""
+        with self._lock:
+            if self.sent >= self.total:
+                return False
+            self.sent += 1
+            return True
+
+    def record(self, sample):
+        with self._lock:
+            self.samples.append(sample)
+
+    def scenario(self, session, rng):
+        name = rng.choices(self.names, weights=self.weights)[0]
+        return SCENARIOS[name](self.context, session, rng)
+
+    def run(self):
+        """Run every virtual user; return ``(samples, elapsed seconds)``"""
+        # Expected 4xx answers (already following) would flood the log
+        request_logger = logging.getLogger("django.request")
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        in_process = self.counts_queries
+        if in_process:
+            connection_created.connect(_install_counter)
+            for connection in connections.all(initialized_only=True):
+                _install_counter(None, connection)
+            # The test clients send "Host: testserver", as under the test runner
+            hosts = override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]
+            )
+            hosts.enable()
+        start = time.perf_counter()
+        try:
+            if self.target == "asgi":
+                asyncio.run(self.run_async())
+            else:
+                threads = [
+                    threading.Thread(target=self.run_user, args=(index, session))
+                    for index, session in enumerate(self.sessions)
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            request_logger.setLevel(level)
+            if in_process:
+                hosts.disable()
+                connection_created.disconnect(_install_counter)
+        return self.samples, time.perf_counter() - start
+
+    @property
+    def counts_queries(self):
+        return self.target in ("wsgi", "asgi")
+
+    def make_target(self, session):
+        if self.target == "wsgi":
+            return ClientTarget(session)
+        if self.target == "asgi":
+            return AsyncClientTarget(session)
+        return HttpTarget(session, self.target)
+
+    def stream(self, session, rng):
+        """Endless requests of one virtual user, scenario after scenario.
+
+        Send each response body back in; sending ``FAILED`` abandons the
+        current scenario.
+        """
+        while True:
+            steps = self.scenario(session, rng)
+            body = None
+            try:
+                while True:
+                    body = yield steps.send(body)
+                    if body is FAILED:
+                        break
+            except StopIteration:
+                pass
+
+    def run_user(self, index, session):
+        stream = self.stream(session, random.Random(f"{self.seed}:{index}"))
+        target = self.make_target(session)
+        try:
+            request = next(stream)
+            while self.claim():
+                measure = self.start()
+                try:
+                    status, body = target.send(request)
+                except Exception as exc:
+                    status, body = f"error: {type(exc).__name__}", FAILED
+                request = stream.send(self.finish(measure, request, status, body))
+        finally:
+            target.close()
+
+    async def run_async(self):
+        await asyncio.gather(
+            *[
+                self.run_user_async(index, session)
+                for index, session in enumerate(self.sessions)
+            ]
+        )
+
+    async def run_user_async(self, index, session):
+        stream = self.stream(session, random.Random(f"{self.seed}:{index}"))
+        target = self.make_target(session)
+        request = next(stream)
+        while self.claim():
+            measure = self.start()
+            try:
+                status, body = await target.send(request)
+            except Exception as exc:
+                status, body = f"error: {type(exc).__name__}", FAILED
+            request = stream.send(self.finish(measure, request, status, body))
+
+    def start(self):
+        """Start timing a request and counting its queries"""
+        counter = [0]
+        return time.perf_counter(), _queries.set(counter), counter
+
+    def finish(self, measure, request, status, body):
+        """Record one request; return the body to hand back to its scenario"""
+        start, token, counter = measure
+        ms = (time.perf_counter() - start) * 1000
+        _queries.reset(token)
+        self.record(Sample(request.endpoint, status, ms, counter[0]))
+        return body
+
+
+def summarize(samples, elapsed, counts_queries=True):
+    """Per-endpoint and overall statistics of a run, JSON serializable"""
+    by_endpoint = defaultdict(list)
+    for sample in samples:
+        by_endpoint[sample.endpoint].append(sample)
+
+    def stats(group):
+        latencies = sorted(sample.ms for sample in group)
+        statuses = defaultdict(int)
+        for sample in group:
+            statuses[str(sample.status)] += 1
+        return {
+            "requests": len(group),
+            "rps": round(len(group) / elapsed, 2) if elapsed else None,
+            "p50_ms": round(metrics.percentile(latencies, 50), 2),
+            "p95_ms": round(metrics.percentile(latencies, 95), 2),
+            "p99_ms": round(metrics.percentile(latencies, 99), 2),
+            "queries_per_request": (
+                round(sum(sample.queries for sample in group) / len(group), 2)
+                if counts_queries
+                else None
+            ),
+            "errors": sum(
+                1
+                for sample in group
+                if not isinstance(sample.status, int) or sample.status >= 500
+            ),
+            "statuses": dict(sorted(statuses.items())),
+        }
+
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "total": stats(samples) if samples else None,
+        "endpoints": {
+            name: stats(group) for name, group in sorted(by_endpoint.items())
+        },
+    }
@@ -0,0 +1,109 @@
+import json
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from social_network import loadtest
+
+# The read endpoints with an async version (see social_network.async_urls)
+READ_MIX = {
+    "index": 1,
+    "feed": 1,
+    "post_list": 1,
+    "post_detail": 1,
+    "user_profile": 1,
+    "follow_stats": 1,
+}
+
+# Label -> (load harness target, URL map)
+PATHS = {
+    "sync-wsgi": ("wsgi", "social_network.urls"),
+    "sync-asgi": ("asgi", "social_network.urls"),
+    "async-asgi": ("asgi", "social_network.async_urls"),
+}
+
+COLUMNS = ["requests", "rps", "p50_ms", "p95_ms", "p99_ms", "queries_per_request"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sync read views (under WSGI and ASGI) with the async "
+        "read path under ASGI, in-process, with the same read-only scenario "
+        "mix and virtual users"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests", type=int, default=500, help="Requests per path"
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=8, help="Number of virtual users"
+        )
+        parser.add_argument(
+            "--mix",
+            type=loadtest.parse_mix,
+            default=READ_MIX,
+            help="Scenario weights, as for the loadtest command",
+        )
+        parser.add_argument("--scroll-pages", type=int, default=2)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests and --concurrency must be positive.")
+        context, users = loadtest.sample_dataset(
+            options["concurrency"], options["scroll_pages"]
+        )
+        if not context.post_ids or not users:
+            raise CommandError("No users or posts to load; run generate_dataset.")
+
+        sessions = loadtest.make_sessions(users)
+        results = {}
+        try:
+            for label, (target, urlconf) in PATHS.items():
+                runner = loadtest.Runner(
+                    target,
+                    context,
+                    sessions,
+                    options["mix"],
+                    options["requests"],
+                    seed=options["seed"],
+                )
+                with override_settings(ROOT_URLCONF=urlconf):
+                    samples, elapsed = runner.run()
+                results[label] = loadtest.summarize(samples, elapsed)
+        finally:
+            Session.objects.filter(
+                session_key__in=[session.session_key for session in sessions]
+            ).delete()
+
+        self.report(results)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+                output.write("\n")
+
+    def report(self, results):
+        rows = [("endpoint", "path", *COLUMNS, "errors")]
+        endpoints = sorted(
+            {name for run in results.values() for name in run["endpoints"]}
+        )
+        for name in [*endpoints, "total"]:
+            for label, run in results.items():
+                stats = run["total"] if name == "total" else run["endpoints"].get(name)
+                if stats:
+                    rows.append(
+                        (
+                            name,
+                            label,
+                            *(stats[column] for column in COLUMNS),
+                            stats["errors"],
+                        )
+                    )
+        widths = [max(len(str(row[i])) for row in rows) for i in range(len(rows[0]))]
+        for row in rows:
+            self.stdout.write(
+                "  ".join(str(value).rjust(width) for value, width in zip(row, widths))
+            )
@@ -0,0 +1,130 @@
+import json
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from social_network import loadtest
+
+COLUMNS = ["requests", "rps", "p50_ms", "p95_ms", "p99_ms", "queries_per_request"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the real URL map with a weighted scenario mix and report latency "
+        "percentiles, throughput and queries per request for each endpoint. "
+        "Scenarios write to the database, so run it against a disposable "
+        "dataset (see generate_dataset)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            default="wsgi",
+            help="wsgi or asgi (in-process), or the base URL of a running server",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=1000, help="Total requests to send"
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=8, help="Number of virtual users"
+        )
+        parser.add_argument(
+            "--mix",
+            type=loadtest.parse_mix,
+            default=loadtest.DEFAULT_MIX,
+            help="Scenario weights, e.g. index=3,feed=4,like=2,comment=1,"
+            "follow=1,profile=2",
+        )
+        parser.add_argument(
+            "--scroll-pages",
+            type=int,
+            default=3,
+            help="Most feed pages one feed scenario scrolls through",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+        parser.add_argument(
+            "--baseline", help="Compare with the JSON results of an earlier run"
+        )
+
+    def handle(self, *args, **options):
+        target = options["target"]
+        if target not in ("wsgi", "asgi") and not target.startswith(
+            ("http://", "https://")
+        ):
+            raise CommandError("--target must be wsgi, asgi or an http(s) URL.")
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests and --concurrency must be positive.")
+
+        context, users = loadtest.sample_dataset(
+            options["concurrency"], options["scroll_pages"]
+        )
+        if not context.post_ids or not users:
+            raise CommandError("No users or posts to load; run generate_dataset.")
+
+        sessions = loadtest.make_sessions(users)
+        runner = loadtest.Runner(
+            target,
+            context,
+            sessions,
+            options["mix"],
+            options["requests"],
+            seed=options["seed"],
+        )
+        started = timezone.now()
+        try:
+            samples, elapsed = runner.run()
+        finally:
+            Session.objects.filter(
+                session_key__in=[session.session_key for session in sessions]
+            ).delete()
+
+        results = {
+            "run": {
+                "started_at": started.isoformat(),
+                "target": target,
+                "database": connection.vendor,
+                "requests": options["requests"],
+                "concurrency": len(sessions),
+                "mix": options["mix"],
+                "seed": options["seed"],
+            },
+            **loadtest.summarize(samples, elapsed, runner.counts_queries),
+        }
+        self.report(results)
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline:
+                self.compare(json.load(baseline), results)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+                output.write("\n")
+
+    def report(self, results):
+        rows = [("endpoint", *COLUMNS, "errors")]
+        for name, stats in [*results["endpoints"].items(), ("total", results["total"])]:
+            rows.append((name, *(stats[column] for column in COLUMNS), stats["errors"]))
+        widths = [max(len(str(row[i])) for row in rows) for i in range(len(rows[0]))]
+        for row in rows:
+            self.stdout.write(
+                "  ".join(str(value).rjust(width) for value, width in zip(row, widths))
+            )
+
+    def compare(self, baseline, results):
+        self.stdout.write("Change from baseline:")
+        for name, stats in results["endpoints"].items():
+            before = baseline.get("endpoints", {}).get(name)
+            if not before:
+                continue
+            self.stdout.write(
+                f"{name}: p95 {change(before['p95_ms'], stats['p95_ms'])}, "
+                f"rps {change(before['rps'], stats['rps'])}"
+            )
+
+
+def change(before, after):
+    if not before or after is None:
+        return "n/a"
+    return f"{(after - before) / before:+.1%}"
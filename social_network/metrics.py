@@ -0,0 +1,89 @@
+"""
+Lightweight in-process metrics.
+
+Counters and timing samples live in the worker process that recorded them,
+which is enough to tune thresholds and cache sizes from the metrics endpoint
+or a shell. Samples are kept in a bounded window per metric, and every
+``<name>.hits`` / ``<name>.misses`` counter pair is reported as a hit ratio.
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+MAX_SAMPLES = 1000
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_samples = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+
+
+def incr(name, value=1):
+    """Add ``value`` to the counter ``name``"""
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name, value):
+    """Record one sample (a size, a lag, a duration in ms) for ``name``"""
+    with _lock:
+        _samples[name].append(value)
+
+
+@contextmanager
+def timer(name):
+    """Record the duration of the wrapped block in milliseconds"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, (time.perf_counter() - start) * 1000)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+def hit_ratios(counters):
+    """Return ``{<name>.hit_ratio: ratio}`` for every hits/misses counter pair"""
+    ratios = {}
+    for name, hits in counters.items():
+        if name.endswith(".hits"):
+            prefix = name[: -len(".hits")]
+            total = hits + counters.get(f"{prefix}.misses", 0)
+            ratios[f"{prefix}.hit_ratio"] = hits / total if total else None
+    return ratios
+
+
+def snapshot():
+    """Return all counters, hit ratios and a summary of every sample window"""
+    with _lock:
+        counters = dict(_counters)
+        samples = {name: sorted(window) for name, window in _samples.items()}
+    return {
+        "counters": counters,
+        "ratios": hit_ratios(counters),
+        "samples": {
+            name: {
+                "count": len(values),
+                "mean": sum(values) / len(values) if values else None,
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "max": values[-1] if values else None,
+            }
+            for name, values in samples.items()
+        },
+    }
+
+
+def reset():
+    """Forget every counter and sample (used by tests)"""
+    with _lock:
+        _counters.clear()
+        _samples.clear()
@@ -40,6 +40,8 @@ INSTALLED_APPS = [
     "posts",
     "interactions",
     "social",
+    # Management commands of the project-wide tools (see loadtest.py)
+    "social_network",
     "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
@@ -59,7 +61,8 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
-ROOT_URLCONF = "social_network.urls"
+# The ASGI entry point serves the async read views (see social_network.asgi)
+ROOT_URLCONF = os.environ.get("SOCIAL_NETWORK_URLCONF", "social_network.urls")
 
 TEMPLATES = [
     {
@@ -72,6 +75,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "social.context_processors.live_events",
             ],
         },
     },
@@ -138,6 +142,19 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static"),
 ]
 
+# Outside development, collectstatic writes content-hashed copies (e.g.
+# posts.3f2a1b.js) that can be served with far-future cache headers
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": (
+            "django.contrib.staticfiles.storage.StaticFilesStorage"
+            if DEBUG
+            else "django.contrib.staticfiles.storage.ManifestStaticFilesStorage"
+        )
+    },
+}
+
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/media/"
 
@@ -151,10 +168,86 @@ REST_FRAMEWORK = {
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.BasicAuthentication",
     ],
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "posts.pagination.PageSizePagination",
     "PAGE_SIZE": 10,
     "DEFAULT_RENDERER_CLASSES": [
         "rest_framework.renderers.JSONRenderer",
         "rest_framework.renderers.BrowsableAPIRenderer",
     ],
 }
+
+
+# Home timelines (see social/timelines.py)
+TIMELINE_MAX_LENGTH = 800
+TIMELINE_BACKFILL_SIZE = 100
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+# Authors with more followers than this are merged in at read time instead
+# of being pushed into every follower's timeline
+TIMELINE_FANOUT_FOLLOWER_THRESHOLD = 10000
+# A pulled author is pushed again only once their followers drop this far
+# below the threshold
+TIMELINE_FANOUT_HYSTERESIS = 1000
+# Threads pushing the posts of authors that are pushed again; 0 pushes them
+# inline after commit
+TIMELINE_BACKFILL_WORKERS = 1
+TIMELINE_RECENT_POSTS_SIZE = 200
+TIMELINE_RECENT_POSTS_TTL = 3600
+
+# Number of newest comments embedded in each post of an API response; the
+# full thread is served by /api/posts/{id}/comments/
+POST_COMMENT_PREVIEW_SIZE = 3
+# Lifetime of cached post representations (see posts/cache.py); entries are
+# keyed by post version, so this only bounds memory, not staleness
+POST_CACHE_TTL = 600
+
+# Username typeahead (see users/typeahead.py)
+TYPEAHEAD_LIMIT = 10
+# Most followed prefix matches ranked per lookup
+TYPEAHEAD_CANDIDATES = 200
+# Prefixes up to this length match too many users to rank on every
+# keystroke; their ranking is computed once and cached for the TTL
+TYPEAHEAD_CACHED_PREFIX_LENGTH = 2
+# Longer prefixes rank at most this many matches, taken in username order
+TYPEAHEAD_SCAN_LIMIT = 5000
+TYPEAHEAD_CACHE_TTL = 300
+
+# Write-behind like/dislike toggles (see interactions/buffer.py); a failed
+# flush is retried, but toggles still buffered when a process exits or
+# crashes are lost
+INTERACTION_WRITE_BEHIND = False
+# Seconds between flushes; None disables the background flusher
+INTERACTION_FLUSH_INTERVAL = 0.5
+# Pending entries that trigger a flush before the interval is up
+INTERACTION_FLUSH_SIZE = 5000
+# Pending entries beyond which toggles are written synchronously
+INTERACTION_BUFFER_LIMIT = 20000
+
+# Most users one bulk follow/unfollow request may name (see social/follows.py)
+FOLLOW_BULK_MAX_USERS = 1000
+
+# Most items one bulk post, comment or reaction request may hold (see
+# posts/bulk.py)
+BULK_WRITE_MAX_ITEMS = 500
+
+# Live updates over Server-Sent Events (see social_network/live.py)
+# Seconds of counter changes summed into one event per post; 0 sends at once
+LIVE_COALESCE_SECONDS = 1.0
+# Frames a connection may fall behind before it is dropped
+LIVE_QUEUE_SIZE = 256
+LIVE_HEARTBEAT_SECONDS = 15
+# Reconnection delay suggested to clients
+LIVE_RETRY_MS = 5000
+# Most posts one connection can watch
+LIVE_MAX_POSTS = 200
+
+# Rows per query (or per cursor fetch) of data exports (see users/exports.py)
+EXPORT_CHUNK_SIZE = 2000
+
+# Resized variants of post images (see posts/variants.py)
+# Variant -> largest width in pixels
+IMAGE_VARIANT_WIDTHS = {"thumb": 320, "card": 720, "full": 1600}
+IMAGE_VARIANT_QUALITY = 80
+# Width of the blurred placeholder shown until a variant loads
+IMAGE_PLACEHOLDER_WIDTH = 16
+# Worker processes rendering variants; 0 renders them inline after commit
+IMAGE_WORKERS = 2
@@ -0,0 +1,70 @@
+"""
+Test helpers shared by the app test suites.
+"""
+
+import os
+import re
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connection, connections
+
+
+class QueryPlanAssertionsMixin:
+    """
+    Assertions over SQLite's ``EXPLAIN QUERY PLAN`` for hot querysets
+    """
+
+    def query_plan(self, queryset):
+        if connection.vendor != "sqlite":
+            self.skipTest("Query plan assertions target SQLite")
+        # Each row is "<id> <parent> <notused> <detail>"
+        return [row.split(" ", 3)[-1] for row in queryset.explain().splitlines()]
+
+    def assertIndexedPlan(self, queryset):
+        """Fail on a full table scan or a temporary B-tree sort"""
+        plan = self.query_plan(queryset)
+        for detail in plan:
+            if re.fullmatch(r"SCAN \S+", detail):
+                self.fail(f"Full table scan: {detail}\n" + "\n".join(plan))
+            if "USE TEMP B-TREE" in detail:
+                self.fail(f"Temporary B-tree: {detail}\n" + "\n".join(plan))
+        return plan
+
+
+class OnDiskDatabaseMixin:
+    """
+    Concurrent writes from other threads in a ``TransactionTestCase``
+    """
+
+    @contextmanager
+    def on_disk_database(self):
+        """Point every connection used in the block at a file copy.
+
+        The shared-cache in-memory test database fails concurrent writers at
+        once, where a file waits on its busy timeout like production. The
+        copy is written back when the block ends, for the assertions.
+        """
+        memory = connections["default"]
+        if memory.vendor != "sqlite" or not memory.is_in_memory_db():
+            yield
+            return
+        settings_dict = connections.settings["default"]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "test.sqlite3")
+            disk = sqlite3.connect(path)
+            try:
+                memory.ensure_connection()
+                memory.connection.backup(disk)
+                connections.settings["default"] = {**settings_dict, "NAME": path}
+                connections["default"] = connections.create_connection("default")
+                try:
+                    yield
+                finally:
+                    connections["default"].close()
+                    connections["default"] = memory
+                    connections.settings["default"] = settings_dict
+                disk.backup(memory.connection)
+            finally:
+                disk.close()
@@ -0,0 +1,349 @@
+import json
+import re
+import tempfile
+from contextlib import nullcontext
+from io import StringIO
+from pathlib import Path
+from types import ModuleType
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, include, path, resolve
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from interactions.models import Comment, Dislike, Like
+from posts.models import Post
+from social.models import Follow
+from social_network import loadtest
+from social_network.testing import OnDiskDatabaseMixin
+from users.models import User
+
+QUERY_BUDGETS = Path(__file__).resolve().parent / "query_budgets.json"
+
+# Where each API module is mounted in social_network.urls
+API_MODULES = {
+    "posts.api_urls": "api/",
+    "users.api_urls": "api/users/",
+    "social.api_urls": "api/social/",
+}
+
+PAGE_SIZES = (1, 10, 100)
+
+
+def isolated_urlconf(module_name):
+    """A URLconf mounting one API module alone, so no other module shadows it"""
+    urlconf = ModuleType(f"{module_name}_budget_urls")
+    urlconf.urlpatterns = [path(API_MODULES[module_name], include(module_name))]
+    return urlconf
+
+
+def route_template(pattern):
+    """Turn a regex or path() route into a ``str.format`` template"""
+    route = str(pattern.pattern)
+    route = re.sub(r"\(\?P<(\w+)>[^)]*\)", r"{\1}", route)
+    route = re.sub(r"<(?:\w+:)?(\w+)>", r"{\1}", route)
+    return route.lstrip("^").rstrip("$")
+
+
+def get_routes(patterns, prefix=""):
+    """Yield ``(template, callback)`` for every GET route, skipping format suffixes"""
+    for pattern in patterns:
+        template = prefix + route_template(pattern)
+        if isinstance(pattern, URLResolver):
+            yield from get_routes(pattern.url_patterns, template)
+        elif isinstance(pattern, URLPattern) and "{format}" not in template:
+            callback = pattern.callback
+            actions = getattr(callback, "actions", None)
+            if actions is not None:
+                handles_get = "get" in actions
+            else:
+                handles_get = hasattr(getattr(callback, "cls", None), "get")
+            if handles_get:
+                yield template, callback
+
+
+class QueryBudgetTest(APITestCase):
+    """Test that every API endpoint stays within its checked-in query budget"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create(username="viewer")
+        cls.author = User.objects.create(username="author")
+        cls.fans = [User.objects.create(username=f"fan{i}") for i in range(10)]
+
+        for user in [cls.viewer] + cls.fans:
+            Follow.objects.create(current_user=user, second_user=cls.author)
+        for fan in cls.fans:
+            Follow.objects.create(current_user=cls.viewer, second_user=fan)
+            Follow.objects.create(current_user=cls.author, second_user=fan)
+
+        posts = [
+            Post.objects.create(author=cls.author, content=f"Post {i}")
+            for i in range(15)
+        ]
+        posts += [Post.objects.create(author=fan, content="Hi") for fan in cls.fans]
+        for i, post in enumerate(posts):
+            for fan in cls.fans[:3]:
+                Like.objects.create(user=fan, post=post)
+            Dislike.objects.create(user=cls.fans[i % 10], post=post)
+            Comment.objects.create(user=cls.viewer, post=post, content="Nice")
+            Comment.objects.create(user=cls.fans[i % 10], post=post, content="Yes")
+
+        cls.objects = {
+            "posts": posts[0],
+            "users": cls.author,
+            "comments": Comment.objects.first(),
+            "likes": Like.objects.first(),
+            "dislikes": Dislike.objects.first(),
+            "follows": Follow.objects.first(),
+        }
+        with open(QUERY_BUDGETS) as budgets:
+            cls.budgets = json.load(budgets)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.viewer)
+
+    def build_url(self, template):
+        """Fill a route template with IDs of the seeded objects"""
+        resource = next(
+            (
+                segment
+                for segment in reversed(template.split("{")[0].split("/"))
+                if segment in self.objects
+            ),
+            None,
+        )
+        pk = self.objects[resource].pk if resource else None
+        return "/" + template.format(pk=pk, username=self.author.username)
+
+    def measure(self, url):
+        counts = {}
+        for page_size in PAGE_SIZES:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {"page_size": page_size})
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+            counts[page_size] = len(queries)
+        return counts
+
+    def check_module(self, module_name):
+        urlconf = isolated_urlconf(module_name)
+        budgets = self.budgets[module_name]
+        checked = set()
+        with override_settings(ROOT_URLCONF=urlconf):
+            for template, callback in get_routes(urlconf.urlpatterns):
+                url = self.build_url(template)
+                if template in checked or resolve(url).func is not callback:
+                    # Shadowed by an earlier route with the same shape
+                    continue
+                checked.add(template)
+                with self.subTest(endpoint=template):
+                    counts = self.measure(url)
+                    self.assertIn(
+                        template,
+                        budgets,
+                        f"No query budget for {template}, measured {counts}",
+                    )
+                    self.assertEqual(
+                        len(set(counts.values())),
+                        1,
+                        f"Query count of {template} grows with page size: {counts}",
+                    )
+                    self.assertLessEqual(
+                        max(counts.values()),
+                        budgets[template],
+                        f"{template} is over its query budget: {counts}",
+                    )
+        self.assertEqual(
+            set(budgets) - checked, set(), "Budgets for endpoints that no longer exist"
+        )
+
+    def test_posts_api_budgets(self):
+        """Test the query budgets of posts.api_urls"""
+        self.check_module("posts.api_urls")
+
+    def test_users_api_budgets(self):
+        """Test the query budgets of users.api_urls"""
+        self.check_module("users.api_urls")
+
+    def test_social_api_budgets(self):
+        """Test the query budgets of social.api_urls"""
+        self.check_module("social.api_urls")
+
+
+class LoadTestHarnessTest(OnDiskDatabaseMixin, TransactionTestCase):
+    """Test the end-to-end load harness and its report"""
+
+    def setUp(self):
+        users = [User.objects.create(username=f"user{i}") for i in range(3)]
+        for user in users[1:]:
+            Follow.objects.create(current_user=users[0], second_user=user)
+            for i in range(5):
+                Post.objects.create(author=user, content=f"Post {i}")
+
+    def test_parse_mix(self):
+        """Test parsing scenario weights"""
+        self.assertEqual(
+            loadtest.parse_mix("index=3, feed"), {"index": 3.0, "feed": 1.0}
+        )
+        for value in ("unknown=1", "index=-1", "index=0"):
+            with self.assertRaises(ValueError):
+                loadtest.parse_mix(value)
+
+    def test_in_process_runs(self):
+        """Test that WSGI and ASGI runs report every request of the mix"""
+        for target in ("wsgi", "asgi"):
+            with self.subTest(target), tempfile.TemporaryDirectory() as tmp:
+                output = Path(tmp) / "results.json"
+                # WSGI virtual users write from their own threads; ASGI ones
+                # all reach the database through sync_to_async's one thread
+                database = (
+                    self.on_disk_database() if target == "wsgi" else nullcontext()
+                )
+                with database:
+                    call_command(
+                        "loadtest",
+                        target=target,
+                        requests=40,
+                        concurrency=2,
+                        output=str(output),
+                        stdout=StringIO(),
+                    )
+                results = json.loads(output.read_text())
+
+                self.assertEqual(results["total"]["requests"], 40)
+                self.assertEqual(results["total"]["errors"], 0)
+                self.assertEqual(set(results["endpoints"]), set(loadtest.DEFAULT_MIX))
+                feed = results["endpoints"]["feed"]
+                self.assertEqual(feed["statuses"], {"200": feed["requests"]})
+                self.assertGreater(feed["queries_per_request"], 0)
+                self.assertLessEqual(feed["p50_ms"], feed["p99_ms"])
+
+    def test_benchmark_async_reads(self):
+        """Test that the async read benchmark runs every path without errors"""
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / "results.json"
+            call_command(
+                "benchmark_async_reads",
+                requests=24,
+                concurrency=2,
+                output=str(output),
+                stdout=StringIO(),
+            )
+            results = json.loads(output.read_text())
+
+        self.assertEqual(set(results), {"sync-wsgi", "sync-asgi", "async-asgi"})
+        for run in results.values():
+            self.assertEqual(run["total"]["requests"], 24)
+            self.assertEqual(run["total"]["errors"], 0)
+
+
+@override_settings(ROOT_URLCONF="social_network.async_urls")
+class AsyncReadPathTest(APITestCase):
+    """Test that the async read path answers like the sync views"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="reader", password="pw")
+        self.author = User.objects.create_user(username="author", password="pw")
+        Follow.objects.create(current_user=self.user, second_user=self.author)
+        self.posts = [
+            Post.objects.create(author=self.author, content=f"Post {i}")
+            for i in range(12)
+        ]
+        Like.objects.create(user=self.user, post=self.posts[-1])
+        Comment.objects.create(user=self.author, post=self.posts[-1], content="Hi")
+        self.client.force_login(self.user)
+        self.async_client = AsyncClient()
+        self.async_client.cookies = self.client.cookies
+
+    def get_both(self, path, **headers):
+        """Fetch ``path`` from the sync and the async URL map"""
+        with override_settings(ROOT_URLCONF="social_network.urls"):
+            sync = self.client.get(path, headers=headers)
+        return sync, async_to_sync(self.async_client.get)(path, headers=headers)
+
+    def assertSameResponse(self, path):
+        sync, async_ = self.get_both(path)
+        self.assertEqual(async_.status_code, sync.status_code)
+        self.assertEqual(async_.json(), sync.json())
+        self.assertEqual(async_.get("ETag"), sync.get("ETag"))
+        return async_
+
+    def test_reads_match_sync_views(self):
+        """Test the feed, posts, profile and follow stats on both paths"""
+        post = self.posts[-1]
+        for path in (
+            "/api/social/following-posts/",
+            "/api/social/following-posts/?page_size=5",
+            "/api/posts/",
+            "/api/posts/?author=author&page_size=3",
+            f"/api/posts/{post.pk}/",
+            "/api/posts/0/",
+            "/api/posts/?cursor=invalid",
+            "/api/users/users/author/profile/",
+            "/api/users/users/nobody/profile/",
+            "/api/social/users/author/follow-stats/",
+        ):
+            with self.subTest(path):
+                self.assertSameResponse(path)
+
+        data = self.assertSameResponse(f"/api/posts/{post.pk}/").json()
+        self.assertTrue(data["is_liked_by_user"])
+        self.assertEqual(data["latest_comments"][0]["content"], "Hi")
+
+    def test_feed_pages_follow_next_links(self):
+        """Test scrolling the async feed through its cursors"""
+        path, seen = "/api/social/following-posts/?page_size=5", []
+        while path:
+            response = self.assertSameResponse(path)
+            seen += [post["id"] for post in response.json()["results"]]
+            path = response.json()["next"]
+        self.assertEqual(seen, [post.pk for post in reversed(self.posts)])
+
+    def test_not_modified(self):
+        """Test conditional GET on the async path"""
+        response = async_to_sync(self.async_client.get)(
+            "/api/users/users/author/profile/"
+        )
+        repeat = async_to_sync(self.async_client.get)(
+            "/api/users/users/author/profile/",
+            headers={"If-None-Match": response["ETag"]},
+        )
+        self.assertEqual(repeat.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_falls_back_to_sync_views(self):
+        """Test that writes, anonymous feeds and other renderers reach DRF"""
+        anonymous = async_to_sync(AsyncClient().get)("/api/social/following-posts/")
+        self.assertEqual(anonymous.status_code, status.HTTP_403_FORBIDDEN)
+
+        browsable = async_to_sync(self.async_client.get)(
+            "/api/posts/", headers={"Accept": "text/html"}
+        )
+        self.assertEqual(browsable["Content-Type"], "text/html; charset=utf-8")
+
+        created = async_to_sync(self.async_client.post)(
+            "/api/posts/", {"content": "Written"}, content_type="application/json"
+        )
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+        bulk = async_to_sync(self.async_client.post)(
+            "/api/posts/bulk/", [{"content": "Bulk"}], content_type="application/json"
+        )
+        self.assertEqual(bulk.status_code, status.HTTP_201_CREATED)
+
+        search = async_to_sync(self.async_client.get)("/api/posts/?search=Written")
+        self.assertEqual(
+            [post["content"] for post in search.json()["results"]], ["Written"]
+        )
+
+    def test_index(self):
+        """Test the async HTML index"""
+        response = async_to_sync(self.async_client.get)("/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, "Post 11")
+        self.assertEqual(response.context["user_liked_id"], [self.posts[-1].pk])
@@ -3,6 +3,8 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from .views import MetricsView
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     # MVT URLs (existing templates)
@@ -11,6 +13,7 @@ urlpatterns = [
     path("", include("interactions.urls")),
     path("", include("social.urls")),
     # DRF API URLs
+    path("api/metrics/", MetricsView.as_view(), name="metrics"),
     path("api/", include("posts.api_urls")),
     path("api/users/", include("users.api_urls")),
     path("api/social/", include("social.api_urls")),
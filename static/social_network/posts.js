@@ -0,0 +1,195 @@
+// Client code for post cards (index, profile and following pages).
+//
+// Cards are fragment-cached on the server and identical for every viewer, so
+// anything viewer-specific is applied here: the liked state comes from the
+// "liked-post-ids" JSON block and author controls are revealed by comparing
+// data-author with the viewer on <body data-viewer>. A single edit modal is
+// shared by every card on the page. Logged in viewers get count changes of
+// the cards on screen and new posts of followed authors over Server-Sent
+// Events, when the deployment serves them (<body data-live-events>, set by
+// the ASGI URL map only).
+
+function getCookie(name) {
+  const value = `; ${document.cookie}`;
+  const parts = value.split(`; ${name}=`);
+  if (parts.length == 2) return parts.pop().split(";").shift();
+}
+
+function readJSON(id, fallback) {
+  const element = document.getElementById(id);
+  if (!element) return fallback;
+  try {
+    return JSON.parse(element.textContent);
+  } catch (err) {
+    return fallback;
+  }
+}
+
+function timeSince(date) {
+  const seconds = Math.max(0, Math.floor((Date.now() - date.getTime()) / 1000));
+  const units = [
+    ["year", 31536000],
+    ["month", 2592000],
+    ["week", 604800],
+    ["day", 86400],
+    ["hour", 3600],
+    ["minute", 60],
+  ];
+  for (const [unit, size] of units) {
+    const count = Math.floor(seconds / size);
+    if (count >= 1) return `${count} ${unit}${count > 1 ? "s" : ""} ago`;
+  }
+  return "just now";
+}
+
+function setLiked(postId, liked) {
+  const button = document.querySelector(`.like-button[data-post-id="${postId}"]`);
+  if (!button) return;
+  button.classList.toggle("liked", liked);
+  button.querySelector(".bi-heart").classList.toggle("text-danger", liked);
+}
+
+function applyViewerState() {
+  const viewer = document.body.dataset.viewer;
+  const liked = readJSON("liked-post-ids", []);
+  for (const postId of Array.isArray(liked) ? liked : []) {
+    setLiked(postId, true);
+  }
+  if (viewer) {
+    for (const card of document.querySelectorAll(".post-card[data-author]")) {
+      if (card.dataset.author === viewer) {
+        for (const control of card.querySelectorAll(".author-only")) {
+          control.classList.remove("d-none");
+        }
+      }
+    }
+  }
+  for (const time of document.querySelectorAll("time.post-date")) {
+    time.textContent = `• ${timeSince(new Date(time.getAttribute("datetime")))}`;
+  }
+}
+
+function openEditPost(id) {
+  const modal = document.getElementById("modal_edit_post");
+  const textarea = document.getElementById("textarea_edit_post");
+  if (!modal || !textarea) return;
+  textarea.value = document.getElementById(`post_content_${id}`).textContent.trim();
+  updateCharCount(textarea);
+  modal.querySelector(".save-edit-button").dataset.postId = id;
+  bootstrap.Modal.getOrCreateInstance(modal).show();
+}
+
+function handleEditPost(id) {
+  const textareaValue = document.getElementById("textarea_edit_post")?.value;
+
+  fetch(`/edit_post/${id}/`, {
+    method: "POST",
+    headers: {
+      "Content-type": "application/json",
+      "X-CSRFToken": getCookie("csrftoken"),
+    },
+    body: JSON.stringify({
+      content: textareaValue,
+    }),
+  })
+    .then((res) => res.json())
+    .then((result) => {
+      document.getElementById(`post_content_${id}`).textContent = result.data;
+      bootstrap.Modal.getInstance(document.getElementById("modal_edit_post")).hide();
+    })
+    .catch((err) => {
+      console.log("error call service for edit post: ", err);
+    });
+}
+
+let liveEvents = null;
+
+function isLive() {
+  return liveEvents !== null && liveEvents.readyState === EventSource.OPEN;
+}
+
+function setCount(element, count) {
+  if (!element) return;
+  element.setAttribute("value", count);
+  element.textContent = count;
+}
+
+function shiftCount(element, delta) {
+  if (!element || !delta) return;
+  setCount(element, Math.max(0, (parseInt(element.getAttribute("value"), 10) || 0) + delta));
+}
+
+function startLiveEvents() {
+  const url = document.body.dataset.liveEvents;
+  if (!document.body.dataset.viewer || !url || !window.EventSource) return;
+  const postIds = new Set(
+    Array.from(document.querySelectorAll(".like-button[data-post-id]"), (button) => button.dataset.postId)
+  );
+  liveEvents = new EventSource(`${url}?posts=${Array.from(postIds).join(",")}`);
+  liveEvents.addEventListener("counts", (event) => {
+    const counts = JSON.parse(event.data);
+    shiftCount(document.getElementById(`likes-count-${counts.post}`), counts.likes);
+    shiftCount(document.getElementById(`comments-count-${counts.post}`), counts.comments);
+  });
+  liveEvents.addEventListener("post", () => {
+    document.getElementById("new-posts-notice")?.classList.remove("d-none");
+  });
+}
+
+function likeHandler(id) {
+  fetch(`/like/${id}/`)
+    .then((res) => res.json())
+    .then((result) => {
+      if (result.success) {
+        const liked = result.action === "Liked";
+        // While the stream is open the change arrives as a counts event
+        if (!isLive()) setCount(document.getElementById(`likes-count-${id}`), result.likes_count);
+        setLiked(id, liked);
+      }
+    })
+    .catch((error) => {
+      console.error("Error handling like:", error);
+    });
+}
+
+function updateCharCount(textarea) {
+  const charCount = document.getElementById(textarea.dataset.charCount);
+  if (!charCount) return;
+  const count = textarea.value.length;
+  charCount.textContent = count;
+  if (count > 250) {
+    charCount.style.color = "#e0245e";
+  } else if (count > 200) {
+    charCount.style.color = "#fadc44";
+  } else {
+    charCount.style.color = "#657786";
+  }
+}
+
+document.addEventListener("click", (event) => {
+  const like = event.target.closest(".like-button");
+  if (like) {
+    likeHandler(like.dataset.postId);
+    return;
+  }
+  const edit = event.target.closest(".edit-post-button");
+  if (edit) {
+    openEditPost(edit.dataset.postId);
+    return;
+  }
+  const save = event.target.closest(".save-edit-button");
+  if (save) {
+    handleEditPost(save.dataset.postId);
+    return;
+  }
+  if (event.target.closest("#new-posts-notice")) location.reload();
+});
+
+document.addEventListener("input", (event) => {
+  if (event.target.matches("textarea[data-char-count]")) updateCharCount(event.target);
+});
+
+document.addEventListener("DOMContentLoaded", () => {
+  applyViewerState();
+  startLiveEvents();
+});
@@ -16,6 +16,7 @@ urlpatterns = [
     ),
     path("auth/login/", api_views.UserLoginView.as_view(), name="user-login"),
     path("auth/logout/", api_views.UserLogoutView.as_view(), name="user-logout"),
+    path("account/export/", api_views.UserExportView.as_view(), name="user-export"),
     # Additional specific endpoints
     path(
         "users/<str:username>/posts/",
@@ -37,10 +38,12 @@ urlpatterns = [
 # - /api/users/users/{id}/followers/ (custom action)
 # - /api/users/users/{id}/following/ (custom action)
 # - /api/users/users/me/ (custom action)
+# - /api/users/users/typeahead/?q= (custom action)
 # - /api/users/users/update_profile/ (custom action)
 # - /api/users/users/change_password/ (custom action)
 # - /api/users/auth/register/ (user registration)
 # - /api/users/auth/login/ (user login)
 # - /api/users/auth/logout/ (user logout)
+# - /api/users/account/export/?dataset=&output=ndjson|csv&zip=1 (streamed data export)
 # - /api/users/users/{username}/posts/ (user posts)
 # - /api/users/users/{username}/profile/ (user profile)
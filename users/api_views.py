@@ -2,9 +2,11 @@ from rest_framework import viewsets, generics, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
 from django.contrib.auth import login, logout
 from django.shortcuts import get_object_or_404
 
+from . import exports, typeahead
 from .models import User
 from .serializers import (
     UserSerializer,
@@ -13,8 +15,11 @@ from .serializers import (
     LoginSerializer,
     ChangePasswordSerializer,
 )
+from posts.api_views import CachedPostListMixin, post_page_response
 from posts.models import Post
+from posts.pagination import KeysetPagination
 from posts.serializers import PostSerializer
+from social_network.conditional import PRIVATE, compute_etag, conditional_response
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -46,25 +51,34 @@ class UserViewSet(viewsets.ModelViewSet):
     def posts(self, request, pk=None):
         """Get posts by a specific user"""
         user = self.get_object()
-        posts = user.author.all().order_by("-date")
-        serializer = PostSerializer(posts, many=True, context={"request": request})
-        return Response(serializer.data)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(
+            user.author.select_related("author"), request, view=self
+        )
+        return post_page_response(request, paginator, page)
 
     @action(detail=True, methods=["get"])
     def followers(self, request, pk=None):
         """Get followers of a user"""
         user = self.get_object()
-        followers = user.followers.all()
-        serializer = UserSerializer(followers, many=True)
-        return Response(serializer.data)
+        followers = User.objects.filter(following__second_user=user).order_by("pk")
+        page = self.paginate_queryset(followers)
+        serializer = UserSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=["get"])
     def following(self, request, pk=None):
         """Get users that this user follows"""
         user = self.get_object()
-        following = user.following.all()
-        serializer = UserSerializer(following, many=True)
-        return Response(serializer.data)
+        following = User.objects.filter(followers__current_user=user).order_by("pk")
+        page = self.paginate_queryset(following)
+        serializer = UserSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"])
+    def typeahead(self, request):
+        """Suggest users whose username starts with ``?q=``, for mentions"""
+        return Response(typeahead.suggest(request.query_params.get("q"), request.user))
 
     @action(detail=False, methods=["get"])
     def me(self, request):
@@ -150,17 +164,39 @@ class UserLogoutView(generics.GenericAPIView):
         return Response({"message": "Logout successful."})
 
 
-class UserPostsView(generics.ListAPIView):
+class UserExportView(generics.GenericAPIView):
+    """
+    Stream the current user's data as NDJSON or CSV, optionally zipped
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The body is a file whatever the client accepts; errors still
+        # render as JSON
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request):
+        names, output, zipped, errors = exports.options(request.query_params)
+        if errors:
+            raise ValidationError(errors)
+        return exports.attachment(
+            *exports.stream(request.user, names, output, zipped=zipped)
+        )
+
+
+class UserPostsView(CachedPostListMixin, generics.ListAPIView):
     """
     Get all posts by a specific user
     """
 
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         username = self.kwargs["username"]
-        return Post.objects.filter(author__username=username).order_by("-date")
+        return Post.objects.filter(author__username=username).select_related("author")
 
 
 class UserProfileView(generics.RetrieveAPIView):
@@ -174,3 +210,17 @@ class UserProfileView(generics.RetrieveAPIView):
     def get_object(self):
         username = self.kwargs["username"]
         return get_object_or_404(User, username=username)
+
+    def retrieve(self, request, *args, **kwargs):
+        user = self.get_object()
+        # Every serialized field, counters included, is on the user row
+        etag = compute_etag(
+            request, *(getattr(user, field) for field in UserSerializer.Meta.fields)
+        )
+        return conditional_response(
+            request,
+            etag,
+            lambda: Response(self.get_serializer(user).data),
+            # The representation includes the email address
+            cache_control=PRIVATE,
+        )
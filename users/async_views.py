@@ -0,0 +1,39 @@
+"""
+Async versions of the profile and export views, served by
+social_network.async_urls.
+"""
+
+from . import exports
+from .models import User
+from .serializers import UserSerializer
+from social_network.async_support import aiterate, file_view, json_response, not_found
+from social_network.conditional import PRIVATE, aconditional_response, compute_etag
+
+
+async def profile(request, username):
+    """``UserProfileView``; the counters are columns, so this is one query"""
+    try:
+        user = await User.objects.aget(username=username)
+    except User.DoesNotExist:
+        return not_found(User)
+    etag = compute_etag(
+        request, *(getattr(user, field) for field in UserSerializer.Meta.fields)
+    )
+
+    async def build():
+        return json_response(UserSerializer(user).data)
+
+    return await aconditional_response(request, etag, build, cache_control=PRIVATE)
+
+
+@file_view
+async def export(request):
+    """``UserExportView`` from an async iterator, sent as each chunk is encoded"""
+    names, output, zipped, errors = exports.options(request.GET)
+    if errors:
+        # The DRF view answers with the validation errors
+        return None
+    chunks, content_type, filename = exports.stream(
+        request.user, names, output, zipped=zipped
+    )
+    return exports.attachment(aiterate(chunks), content_type, filename)
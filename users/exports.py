@@ -0,0 +1,251 @@
+"""
+Streaming exports of a user's posts, reactions, comments and follow graph.
+
+Datasets are read ``EXPORT_CHUNK_SIZE`` rows at a time and encoded as they
+are read, so memory stays flat however many rows an account has and the
+first bytes leave after the first chunk. Every dataset is read with keyset
+chunks along an index in the order of its filter (posts on
+``(author, date, id)``, follows on ``(current_user, ..., second_user)``
+and ``(second_user, current_user)``, likes, dislikes and comments on
+``(user, id)`` through their user foreign key index): one short query per
+chunk and nothing held open in between, so a slow client never keeps a
+read transaction open for the whole download.
+
+Rows are written as NDJSON or CSV; ``zip_stream`` packs one file per
+dataset into a ZIP archive on the fly. Under WSGI the response iterates the
+generators directly; the ASGI deployment serves exports from an async view
+that steps them with ``aiterate`` (see users.async_views), since Django
+would otherwise read a sync iterator to the end before sending anything.
+"""
+
+import csv
+import io
+import json
+import time
+import zipfile
+from collections import namedtuple
+from datetime import datetime
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+
+from interactions.models import Comment, Dislike, Like
+from posts.models import Post
+from posts.pagination import keyset_filter
+from social.models import Follow
+from social_network import metrics
+
+# ``rows(user)`` is the queryset of the user's rows; ``columns`` are
+# ``(header, lookup)`` pairs; ``key`` are the lookups keyset chunks are
+# ordered on
+Dataset = namedtuple("Dataset", ["rows", "columns", "key"])
+
+DATASETS = {
+    "posts": Dataset(
+        lambda user: Post.objects.filter(author=user),
+        [
+            ("id", "id"),
+            ("date", "date"),
+            ("content", "content"),
+            ("image_cover", "image_cover"),
+            ("likes_count", "likes_count"),
+            ("dislikes_count", "dislikes_count"),
+            ("comments_count", "comments_count"),
+        ],
+        ("date", "id"),
+    ),
+    "likes": Dataset(
+        lambda user: Like.objects.filter(user=user),
+        [("id", "id"), ("post_id", "post_id")],
+        ("id",),
+    ),
+    "dislikes": Dataset(
+        lambda user: Dislike.objects.filter(user=user),
+        [("id", "id"), ("post_id", "post_id")],
+        ("id",),
+    ),
+    "comments": Dataset(
+        lambda user: Comment.objects.filter(user=user),
+        [
+            ("id", "id"),
+            ("post_id", "post_id"),
+            ("date", "date"),
+            ("content", "content"),
+        ],
+        ("id",),
+    ),
+    "following": Dataset(
+        lambda user: Follow.objects.filter(current_user=user),
+        [
+            ("user_id", "second_user_id"),
+            ("username", "second_user__username"),
+            ("each_other", "each_other"),
+        ],
+        ("second_user_id",),
+    ),
+    "followers": Dataset(
+        lambda user: Follow.objects.filter(second_user=user),
+        [
+            ("user_id", "current_user_id"),
+            ("username", "current_user__username"),
+            ("each_other", "each_other"),
+        ],
+        ("current_user_id",),
+    ),
+}
+
+
+def options(params):
+    """``(names, output, zipped, errors)`` from an export's query parameters"""
+    dataset = params.get("dataset", "")
+    names = list(dict.fromkeys(name for name in dataset.split(",") if name))
+    names = names or list(DATASETS)
+    output = params.get("output", "ndjson")
+
+    errors = {}
+    unknown = [name for name in names if name not in DATASETS]
+    if unknown:
+        errors["dataset"] = f"Unknown datasets: {', '.join(unknown)}."
+    if output not in FORMATS:
+        errors["output"] = f"Choose one of {', '.join(FORMATS)}."
+    return names, output, params.get("zip") in ("1", "true"), errors
+
+
+def attachment(chunks, content_type, filename):
+    """A private, uncached download streaming ``chunks``"""
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    patch_cache_control(response, private=True, no_store=True)
+    return response
+
+
+def read_chunks(dataset, user, chunk_size=None):
+    """Yield the dataset's rows of ``user`` as lists of value tuples"""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    queryset = dataset.rows(user)
+    lookups = [lookup for _, lookup in dataset.columns]
+    key = [lookups.index(lookup) for lookup in dataset.key]
+    position = None
+    while True:
+        chunk = list(
+            _after(queryset, dataset.key, position).values_list(*lookups)[:chunk_size]
+        )
+        if chunk:
+            metrics.incr("exports.rows", len(chunk))
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        position = tuple(chunk[-1][index] for index in key)
+
+
+def _after(queryset, key, position):
+    """The rows after ``position`` in ascending ``key`` order"""
+    if len(key) == 2:
+        return keyset_filter(
+            queryset, position, reverse=True, date_field=key[0], pk_field=key[1]
+        )
+    if position is not None:
+        queryset = queryset.filter(**{f"{key[0]}__gt": position[0]})
+    return queryset.order_by(key[0])
+
+
+def encode_ndjson(headers, chunks):
+    for chunk in chunks:
+        yield "".join(
+            json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + "\n"
+            for row in chunk
+        ).encode()
+
+
+def encode_csv(headers, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for chunk in chunks:
+        writer.writerows(
+            [
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in row
+            ]
+            for row in chunk
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # The header alone, for an empty dataset
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+# Output -> (content type, file extension, encoder)
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson", encode_ndjson),
+    "csv": ("text/csv; charset=utf-8", "csv", encode_csv),
+}
+
+
+def export(user, name, output, chunk_size=None):
+    """Stream one dataset of ``user`` as bytes"""
+    dataset = DATASETS[name]
+    encode = FORMATS[output][2]
+    headers = [header for header, _ in dataset.columns]
+    return encode(headers, read_chunks(dataset, user, chunk_size))
+
+
+class _Sink(io.RawIOBase):
+    """An unseekable file that hands out what was written to it"""
+
+    def __init__(self):
+        self.parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def zip_stream(files):
+    """Yield a ZIP archive of ``(name, bytes iterator)`` files as it is built"""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, chunks in files:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            # Sizes cannot be patched into an unseekable stream afterwards,
+            # so every entry is allowed to grow past 4 GiB
+            with archive.open(info, "w", force_zip64=True) as entry:
+                for chunk in chunks:
+                    entry.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+    yield sink.drain()
+
+
+def stream(user, names, output, zipped=False, chunk_size=None):
+    """Return ``(bytes iterator, content type, file name)`` for an export.
+
+    More than one dataset is always zipped, one file per dataset.
+    """
+    content_type, extension, _ = FORMATS[output]
+    if len(names) == 1 and not zipped:
+        return (
+            export(user, names[0], output, chunk_size),
+            content_type,
+            f"{user.username}-{names[0]}.{extension}",
+        )
+    files = (
+        (f"{name}.{extension}", export(user, name, output, chunk_size))
+        for name in names
+    )
+    label = names[0] if len(names) == 1 else "export"
+    return zip_stream(files), "application/zip", f"{user.username}-{label}.zip"
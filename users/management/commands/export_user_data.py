@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users import exports
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a user's posts, likes, dislikes, comments and follow graph as "
+        "NDJSON or CSV, to a file or standard output, in constant memory"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument(
+            "--dataset",
+            action="append",
+            choices=list(exports.DATASETS),
+            help="Dataset to export; repeat for several (default: all)",
+        )
+        parser.add_argument("--output", choices=list(exports.FORMATS), default="ndjson")
+        parser.add_argument(
+            "--zip",
+            action="store_true",
+            help="Write a ZIP archive with one file per dataset",
+        )
+        parser.add_argument("--file", help="Write to this file instead of stdout")
+        parser.add_argument("--chunk-size", type=int, help="Rows read per query")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']!r}.")
+        if options["chunk_size"] is not None and options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive.")
+        names = list(dict.fromkeys(options["dataset"] or exports.DATASETS))
+        if (options["zip"] or len(names) > 1) and not options["file"]:
+            raise CommandError("Archives are binary; write them with --file.")
+
+        chunks, _, _ = exports.stream(
+            user, names, options["output"], options["zip"], options["chunk_size"]
+        )
+        if options["file"]:
+            with open(options["file"], "wb") as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending="")
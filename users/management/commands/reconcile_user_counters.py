@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Post
+from social.models import Follow
+from users.models import User
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .values(field)
+            .annotate(count=Count("id"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized follower, following and post counts of users"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of users recomputed per transaction",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        counters = {
+            "followers_count": count_subquery(Follow, "second_user"),
+            "following_count": count_subquery(Follow, "current_user"),
+            "posts_count": count_subquery(Post, "author"),
+        }
+        ids = User.objects.order_by("pk").values_list("pk", flat=True)
+        last_pk = 0
+        total = 0
+        while True:
+            chunk = list(ids.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            with transaction.atomic():
+                User.objects.filter(pk__gte=chunk[0], pk__lte=chunk[-1]).update(
+                    **counters
+                )
+            last_pk = chunk[-1]
+            total += len(chunk)
+        self.stdout.write(f"Reconciled counters of {total} users")
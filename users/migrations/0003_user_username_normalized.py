@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:00
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def backfill_usernames(apps, schema_editor):
+    User = apps.get_model("users", "User")
+    users = User.objects.order_by("pk").only("pk", "username")
+    last_pk = 0
+    while True:
+        chunk = list(users.filter(pk__gt=last_pk)[:1000])
+        if not chunk:
+            break
+        for user in chunk:
+            user.username_normalized = unicodedata.normalize(
+                "NFKC", user.username
+            ).casefold()
+        User.objects.bulk_update(chunk, ["username_normalized"])
+        last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_user_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="username_normalized",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=150
+            ),
+        ),
+        migrations.RunPython(backfill_usernames, migrations.RunPython.noop),
+    ]
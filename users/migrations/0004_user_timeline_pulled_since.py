@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_user_username_normalized"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="timeline_pulled_since",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,5 +1,46 @@
+import unicodedata
+
 from django.contrib.auth.models import AbstractUser
+from django.db import models
+from django.db.models import F
+
+
+def normalize_username(username):
+    """Fold a username (or a prefix of one) for case-insensitive matching"""
+    return unicodedata.normalize('NFKC', username or '').casefold()
 
 
 class User(AbstractUser):
-    pass
+    # Denormalized counters, maintained by the Post and Follow signals
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    posts_count = models.PositiveIntegerField(default=0)
+    # Case-folded username; its index serves typeahead prefix range scans
+    username_normalized = models.CharField(max_length=150, db_index=True, editable=False, default='')
+    # Date of the first post not fanned out since the author became pulled,
+    # see social.timelines
+    timeline_pulled_since = models.DateTimeField(null=True, blank=True, editable=False)
+
+    COUNTER_FIELDS = ('followers_count', 'following_count', 'posts_count')
+    # Written in the background with update(), never by a full save
+    BACKGROUND_FIELDS = ('timeline_pulled_since',)
+
+    def save(self, *args, **kwargs):
+        self.username_normalized = normalize_username(self.username)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'username' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'username_normalized'}
+        # Counters are only ever written with F() updates, so a full save of
+        # a stale instance (a login, a profile edit) must not overwrite them
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS + self.BACKGROUND_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+def adjust_counter(user_id, field, delta):
+    """Atomically shift one denormalized counter of a user"""
+    User.objects.filter(pk=user_id).update(**{field: F(field) + delta})
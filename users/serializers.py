@@ -6,10 +6,6 @@ from .models import User
 class UserSerializer(serializers.ModelSerializer):
     """Full User serializer with all fields"""
 
-    posts_count = serializers.SerializerMethodField()
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
-
     class Meta:
         model = User
         fields = [
@@ -24,16 +20,14 @@ class UserSerializer(serializers.ModelSerializer):
             "followers_count",
             "following_count",
         ]
-        read_only_fields = ["id", "date_joined", "last_login"]
-
-    def get_posts_count(self, obj):
-        return obj.author.count()
-
-    def get_followers_count(self, obj):
-        return obj.followers.count()
-
-    def get_following_count(self, obj):
-        return obj.following.count()
+        read_only_fields = [
+            "id",
+            "date_joined",
+            "last_login",
+            "posts_count",
+            "followers_count",
+            "following_count",
+        ]
 
 
 class UserMinimalSerializer(serializers.ModelSerializer):
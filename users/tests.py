@@ -1,9 +1,23 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+import zipfile
+from io import BytesIO, StringIO
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
+from django.core.management import call_command
+from interactions.models import Comment, Like
 from posts.models import Post
+from social.models import Follow
+from social_network.testing import QueryPlanAssertionsMixin
+from . import exports, typeahead
 
 User = get_user_model()
 
@@ -336,9 +350,319 @@ class UserProfileViewAPITest(APITestCase):
         self.assertEqual(response.data["first_name"], "Test")
         self.assertEqual(response.data["last_name"], "User")
 
+    def test_get_user_profile_conditional_get(self):
+        """Test that the profile revalidates against the user row"""
+        url = f"/api/users/users/{self.user.username}/profile/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+        # The profile includes the email address
+        self.assertIn("private", response["Cache-Control"])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Post.objects.create(author=self.user, content="New post")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["posts_count"], 1)
+
     def test_get_user_profile_nonexistent(self):
         """Test getting profile for nonexistent user"""
         url = "/api/users/nonexistent/profile/"
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class UserCounterTest(APITestCase):
+    """Test the denormalized follower, following and post counts"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", password="pass")
+        self.bob = User.objects.create_user(username="bob", password="pass")
+        self.carol = User.objects.create_user(username="carol", password="pass")
+
+    def counters(self, user):
+        user.refresh_from_db()
+        return (user.followers_count, user.following_count, user.posts_count)
+
+    def test_follow_and_post_writes_update_counters(self):
+        """Test that follows, unfollows and posts keep counters in sync"""
+        Follow.objects.create(current_user=self.alice, second_user=self.bob)
+        follow = Follow.objects.create(current_user=self.carol, second_user=self.bob)
+        post = Post.objects.create(author=self.bob, content="Hello")
+        Post.objects.create(author=self.bob, content="Again")
+        self.assertEqual(self.counters(self.bob), (2, 0, 2))
+        self.assertEqual(self.counters(self.alice), (0, 1, 0))
+
+        follow.delete()
+        post.delete()
+        self.assertEqual(self.counters(self.bob), (1, 0, 1))
+        self.assertEqual(self.counters(self.carol), (0, 0, 0))
+
+    def test_stale_user_save_keeps_counters(self):
+        """Test that saving an outdated User instance does not reset counters"""
+        stale = User.objects.get(pk=self.bob.pk)
+        Follow.objects.create(current_user=self.alice, second_user=self.bob)
+        stale.first_name = "Bob"
+        stale.save()
+        self.assertEqual(self.counters(self.bob), (1, 0, 0))
+
+    def test_reconcile_command(self):
+        """Test that the reconcile command recomputes drifted counters"""
+        Follow.objects.create(current_user=self.alice, second_user=self.bob)
+        Post.objects.create(author=self.bob, content="Hello")
+        User.objects.update(followers_count=7, following_count=7, posts_count=7)
+        call_command("reconcile_user_counters", chunk_size=2, stdout=StringIO())
+        self.assertEqual(self.counters(self.bob), (1, 0, 1))
+        self.assertEqual(self.counters(self.alice), (0, 1, 0))
+        self.assertEqual(self.counters(self.carol), (0, 0, 0))
+
+    def test_followers_and_following_are_paginated_users(self):
+        """Test the followers and following actions list users, a page at a time"""
+        Follow.objects.create(current_user=self.alice, second_user=self.bob)
+        Follow.objects.create(current_user=self.carol, second_user=self.bob)
+        self.client.force_authenticate(user=self.alice)
+
+        response = self.client.get(reverse("user-followers", args=[self.bob.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [user["username"] for user in response.data["results"]],
+            ["alice", "carol"],
+        )
+        self.assertEqual(response.data["results"][0]["following_count"], 1)
+
+        response = self.client.get(reverse("user-following", args=[self.alice.pk]))
+        self.assertEqual(
+            [user["username"] for user in response.data["results"]], ["bob"]
+        )
+
+
+@override_settings(TYPEAHEAD_CACHED_PREFIX_LENGTH=1, TYPEAHEAD_CANDIDATES=3)
+class UserTypeaheadTest(APITestCase):
+    """Test the username typeahead endpoint"""
+
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create_user(username="viewer", password="pw")
+        self.popular = User.objects.create_user(username="Alice")
+        self.friend = User.objects.create_user(username="alina")
+        self.others = [User.objects.create_user(username=f"al{i}") for i in range(3)]
+        User.objects.filter(pk=self.popular.pk).update(followers_count=50)
+        User.objects.filter(pk=self.others[0].pk).update(followers_count=10)
+        Follow.objects.create(current_user=self.viewer, second_user=self.friend)
+        self.client.force_authenticate(user=self.viewer)
+        self.url = reverse("user-typeahead")
+
+    def suggest(self, query):
+        response = self.client.get(self.url, {"q": query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [user["username"] for user in response.data]
+
+    def test_followed_users_rank_first(self):
+        """Test ranking by follow status, then follower count"""
+        self.assertEqual(self.suggest("ali"), ["alina", "Alice"])
+        self.assertEqual(self.suggest("a")[:3], ["alina", "Alice", "al0"])
+
+    def test_prefix_is_case_insensitive(self):
+        """Test matching against the normalized username"""
+        self.assertEqual(self.suggest("@ALIC"), ["Alice"])
+        self.assertEqual(self.suggest("bob"), [])
+        self.assertEqual(self.suggest(""), [])
+
+    def test_followed_users_survive_the_candidate_cap(self):
+        """Test that a followed user is found even past the candidate limit"""
+        # "a" is a cached short prefix, ranked by followers only
+        response = self.client.get(self.url, {"q": "a"})
+
+        self.assertEqual(response.data[0]["username"], "alina")
+        self.assertTrue(response.data[0]["is_following"])
+        self.assertNotIn("viewer", [user["username"] for user in response.data])
+
+    def test_long_prefixes_keep_the_most_followed(self):
+        """Test that the candidate cap keeps the most followed matches"""
+        # "al" is not cached; its five matches exceed the cap of three
+        self.assertEqual(self.suggest("al")[:3], ["alina", "Alice", "al0"])
+
+    @override_settings(TYPEAHEAD_SCAN_LIMIT=2)
+    def test_long_prefixes_rank_a_capped_scan(self):
+        """Test that longer prefixes only rank their first matches"""
+        # Only al0 and al1 are scanned; alina still comes from the follows
+        self.assertEqual(self.suggest("al"), ["alina", "al0", "al1"])
+
+    def test_username_changes_are_indexed(self):
+        """Test that renaming a user updates the normalized username"""
+        self.popular.username = "Bob"
+        self.popular.save(update_fields=["username"])
+
+        self.assertEqual(self.suggest("bo"), ["Bob"])
+
+    def test_bounded_query_count(self):
+        """Test that a lookup costs a fixed number of queries"""
+        with self.assertNumQueries(2):
+            self.suggest("ali")
+        self.suggest("a")
+        with self.assertNumQueries(1):
+            # The short prefix ranking now comes from the cache
+            self.suggest("a")
+
+
+class UserTypeaheadQueryPlanTest(QueryPlanAssertionsMixin, TestCase):
+    """Test that typeahead lookups are index range scans"""
+
+    def test_prefix_scan(self):
+        """Test the capped range scan of longer prefixes"""
+        plan = self.query_plan(
+            typeahead.ranked_matches("ali", 5000).values_list(
+                "id", "username", "followers_count"
+            )[:200]
+        )
+        # Only the capped subquery result is sorted by follower count
+        self.assertIn(
+            "username_normalized>? AND username_normalized<?", "\n".join(plan)
+        )
+        self.assertNotIn("SCAN users_user", plan)
+
+
+class UserExportQueryPlanTest(QueryPlanAssertionsMixin, TestCase):
+    """Test that every export chunk is an index range read"""
+
+    def test_chunks(self):
+        """Test a chunk after a position of every dataset"""
+        user = User.objects.create_user(username="alice", password="pass")
+        for name, dataset in exports.DATASETS.items():
+            with self.subTest(name):
+                position = (timezone.now(), 5) if len(dataset.key) == 2 else (5,)
+                self.assertIndexedPlan(
+                    exports._after(dataset.rows(user), dataset.key, position)[:100]
+                )
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class UserExportTest(APITestCase):
+    """Test streamed user data exports"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="pass")
+        self.other = User.objects.create_user(username="bob", password="pass")
+        self.posts = [
+            Post.objects.create(author=self.user, content=f"post {i}") for i in range(5)
+        ]
+        other_post = Post.objects.create(author=self.other, content="other")
+        for post in self.posts[:3]:
+            Like.objects.create(user=self.user, post=post)
+        Comment.objects.create(user=self.user, post=other_post, content="hi")
+        Follow.objects.create(current_user=self.user, second_user=self.other)
+        Follow.objects.create(current_user=self.other, second_user=self.user)
+        self.client.force_authenticate(self.user)
+        self.url = reverse("user-export")
+
+    def fetch(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, b"".join(response.streaming_content)
+
+    def test_ndjson_posts(self):
+        """Test that posts stream oldest first, across keyset chunks"""
+        response, body = self.fetch(dataset="posts")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertIn('filename="alice-posts.ndjson"', response["Content-Disposition"])
+        self.assertIn("no-store", response["Cache-Control"])
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row["id"] for row in rows], [post.pk for post in self.posts])
+        self.assertEqual(rows[0]["content"], "post 0")
+
+    def test_csv_follows(self):
+        """Test the CSV of both sides of the follow graph"""
+        for name, expected in (("following", self.other), ("followers", self.other)):
+            _, body = self.fetch(dataset=name, output="csv")
+            rows = list(csv.reader(body.decode().splitlines()))
+            self.assertEqual(rows[0], ["user_id", "username", "each_other"])
+            self.assertEqual(rows[1:], [[str(expected.pk), "bob", "True"]])
+
+    def test_empty_csv_has_header(self):
+        """Test that an empty dataset still has its header row"""
+        _, body = self.fetch(dataset="dislikes", output="csv")
+        self.assertEqual(body.decode().splitlines(), ["id,post_id"])
+
+    def test_chunks_are_read_lazily(self):
+        """Test that rows are read one chunk at a time as the body is consumed"""
+        chunks = exports.export(self.user, "posts", "ndjson")
+        with self.assertNumQueries(1):
+            first = next(chunks)
+        self.assertEqual(len(first.splitlines()), 2)
+        with self.assertNumQueries(2):
+            rest = list(chunks)
+        self.assertEqual(sum(len(chunk.splitlines()) for chunk in rest), 3)
+
+    def test_reactions_are_read_in_keyset_chunks(self):
+        """Test that likes are read in short queries, in ID order"""
+        chunks = exports.export(self.user, "likes", "ndjson")
+        with self.assertNumQueries(2):
+            rows = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+        self.assertEqual(
+            [row["post_id"] for row in rows], [post.pk for post in self.posts[:3]]
+        )
+
+    @override_settings(ROOT_URLCONF="social_network.async_urls")
+    async def test_asgi_streams_chunks(self):
+        """Test that the ASGI deployment streams chunks from an async iterator"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url, {"dataset": "posts"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+        self.assertIn("no-store", response["Cache-Control"])
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual([len(chunk.splitlines()) for chunk in chunks], [2, 2, 1])
+
+    def test_zip_of_all_datasets(self):
+        """Test that several datasets are zipped, one file each"""
+        response, body = self.fetch(output="csv")
+        self.assertEqual(response["Content-Type"], "application/zip")
+        with zipfile.ZipFile(BytesIO(body)) as archive:
+            self.assertEqual(
+                archive.namelist(), [f"{name}.csv" for name in exports.DATASETS]
+            )
+            likes = archive.read("likes.csv").decode().splitlines()
+            comments = archive.read("comments.csv").decode().splitlines()
+        self.assertEqual(len(likes), 4)
+        self.assertIn("hi", comments[1])
+
+    def test_single_dataset_zip(self):
+        """Test zipping a single dataset on request"""
+        response, body = self.fetch(dataset="likes", zip="1")
+        self.assertIn('filename="alice-likes.zip"', response["Content-Disposition"])
+        with zipfile.ZipFile(BytesIO(body)) as archive:
+            self.assertEqual(archive.namelist(), ["likes.ndjson"])
+
+    def test_invalid_parameters(self):
+        """Test that unknown datasets and outputs are rejected"""
+        response = self.client.get(self.url, {"dataset": "posts,secrets"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("dataset", response.data)
+        response = self.client.get(self.url, {"output": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("output", response.data)
+
+    def test_requires_login(self):
+        """Test that anonymous users cannot export"""
+        self.client.force_authenticate(None)
+        response = self.client.get(self.url)
+        self.assertIn(
+            response.status_code,
+            (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN),
+        )
+
+    def test_command(self):
+        """Test the export_user_data command to stdout and to a file"""
+        out = StringIO()
+        call_command("export_user_data", "alice", "--dataset", "likes", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "export.zip")
+            call_command("export_user_data", "alice", "--file", path)
+            with zipfile.ZipFile(path) as archive:
+                self.assertEqual(len(archive.namelist()), len(exports.DATASETS))
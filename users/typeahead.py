@@ -0,0 +1,128 @@
+"""
+Username typeahead for mention autocomplete.
+
+Lookups never scan the users table. A prefix is matched as a range on the
+indexed ``User.username_normalized`` column; at most the first
+``TYPEAHEAD_SCAN_LIMIT`` matches in index order are sorted by follower
+count in SQL, and the ``TYPEAHEAD_CANDIDATES`` most followed of those are
+ranked by whether the viewer follows them, then by follower count. Past
+that limit the most followed matches can be missed, but no keystroke
+sorts more than a bounded number of rows.
+
+Very short prefixes match too many users for a capped scan to find the
+popular ones, so their matches are sorted in full once and the ranking is
+cached for ``TYPEAHEAD_CACHE_TTL`` seconds. Users the viewer follows are
+always looked up separately, through the viewer's own follow rows, so they
+are never crowded out of the candidates; the most followed of them already
+fill every suggestion ranked before a candidate missing from that lookup.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import User, normalize_username
+from social.models import Follow
+from social_network import metrics
+
+CACHE_KEY = "typeahead:{}"
+
+# Sorts after any character a username can contain
+RANGE_END = "\U0010ffff"
+
+
+def prefix_filter(prefix, field="username_normalized"):
+    """Lookups matching ``prefix`` as an index range on ``field``"""
+    return {
+        f"{field}__gte": prefix,
+        f"{field}__lt": prefix + RANGE_END,
+        # Redundant with the range, but keeps the match exact on databases
+        # whose collation does not order RANGE_END last
+        f"{field}__startswith": prefix,
+    }
+
+
+def ranked_matches(prefix, limit=None):
+    """The matches of ``prefix``, most followed first.
+
+    With ``limit``, only the first ``limit`` matches in index order are
+    ranked.
+    """
+    matches = User.objects.filter(**prefix_filter(prefix))
+    if limit is not None:
+        matches = User.objects.filter(
+            pk__in=matches.order_by("username_normalized").values("pk")[:limit]
+        )
+    return matches.order_by("-followers_count", "username_normalized")
+
+
+def _scan(prefix, limit=None):
+    return list(
+        ranked_matches(prefix, limit).values_list("id", "username", "followers_count")[
+            : settings.TYPEAHEAD_CANDIDATES
+        ]
+    )
+
+
+def candidates(prefix):
+    """Up to ``TYPEAHEAD_CANDIDATES`` ``(id, username, followers_count)`` rows"""
+    if len(prefix) > settings.TYPEAHEAD_CACHED_PREFIX_LENGTH:
+        return _scan(prefix, settings.TYPEAHEAD_SCAN_LIMIT)
+
+    key = CACHE_KEY.format(prefix)
+    rows = cache.get(key)
+    if rows is None:
+        metrics.incr("users.typeahead.cache.misses")
+        rows = _scan(prefix)
+        cache.set(key, rows, settings.TYPEAHEAD_CACHE_TTL)
+    else:
+        metrics.incr("users.typeahead.cache.hits")
+    return rows
+
+
+def followed_candidates(viewer, prefix):
+    """Rows for the users ``viewer`` follows whose username matches ``prefix``"""
+    return list(
+        Follow.objects.filter(
+            current_user=viewer,
+            **prefix_filter(prefix, "second_user__username_normalized"),
+        )
+        .order_by("-second_user__followers_count")
+        .values_list(
+            "second_user_id", "second_user__username", "second_user__followers_count"
+        )[: settings.TYPEAHEAD_CANDIDATES]
+    )
+
+
+def suggest(query, viewer=None, limit=None):
+    """Return up to ``limit`` ranked user suggestions for ``query``.
+
+    Each suggestion is a dict with ``id``, ``username``, ``followers_count``
+    and ``is_following``; the viewer is never suggested to themselves.
+    """
+    prefix = normalize_username((query or "").lstrip("@"))
+    if not prefix:
+        return []
+    limit = limit or settings.TYPEAHEAD_LIMIT
+
+    with metrics.timer("users.typeahead_ms"):
+        rows = {row[0]: row for row in candidates(prefix)}
+        followed = set()
+        if viewer is not None and viewer.is_authenticated:
+            rows.pop(viewer.pk, None)
+            for row in followed_candidates(viewer, prefix):
+                rows[row[0]] = row
+                followed.add(row[0])
+
+        ranked = sorted(
+            rows.values(),
+            key=lambda row: (row[0] not in followed, -row[2], row[1].casefold()),
+        )
+    return [
+        {
+            "id": pk,
+            "username": username,
+            "followers_count": followers_count,
+            "is_following": pk in followed,
+        }
+        for pk, username, followers_count in ranked[:limit]
+    ]
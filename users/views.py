@@ -4,9 +4,10 @@ from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse, HttpResponseRedirect
 from django.shortcuts import render
 from django.urls import reverse
-from django.db.models import Count
 from .models import User
 from posts.models import Post
+from posts.pagination import paginate_request, queryset_fetcher
+from posts.viewer_state import liked_post_ids, resolve_viewer_state
 from social.models import Follow
 
 
@@ -71,24 +72,18 @@ def register(request):
 @login_required
 def profile(request, username):
     user = User.objects.get(username=username)
-    posts = Post.objects.filter(author=user).order_by('-date').annotate(
-        num_likes=Count('likes'),
-        num_dislikes=Count('dislikes')
-    )
-    following = Follow.objects.filter(current_user=user)
-    followers = Follow.objects.filter(second_user=user)
+    posts = Post.objects.filter(author=user).select_related('author')
+    posts_of_the_page = paginate_request(request, queryset_fetcher(posts))
+    user_liked_id = liked_post_ids(resolve_viewer_state(
+        request.user, [post.id for post in posts_of_the_page]))
     user_profile = user
-    checkFollow = Follow.objects.filter(current_user=user, second_user=user)
-    print(checkFollow)
-    checkFollow = Follow.objects.filter(
-        current_user=request.user, second_user=user)
-    isFollowing = True if len(checkFollow) != 0 else False
+    isFollowing = Follow.objects.filter(
+        current_user=request.user, second_user=user).exists()
 
     return render(request, "users/profile.html", {
-        "posts_of_the_page": posts,
+        "posts_of_the_page": posts_of_the_page,
         'username': user.username,
-        "following": following,
-        "followers": followers,
         "isFollowing": isFollowing,
-        "user_profile": user_profile
+        "user_profile": user_profile,
+        "user_liked_id": user_liked_id
     })